@@ -0,0 +1,291 @@
+"""Per-step cost of the framework itself, without any LLM.
+
+Times separately the agent overhead (observation encoding, prompt building with token counting and answer parsing,
+with a stubbed LLM answering instantly), `env.reset`/`env.step`, `render()` in rgb_array mode, GIF frame encoding
+and whole episodes through `run_episode`, on the bundled environments. Each benchmark is repeated and the median
+time per operation is reported.
+
+Results can be saved as a JSON baseline and compared against a previous one, exiting with an error if any
+benchmark got slower than the threshold. The fastest rounds are compared, they are the least disturbed by other
+processes; baselines only make sense on the machine (and load) they were recorded on:
+
+    python benchmarks/micro.py --save benchmarks/baselines/micro.json
+    python benchmarks/micro.py --compare benchmarks/baselines/micro.json --threshold 0.25
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import gymnasium as gym
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import environments  # to register the environments
+
+from gym_llm import Agent, get_env_definition
+from gym_llm.encoders import ENCODERS
+from gym_llm.episode import run_episode
+from gym_llm.llms.base_llm import BaseLLM
+from gym_llm.logger import EmptyLogger
+from gym_llm.recording import GifWriter
+
+ENVS = ('TaxiLLM-v3', 'BlackjackLLM-v1', 'LunarLanderLLM-v2')
+
+
+class StubLLM(BaseLLM):
+    """Answers instantly with canned JSON answers cycling through the actions of the schema"""
+
+    def __init__(self, actions, reflection_words: int = 40, **kwargs):
+        super().__init__(**kwargs)
+        reflection = ' '.join(['reflection'] * reflection_words)
+        self.answers = [json.dumps({'reflection': reflection, 'action': str(action)}) for action in actions]
+        self._count = 0
+
+    def _next_answer(self, call):
+        self._count += 1
+        call['completion_tokens'] = 0
+        return self.answers[self._count % len(self.answers)]
+
+    def _complete(self, messages, call):
+        return self._next_answer(call)
+
+    async def _acomplete(self, messages, call):
+        return self._next_answer(call)
+
+    def _stream(self, messages, call):
+        yield self._next_answer(call)
+
+    async def _astream(self, messages, call):
+        yield self._next_answer(call)
+
+    def _create_async_client(self):
+        return None
+
+
+def get_stub_agent(env, observation_format: str, history: int = 10) -> Agent:
+    definition = get_env_definition(env)
+    agent = Agent(config={'backend': 'ollama', 'history': history, 'observation_format': observation_format},
+                  **definition)
+    agent.llm = StubLLM(actions=list(definition['action_schema']), model='stub', system_prompt=agent.system_prompt,
+                        history_len=history)
+    return agent
+
+
+def collect_observations(env, steps: int, seed: int):
+    env.action_space.seed(seed)
+    observations = []
+    obs, _ = env.reset(seed=seed)
+    while len(observations) < steps:
+        observations.append(obs)
+        obs, _, terminated, truncated, _ = env.step(env.action_space.sample())
+        if terminated or truncated:
+            obs, _ = env.reset()
+    return observations
+
+
+def measure(function, number: int, repeat: int) -> dict:
+    """Median, min and spread of the time per call of `function(i)` over `repeat` rounds of `number` calls"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(number):
+            function(i)
+        times.append((time.perf_counter() - start) / number)
+
+    median = statistics.median(times)
+    return {
+        'us_per_op': median * 1e6,
+        'min_us_per_op': min(times) * 1e6,
+        'stdev_us_per_op': statistics.stdev(times) * 1e6 if len(times) > 1 else 0.0,
+        'ops_per_s': 1 / median if median else None
+    }
+
+
+def bench_agent(env_id: str, number: int, repeat: int, seed: int) -> dict:
+    env = gym.make(env_id)
+    observations = collect_observations(env, number, seed)
+    results = {}
+    for observation_format in ENCODERS:
+        agent = get_stub_agent(env, observation_format)
+        agent.reset(seed=seed)
+        # fill the history window so that every round builds prompts of the same size
+        for observation in observations[:agent.llm.history.maxlen]:
+            agent.get_action(observation)
+        results[f'agent.get_action[{observation_format}]'] = measure(
+            lambda i: agent.get_action(observations[i]), number, repeat)
+        # the building blocks on their own
+        results[f'agent.encode[{observation_format}]'] = measure(
+            lambda i: agent.observation_encoder.encode(observations[i], start=False), number, repeat)
+    results['agent.get_messages'] = measure(lambda i: agent.llm.get_messages(), number, repeat)
+    results['agent.parse_answer'] = measure(lambda i: agent.llm.parse_answer(agent.llm.answers[i % len(agent.llm.answers)]),
+                                            number, repeat)
+    env.close()
+    return results
+
+
+def bench_env(env_id: str, number: int, repeat: int, seed: int) -> dict:
+    env = gym.make(env_id)
+    env.reset(seed=seed)
+    env.action_space.seed(seed)
+    actions = [env.action_space.sample() for _ in range(number)]
+
+    def step(i):
+        _, _, terminated, truncated, _ = env.step(actions[i])
+        if terminated or truncated:
+            env.reset()
+
+    results = {
+        'env.reset': measure(lambda i: env.reset(seed=seed + i), number, repeat),
+        'env.step': measure(step, number, repeat)
+    }
+    env.close()
+    return results
+
+
+def bench_render(env_id: str, number: int, repeat: int, seed: int) -> dict:
+    env = gym.make(env_id, render_mode='rgb_array')
+    env.reset(seed=seed)
+    env.action_space.seed(seed)
+    frames = []
+
+    def render(i):
+        frames.append(env.render())
+        _, _, terminated, truncated, _ = env.step(env.action_space.sample())
+        if terminated or truncated:
+            env.reset()
+
+    env.render()  # window and sprites are loaded on the first call
+    results = {'env.step+render[rgb_array]': measure(render, number, repeat)}
+    env.close()
+
+    frames = frames[:number]
+    with tempfile.TemporaryDirectory() as tmp:
+        writers = []
+
+        def encode(i):
+            if i == 0:
+                writers.append(GifWriter(Path(tmp) / f'{len(writers)}.gif', fps=30))
+            writers[-1].append(frames[i])
+
+        results['gif.append'] = measure(encode, len(frames), repeat)
+        for writer in writers:
+            writer.close()
+    return results
+
+
+def bench_episode(env_id: str, number: int, repeat: int, seed: int) -> dict:
+    env = gym.make(env_id)
+    agent = get_stub_agent(env, 'kv')
+    logger = EmptyLogger()
+    steps = []
+
+    def episode(i):
+        steps.append(run_episode(env, agent, seed=seed + i, logger=logger)['num_steps'])
+
+    timing = measure(episode, number, repeat)
+    env.close()
+
+    # per step rather than per episode, episodes have different lengths
+    mean_steps = sum(steps) / len(steps)
+    return {'run_episode.step': {key: value / mean_steps if key != 'ops_per_s' else value * mean_steps
+                                 for key, value in timing.items()}}
+
+
+BENCHMARKS = {
+    'agent': bench_agent,
+    'env': bench_env,
+    'render': bench_render,
+    'episode': bench_episode
+}
+
+
+def run_benchmarks(envs, groups, number: int, repeat: int, seed: int) -> dict:
+    results = {}
+    for env_id in envs:
+        for group in groups:
+            # fewer episodes than steps, they are much longer
+            group_number = max(number // 50, 2) if group == 'episode' else number
+            for name, result in BENCHMARKS[group](env_id, group_number, repeat, seed).items():
+                results[f'{env_id}/{name}'] = result
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Prints the change of the fastest round of every benchmark against the baseline and returns the regressions"""
+    regressions = []
+    print(f'| Benchmark | baseline min (us) | current min (us) | change |')
+    print('|---|---|---|---|')
+    for name, result in results.items():
+        current = result['min_us_per_op']
+        if name not in baseline['results']:
+            print(f'| {name} | - | {current:.2f} | new |')
+            continue
+        before = baseline['results'][name]['min_us_per_op']
+        change = current / before - 1
+        flag = ''
+        if change > baseline.get('thresholds', {}).get(name, threshold):
+            regressions.append(name)
+            flag = ' REGRESSION'
+        print(f'| {name} | {before:.2f} | {current:.2f} | {change:+.1%}{flag} |')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--envs', nargs='+', default=ENVS, choices=ENVS)
+    parser.add_argument('--groups', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--number', type=int, default=200, help='operations per round')
+    parser.add_argument('--repeat', type=int, default=7, help='rounds, the median is reported')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', type=Path, default=None, help='write the results as a JSON baseline')
+    parser.add_argument('--compare', type=Path, default=None, help='JSON baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative slowdown counted as a regression (a baseline can set per benchmark `thresholds`)')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.envs, args.groups, args.number, args.repeat, args.seed)
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'gymnasium': gym.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'number': args.number,
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+    else:
+        print('| Benchmark | us/op | ops/s |')
+        print('|---|---|---|')
+        for name, result in results.items():
+            print(f'| {name} | {result["us_per_op"]:.2f} | {result["ops_per_s"]:.0f} |')
+        regressions = []
+
+    if args.save is not None:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if regressions:
+        print(f'{len(regressions)} regression(s) above the threshold: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Prompt tokens per step of every observation format on the bundled environments.
+
+Plays random episodes and reports the mean tokens of the user message (observation + start flag).
+
+    python benchmarks/observation_tokens.py --model gpt-4o-mini --steps 500
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import gymnasium as gym
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import environments  # to register the environments
+
+from gym_llm import get_env_definition
+from gym_llm.encoders import ENCODERS, get_observation_encoder
+from gym_llm.llms.tokens import get_token_counter, MESSAGE_OVERHEAD
+
+ENVS = ('LunarLanderLLM-v2', 'BlackjackLLM-v1', 'TaxiLLM-v3')
+
+
+def collect_observations(env_id: str, steps: int, seed: int):
+    env = gym.make(env_id)
+    env.action_space.seed(seed)
+    observation_schema = get_env_definition(env)['observation_schema']
+
+    observations = []
+    obs, _ = env.reset(seed=seed)
+    while len(observations) < steps:
+        observations.append((obs, len(observations) == 0 or done))
+        obs, _, terminated, truncated, _ = env.step(env.action_space.sample())
+        done = terminated or truncated
+        if done:
+            obs, _ = env.reset()
+    env.close()
+
+    return observation_schema, observations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='gpt-4o-mini', help='Model whose tokenizer is used (see gym_llm.llms.tokens)')
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--float-precision', type=int, default=3)
+    args = parser.parse_args()
+
+    count_tokens = get_token_counter(args.model)
+
+    print(f'| Environment | ' + ' | '.join(ENCODERS) + ' |')
+    print('|---|' + '---|' * len(ENCODERS))
+    for env_id in ENVS:
+        observation_schema, observations = collect_observations(env_id, args.steps, args.seed)
+        row = []
+        for name in ENCODERS:
+            encoder = get_observation_encoder(name, observation_schema, float_precision=args.float_precision)
+            tokens = [count_tokens(encoder.encode(obs, start=start)) + MESSAGE_OVERHEAD for obs, start in observations]
+            row.append(f'{sum(tokens) / len(tokens):.1f}')
+        print(f'| {env_id} | ' + ' | '.join(row) + ' |')
+
+
+if __name__ == '__main__':
+    main()
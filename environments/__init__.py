@@ -9,17 +9,19 @@ gym.register(
     reward_threshold=200,
 )
 
-from .blackjack import BlackjackEnv
+from .blackjack import BlackjackEnv, BlackjackVectorEnv
 gym.register(
     id='BlackjackLLM-v1',
     entry_point='environments:BlackjackEnv',
+    vector_entry_point='environments:BlackjackVectorEnv',
     kwargs={"sab": True, "natural": False}
 )
 
-from .taxi import TaxiEnv
+from .taxi import TaxiEnv, TaxiVectorEnv
 gym.register(
     id="TaxiLLM-v3",
     entry_point="environments:TaxiEnv",
+    vector_entry_point="environments:TaxiVectorEnv",
     reward_threshold=8,  # optimum = 8.46
     max_episode_steps=50,
 )
\ No newline at end of file
@@ -6,8 +6,12 @@ import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
 from gymnasium.error import DependencyNotInstalled
+from gymnasium.utils import seeding
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
 
 from gym_llm import LLMEnv
+from .vector import get_vector_seeds, get_reset_mask
 
 def cmp(a, b):
     return float(a > b) - float(a < b)
@@ -413,6 +417,220 @@ class BlackjackEnv(gym.Env, LLMEnv):
         Usable Ace                |  0   |  1   |
         """
 
+    def heuristic_action(self, observation):
+        """Basic strategy without doubling or splitting: 0 (stick) or 1 (hit)"""
+        player_sum = int(observation['players_sum'])
+        dealers_card = int(observation['dealers_card'])
+
+        if observation['usable_ace']:
+            return int(player_sum < 18 or (player_sum == 18 and dealers_card in (1, 9, 10)))
+        if player_sum >= 17:
+            return 0
+        if player_sum >= 13:
+            return int(not 2 <= dealers_card <= 6)
+        if player_sum == 12:
+            return int(not 4 <= dealers_card <= 6)
+        return 1
+
+
+
+class BlackjackVectorEnv(VectorEnv, LLMEnv):
+    """Plays `num_envs` independent blackjack hands at once with NumPy arrays.
+
+    Hands are kept as (sum counting aces as 1, has ace, number of cards), the dealer play-out draws for every
+    stuck hand below 17 at once and the cards come from a per sub-env buffer drawn ahead. Each sub-env keeps
+    its own random generator, consumed in the same order as `BlackjackEnv`: a reset without seed first rewinds it
+    to the last card dealt, so the next hands (seeded or not) deal the same cards as in `BlackjackEnv`. Finished sub-envs are reset on the next step (gymnasium next-step autoreset) or through
+    `reset(options={'reset_mask': mask})`. Rendering is not supported, use the sync vectorization mode for it.
+    """
+
+    metadata = {
+        "render_modes": [],
+        "autoreset_mode": AutoresetMode.NEXT_STEP,
+    }
+
+    def __init__(self, num_envs: int, render_mode: Optional[str] = None, natural=False, sab=False,
+                 max_episode_steps: Optional[int] = None, card_buffer: int = 16):
+        if render_mode is not None:
+            raise ValueError(
+                f"BlackjackVectorEnv does not render, got render_mode={render_mode}. Use vectorization_mode='sync' to render"
+            )
+
+        self.num_envs = num_envs
+        self.render_mode = render_mode
+        self.natural = natural
+        self.sab = sab
+        self.max_episode_steps = max_episode_steps
+        self.card_buffer = card_buffer
+
+        self.single_action_space = spaces.Discrete(2)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.single_observation_space = spaces.Dict(
+            {
+                "players_sum": spaces.Discrete(32),
+                "dealers_card": spaces.Discrete(11),
+                "usable_ace": spaces.Discrete(2),
+            }
+        )
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        self._deck = np.array(deck, dtype=np.int64)
+        self._np_randoms = [None] * num_envs
+        # generator states before each buffer was drawn, to give back the cards that were not dealt
+        self._buffer_states = [None] * num_envs
+        self._cards = np.zeros((num_envs, card_buffer), dtype=np.int64)
+        self._next_card = np.zeros(num_envs, dtype=np.int64)
+
+        self._player_sum = np.zeros(num_envs, dtype=np.int64)
+        self._player_ace = np.zeros(num_envs, dtype=np.bool_)
+        self._player_cards = np.zeros(num_envs, dtype=np.int64)
+        self._dealer_sum = np.zeros(num_envs, dtype=np.int64)
+        self._dealer_ace = np.zeros(num_envs, dtype=np.bool_)
+        self._dealer_cards = np.zeros(num_envs, dtype=np.int64)
+        self._dealer_card = np.zeros(num_envs, dtype=np.int64)
+
+        self._elapsed_steps = np.zeros(num_envs, dtype=np.int64)
+        self._autoreset_envs = np.zeros(num_envs, dtype=np.bool_)
+
+    def reset(
+        self,
+        *,
+        seed=None,
+        options: Optional[dict] = None,
+    ):
+        seeds = get_vector_seeds(seed, self.num_envs)
+        reset_mask = get_reset_mask(options, self.num_envs)
+
+        for i in np.flatnonzero(reset_mask):
+            self._reset_env(i, seeds[i])
+        self._autoreset_envs[reset_mask] = False
+
+        return self._get_obs(), {}
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        assert self.action_space.contains(actions)
+        autoreset = self._autoreset_envs
+
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        terminations = np.zeros(self.num_envs, dtype=np.bool_)
+
+        # hit: add a card to the player hand, bust is an immediate loss
+        hit = np.flatnonzero((actions == 1) & ~autoreset)
+        self._add_cards(hit, self._player_sum, self._player_ace, self._player_cards)
+        busted = hit[_hand_value(self._player_sum[hit], self._player_ace[hit]) > 21]
+        terminations[busted] = True
+        rewards[busted] = -1.0
+
+        # stick: play out the dealer hands and score
+        stick = np.flatnonzero((actions == 0) & ~autoreset)
+        drawing = stick
+        while len(drawing):
+            drawing = drawing[_hand_value(self._dealer_sum[drawing], self._dealer_ace[drawing]) < 17]
+            self._add_cards(drawing, self._dealer_sum, self._dealer_ace, self._dealer_cards)
+
+        player_score = _hand_value(self._player_sum[stick], self._player_ace[stick])
+        dealer_score = _hand_value(self._dealer_sum[stick], self._dealer_ace[stick])
+        dealer_score[dealer_score > 21] = 0
+        reward = np.sign(player_score - dealer_score).astype(np.float64)
+
+        player_natural = self._is_natural(stick, self._player_sum, self._player_ace, self._player_cards)
+        if self.sab:
+            # Player automatically wins. Rules consistent with S&B
+            dealer_natural = self._is_natural(stick, self._dealer_sum, self._dealer_ace, self._dealer_cards)
+            reward[player_natural & ~dealer_natural] = 1.0
+        elif self.natural:
+            # Natural gives extra points, but doesn't autowin. Legacy implementation
+            reward[player_natural & (reward == 1.0)] = 1.5
+        terminations[stick] = True
+        rewards[stick] = reward
+
+        self._elapsed_steps += 1
+        if self.max_episode_steps is not None:
+            truncations = self._elapsed_steps >= self.max_episode_steps
+        else:
+            truncations = np.zeros(self.num_envs, dtype=np.bool_)
+
+        # sub-envs that finished on the previous step are reset instead of stepped
+        for i in np.flatnonzero(autoreset):
+            self._reset_env(i, None)
+        truncations[autoreset] = False
+
+        self._autoreset_envs = terminations | truncations
+
+        return self._get_obs(), rewards, terminations, truncations, {}
+
+    def _reset_env(self, index: int, seed: Optional[int]):
+        if seed is not None or self._np_randoms[index] is None:
+            self._np_randoms[index], _ = seeding.np_random(seed)
+        else:
+            self._rewind(index)
+        np_random = self._np_randoms[index]
+
+        # same draws as BlackjackEnv.reset: dealer and player hands, then the (rendering only) dealer card suit and face
+        dealer_1, dealer_2, player_1, player_2 = self._deck[np_random.integers(0, len(deck), size=4)]
+        np_random.integers(0, 4)
+        if dealer_1 == 10:
+            np_random.integers(0, 3)
+
+        self._dealer_card[index] = dealer_1
+        self._dealer_sum[index] = dealer_1 + dealer_2
+        self._dealer_ace[index] = dealer_1 == 1 or dealer_2 == 1
+        self._dealer_cards[index] = 2
+        self._player_sum[index] = player_1 + player_2
+        self._player_ace[index] = player_1 == 1 or player_2 == 1
+        self._player_cards[index] = 2
+
+        self._fill_cards(index)
+        self._elapsed_steps[index] = 0
+
+    def _fill_cards(self, index: int):
+        self._buffer_states[index] = self._np_randoms[index].bit_generator.state
+        self._cards[index] = self._deck[self._np_randoms[index].integers(0, len(deck), size=self.card_buffer)]
+        self._next_card[index] = 0
+
+    def _rewind(self, index: int):
+        """Puts the generator back right after the last dealt card, as if the cards were drawn one by one"""
+        np_random = self._np_randoms[index]
+        np_random.bit_generator.state = self._buffer_states[index]
+        np_random.integers(0, len(deck), size=self._next_card[index])
+
+    def _add_cards(self, indices, hand_sum, hand_ace, hand_cards):
+        """Deals the next buffered card to the hand of each of the sub-envs `indices`"""
+        for i in indices[self._next_card[indices] >= self.card_buffer]:
+            # the generator continues where the previous buffer ended, so the cards are the same as drawing one by one
+            self._fill_cards(i)
+
+        cards = self._cards[indices, self._next_card[indices]]
+        self._next_card[indices] += 1
+
+        hand_sum[indices] += cards
+        hand_ace[indices] |= cards == 1
+        hand_cards[indices] += 1
+
+    @staticmethod
+    def _is_natural(indices, hand_sum, hand_ace, hand_cards):
+        return (hand_cards[indices] == 2) & hand_ace[indices] & (hand_sum[indices] == 11)
+
+    def _get_obs(self):
+        return {
+            "players_sum": _hand_value(self._player_sum, self._player_ace),
+            "dealers_card": self._dealer_card.copy(),
+            "usable_ace": _usable_ace(self._player_sum, self._player_ace).astype(np.int64)
+        }
+
+    get_observation_schema = BlackjackEnv.get_observation_schema
+    get_action_schema = BlackjackEnv.get_action_schema
+    get_goal_description = BlackjackEnv.get_goal_description
+
+
+def _usable_ace(hand_sum, hand_ace):
+    return hand_ace & (hand_sum + 10 <= 21)
+
+
+def _hand_value(hand_sum, hand_ace):
+    return np.where(_usable_ace(hand_sum, hand_ace), hand_sum + 10, hand_sum)
+
 
 
 # Pixel art from Mariia Khmelnytska (https://www.123rf.com/photo_104453049_stock-vector-pixel-art-playing-cards-standart-deck-vector-set.html)
@@ -180,6 +180,10 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
     `wind_power` dictates the maximum magnitude of linear wind applied to the craft. The recommended value for `wind_power` is between 0.0 and 20.0.
     `turbulence_power` dictates the maximum magnitude of rotational wind applied to the craft. The recommended value for `turbulence_power` is between 0.0 and 2.0.
 
+    With `reuse_bodies=True` (default) the moon, lander and legs bodies are created on the first reset and kept afterwards, only their
+    fixtures (the terrain changes every episode) and joints are recreated. Episodes are bit-for-bit identical to recreating the bodies
+    (`reuse_bodies=False`) for the same seeds and history.
+
     ## Version History
     - v2: Count energy spent and in v0.24, added turbulence with wind power and turbulence_power parameters
     - v1: Legs contact with ground added in state vector; contact with ground
@@ -234,6 +238,7 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
         enable_wind: bool = False,
         wind_power: float = 15.0,
         turbulence_power: float = 1.5,
+        reuse_bodies: bool = True,
     ):
         EzPickle.__init__(
             self,
@@ -243,6 +248,7 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
             enable_wind,
             wind_power,
             turbulence_power,
+            reuse_bodies,
         )
 
         assert (
@@ -280,6 +286,35 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
         self.lander: Optional[Box2D.b2Body] = None
         self.particles = []
 
+        # bodies are kept between episodes, only their fixtures and joints are recreated on reset
+        self.reuse_bodies = reuse_bodies
+
+        # fixture definitions shared by every reset, the terrain edge vertices are set before each use
+        self._ground_fixture = fixtureDef(
+            shape=edgeShape(vertices=[(0, 0), (VIEWPORT_W / SCALE, 0)])
+        )
+        self._terrain_shape = edgeShape()
+        self._terrain_fixture = fixtureDef(
+            shape=self._terrain_shape, density=0, friction=0.1
+        )
+        self._lander_fixture = fixtureDef(
+            shape=polygonShape(
+                vertices=[(x / SCALE, y / SCALE) for x, y in LANDER_POLY]
+            ),
+            density=5.0,
+            friction=0.1,
+            categoryBits=0x0010,
+            maskBits=0x001,  # collide only with ground
+            restitution=0.0,
+        )  # 0.99 bouncy
+        self._leg_fixture = fixtureDef(
+            shape=polygonShape(box=(LEG_W / SCALE, LEG_H / SCALE)),
+            density=1.0,
+            restitution=0.0,
+            categoryBits=0x0020,
+            maskBits=0x001,
+        )
+
         self.prev_reward = None
 
         self.continuous = continuous
@@ -349,6 +384,26 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
         self.world.DestroyBody(self.legs[0])
         self.world.DestroyBody(self.legs[1])
 
+    def _detach_bodies(self):
+        """Removes the fixtures and joints of the moon, lander and legs, keeping the bodies for the next episode"""
+        self.world.contactListener = None
+        self._clean_particles(True)
+        # same order as DestroyBody (joints, then fixtures from the last created one), so that the broad-phase
+        # reuses its proxy ids as when the bodies are recreated and the simulation stays bit-for-bit identical
+        for leg in reversed(self.legs):
+            self.world.DestroyJoint(leg.joint)
+        for body in [self.moon, self.lander] + self.legs:
+            for fixture in reversed(body.fixtures):
+                body.DestroyFixture(fixture)
+
+    @staticmethod
+    def _place_body(body, position, angle):
+        body.position = position
+        body.angle = angle
+        body.linearVelocity = (0, 0)
+        body.angularVelocity = 0
+        body.awake = True
+
     def reset(
         self,
         *,
@@ -356,8 +411,12 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
         options: Optional[dict] = None,
     ):
         super().reset(seed=seed)
-        self._destroy()
-        self.world.contactListener_keepref = ContactDetector(self)
+        reuse = self.reuse_bodies and self.moon is not None
+        if reuse:
+            self._detach_bodies()
+        else:
+            self._destroy()
+            self.world.contactListener_keepref = ContactDetector(self)
         self.world.contactListener = self.world.contactListener_keepref
         self.game_over = False
         self.prev_shaping = None
@@ -382,14 +441,16 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
             for i in range(CHUNKS)
         ]
 
-        self.moon = self.world.CreateStaticBody(
-            shapes=edgeShape(vertices=[(0, 0), (W, 0)])
-        )
+        if reuse:
+            self.moon.CreateFixture(self._ground_fixture)
+        else:
+            self.moon = self.world.CreateStaticBody(fixtures=self._ground_fixture)
         self.sky_polys = []
         for i in range(CHUNKS - 1):
             p1 = (chunk_x[i], smooth_y[i])
             p2 = (chunk_x[i + 1], smooth_y[i + 1])
-            self.moon.CreateEdgeFixture(vertices=[p1, p2], density=0, friction=0.1)
+            self._terrain_shape.vertices = [p1, p2]
+            self.moon.CreateFixture(self._terrain_fixture)
             self.sky_polys.append([p1, p2, (p2[0], H), (p1[0], H)])
 
         self.moon.color1 = (0.0, 0.0, 0.0)
@@ -398,20 +459,15 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
         # Create Lander body
         initial_y = VIEWPORT_H / SCALE
         initial_x = VIEWPORT_W / SCALE / 2
-        self.lander: Box2D.b2Body = self.world.CreateDynamicBody(
-            position=(initial_x, initial_y),
-            angle=0.0,
-            fixtures=fixtureDef(
-                shape=polygonShape(
-                    vertices=[(x / SCALE, y / SCALE) for x, y in LANDER_POLY]
-                ),
-                density=5.0,
-                friction=0.1,
-                categoryBits=0x0010,
-                maskBits=0x001,  # collide only with ground
-                restitution=0.0,
-            ),  # 0.99 bouncy
-        )
+        if reuse:
+            self._place_body(self.lander, (initial_x, initial_y), 0.0)
+            self.lander.CreateFixture(self._lander_fixture)
+        else:
+            self.lander: Box2D.b2Body = self.world.CreateDynamicBody(
+                position=(initial_x, initial_y),
+                angle=0.0,
+                fixtures=self._lander_fixture,
+            )
         self.lander.color1 = (128, 102, 230)
         self.lander.color2 = (77, 77, 128)
 
@@ -425,18 +481,22 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
         )
 
         # Create Lander Legs
-        self.legs = []
-        for i in [-1, +1]:
+        if not reuse:
+            self.legs = []
+        for k, i in enumerate([-1, +1]):
+            if reuse:
+                leg = self.legs[k]
+                self._place_body(leg, (initial_x - i * LEG_AWAY / SCALE, initial_y), i * 0.05)
+                leg.CreateFixture(self._leg_fixture)
+                leg.ground_contact = False
+                # the joint definition refers to the same lander and leg bodies
+                leg.joint = self.world.CreateJoint(leg.joint_def)
+                continue
+
             leg = self.world.CreateDynamicBody(
                 position=(initial_x - i * LEG_AWAY / SCALE, initial_y),
                 angle=(i * 0.05),
-                fixtures=fixtureDef(
-                    shape=polygonShape(box=(LEG_W / SCALE, LEG_H / SCALE)),
-                    density=1.0,
-                    restitution=0.0,
-                    categoryBits=0x0020,
-                    maskBits=0x001,
-                ),
+                fixtures=self._leg_fixture,
             )
             leg.ground_contact = False
             leg.color1 = (128, 102, 230)
@@ -459,6 +519,7 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
             else:
                 rjd.lowerAngle = -0.9
                 rjd.upperAngle = -0.9 + 0.5
+            leg.joint_def = rjd
             leg.joint = self.world.CreateJoint(rjd)
             self.legs.append(leg)
 
@@ -813,6 +874,33 @@ class LunarLander(gym.Env, EzPickle, LLMEnv):
             pygame.quit()
             self.isopen = False
 
+    def heuristic_action(self, observation):
+        """Scripted controller (gymnasium's lunar lander heuristic), used as a fallback when the LLM is too slow"""
+        x, y, vx, vy = observation['lander_cartesian']
+        angle, angular_velocity = observation['lander_angular']
+        left_contact, right_contact = observation['legs_contact']
+
+        angle_targ = np.clip(x * 0.5 + vx * 1.0, -0.4, 0.4)  # angle should point towards center
+        hover_targ = 0.55 * np.abs(x)  # target y should be proportional to horizontal offset
+
+        angle_todo = (angle_targ - angle) * 0.5 - angular_velocity * 1.0
+        hover_todo = (hover_targ - y) * 0.5 - vy * 0.5
+
+        if left_contact or right_contact:
+            angle_todo = 0
+            hover_todo = -vy * 0.5  # override to reduce fall speed, that's all we need after contact
+
+        if self.continuous:
+            return np.clip(np.array([hover_todo * 20 - 1, -angle_todo * 20]), -1, +1)
+
+        if hover_todo > np.abs(angle_todo) and hover_todo > 0.05:
+            return 2
+        if angle_todo < -0.05:
+            return 3
+        if angle_todo > +0.05:
+            return 1
+        return 0
+
 
     def get_action_schema(self):
         return {
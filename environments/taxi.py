@@ -1,4 +1,5 @@
 from contextlib import closing
+from functools import lru_cache
 from io import StringIO
 from os import path
 from typing import Optional
@@ -9,8 +10,12 @@ import gymnasium as gym
 from gymnasium import Env, spaces, utils
 from gymnasium.envs.toy_text.utils import categorical_sample
 from gymnasium.error import DependencyNotInstalled
+from gymnasium.utils import seeding
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
 
 from gym_llm import LLMEnv
+from .vector import get_vector_seeds, get_reset_mask
 
 
 MAP = [
@@ -23,6 +28,123 @@ MAP = [
     "+---------+",
 ]
 WINDOW_SIZE = (550, 350)
+LOCS = [(0, 0), (0, 4), (4, 0), (4, 3)]
+
+
+def _encode(taxi_row, taxi_col, pass_loc, dest_idx):
+    # (5) 5, 5, 4
+    i = taxi_row
+    i *= 5
+    i += taxi_col
+    i *= 5
+    i += pass_loc
+    i *= 4
+    i += dest_idx
+    return i
+
+
+@lru_cache(maxsize=None)
+def _transition_tables():
+    """Dense transition model of the map: next state, reward, termination and action mask per (state, action),
+    built once per process and made read-only since it is shared by every env."""
+    desc = np.asarray(MAP, dtype="c")
+    locs = LOCS
+
+    num_states = 500
+    num_rows = 5
+    num_columns = 5
+    max_row = num_rows - 1
+    max_col = num_columns - 1
+    num_actions = 6
+
+    initial_state_distrib = np.zeros(num_states)
+    next_states = np.zeros((num_states, num_actions), dtype=np.int64)
+    rewards = np.zeros((num_states, num_actions), dtype=np.int64)
+    terminations = np.zeros((num_states, num_actions), dtype=np.bool_)
+    action_masks = np.zeros((num_states, num_actions), dtype=np.int8)
+
+    for row in range(num_rows):
+        for col in range(num_columns):
+            for pass_idx in range(len(locs) + 1):  # +1 for being inside taxi
+                for dest_idx in range(len(locs)):
+                    state = _encode(row, col, pass_idx, dest_idx)
+                    if pass_idx < 4 and pass_idx != dest_idx:
+                        initial_state_distrib[state] += 1
+                    taxi_loc = (row, col)
+                    for action in range(num_actions):
+                        # defaults
+                        new_row, new_col, new_pass_idx = row, col, pass_idx
+                        reward = (
+                            -1
+                        )  # default reward when there is no pickup/dropoff
+                        terminated = False
+
+                        if action == 0:
+                            new_row = min(row + 1, max_row)
+                        elif action == 1:
+                            new_row = max(row - 1, 0)
+                        if action == 2 and desc[1 + row, 2 * col + 2] == b":":
+                            new_col = min(col + 1, max_col)
+                        elif action == 3 and desc[1 + row, 2 * col] == b":":
+                            new_col = max(col - 1, 0)
+                        elif action == 4:  # pickup
+                            if pass_idx < 4 and taxi_loc == locs[pass_idx]:
+                                new_pass_idx = 4
+                            else:  # passenger not at location
+                                reward = -10
+                        elif action == 5:  # dropoff
+                            if (taxi_loc == locs[dest_idx]) and pass_idx == 4:
+                                new_pass_idx = dest_idx
+                                terminated = True
+                                reward = 20
+                            elif (taxi_loc in locs) and pass_idx == 4:
+                                new_pass_idx = locs.index(taxi_loc)
+                            else:  # dropoff at wrong location
+                                reward = -10
+                        next_states[state, action] = _encode(
+                            new_row, new_col, new_pass_idx, dest_idx
+                        )
+                        rewards[state, action] = reward
+                        terminations[state, action] = terminated
+
+                    # action mask
+                    action_masks[state] = [
+                        row < 4,
+                        row > 0,
+                        col < 4 and desc[row + 1, 2 * col + 2] == b":",
+                        col > 0 and desc[row + 1, 2 * col] == b":",
+                        pass_idx < 4 and taxi_loc == locs[pass_idx],
+                        pass_idx == 4 and (taxi_loc == locs[dest_idx] or taxi_loc in locs),
+                    ]
+    initial_state_distrib /= initial_state_distrib.sum()
+
+    tables = {
+        "next_states": next_states,
+        "rewards": rewards,
+        "terminations": terminations,
+        "action_masks": action_masks,
+        "initial_state_distrib": initial_state_distrib,
+    }
+    for table in tables.values():
+        table.flags.writeable = False
+    return tables
+
+
+@lru_cache(maxsize=None)
+def _optimal_actions():
+    """Best action per state, by value iteration over the (deterministic) transition tables"""
+    tables = _transition_tables()
+    values = np.zeros(len(tables["next_states"]))
+    while True:
+        q_values = tables["rewards"] + ~tables["terminations"] * values[tables["next_states"]]
+        new_values = q_values.max(axis=1)
+        if np.array_equal(new_values, values):
+            break
+        values = new_values
+
+    actions = q_values.argmax(axis=1)
+    actions.flags.writeable = False
+    return actions
 
 
 class TaxiEnv(Env, LLMEnv):
@@ -157,65 +279,19 @@ class TaxiEnv(Env, LLMEnv):
     def __init__(self, render_mode: Optional[str] = None):
         self.desc = np.asarray(MAP, dtype="c")
 
-        self.locs = locs = [(0, 0), (0, 4), (4, 0), (4, 3)]
+        self.locs = LOCS
         self.locs_colors = [(255, 0, 0), (0, 255, 0), (255, 255, 0), (0, 0, 255)]
 
-        num_states = 500
-        num_rows = 5
-        num_columns = 5
-        max_row = num_rows - 1
-        max_col = num_columns - 1
-        self.initial_state_distrib = np.zeros(num_states)
-        num_actions = 6
-        self.P = {
-            state: {action: [] for action in range(num_actions)}
-            for state in range(num_states)
-        }
-        for row in range(num_rows):
-            for col in range(num_columns):
-                for pass_idx in range(len(locs) + 1):  # +1 for being inside taxi
-                    for dest_idx in range(len(locs)):
-                        state = self.encode(row, col, pass_idx, dest_idx)
-                        if pass_idx < 4 and pass_idx != dest_idx:
-                            self.initial_state_distrib[state] += 1
-                        for action in range(num_actions):
-                            # defaults
-                            new_row, new_col, new_pass_idx = row, col, pass_idx
-                            reward = (
-                                -1
-                            )  # default reward when there is no pickup/dropoff
-                            terminated = False
-                            taxi_loc = (row, col)
-
-                            if action == 0:
-                                new_row = min(row + 1, max_row)
-                            elif action == 1:
-                                new_row = max(row - 1, 0)
-                            if action == 2 and self.desc[1 + row, 2 * col + 2] == b":":
-                                new_col = min(col + 1, max_col)
-                            elif action == 3 and self.desc[1 + row, 2 * col] == b":":
-                                new_col = max(col - 1, 0)
-                            elif action == 4:  # pickup
-                                if pass_idx < 4 and taxi_loc == locs[pass_idx]:
-                                    new_pass_idx = 4
-                                else:  # passenger not at location
-                                    reward = -10
-                            elif action == 5:  # dropoff
-                                if (taxi_loc == locs[dest_idx]) and pass_idx == 4:
-                                    new_pass_idx = dest_idx
-                                    terminated = True
-                                    reward = 20
-                                elif (taxi_loc in locs) and pass_idx == 4:
-                                    new_pass_idx = locs.index(taxi_loc)
-                                else:  # dropoff at wrong location
-                                    reward = -10
-                            new_state = self.encode(
-                                new_row, new_col, new_pass_idx, dest_idx
-                            )
-                            self.P[state][action].append(
-                                (1.0, new_state, reward, terminated)
-                            )
-        self.initial_state_distrib /= self.initial_state_distrib.sum()
+        # dense transition model shared (read-only) by every env of the process
+        tables = _transition_tables()
+        self.next_states = tables["next_states"]
+        self.rewards = tables["rewards"]
+        self.terminations = tables["terminations"]
+        self.action_masks = tables["action_masks"]
+        self.initial_state_distrib = tables["initial_state_distrib"]
+        self._P = None
+
+        num_states, num_actions = self.next_states.shape
         self.action_space = spaces.Discrete(num_actions)
         self.observation_space = spaces.Dict(
             {'state': spaces.Discrete(num_states)}
@@ -238,16 +314,23 @@ class TaxiEnv(Env, LLMEnv):
         self.median_vert = None
         self.background_img = None
 
+    @property
+    def P(self):
+        """Transition model in the toy-text format `P[state][action] = [(prob, next_state, reward, terminated)]`,
+        built from the dense tables on first access"""
+        if self._P is None:
+            self._P = {
+                state: {
+                    action: [(1.0, int(self.next_states[state, action]), int(self.rewards[state, action]),
+                              bool(self.terminations[state, action]))]
+                    for action in range(self.next_states.shape[1])
+                }
+                for state in range(self.next_states.shape[0])
+            }
+        return self._P
+
     def encode(self, taxi_row, taxi_col, pass_loc, dest_idx):
-        # (5) 5, 5, 4
-        i = taxi_row
-        i *= 5
-        i += taxi_col
-        i *= 5
-        i += pass_loc
-        i *= 4
-        i += dest_idx
-        return i
+        return _encode(taxi_row, taxi_col, pass_loc, dest_idx)
 
     def decode(self, i):
         out = []
@@ -262,36 +345,20 @@ class TaxiEnv(Env, LLMEnv):
         return reversed(out)
 
     def action_mask(self, state: int):
-        """Computes an action mask for the action space using the state information."""
-        mask = np.zeros(6, dtype=np.int8)
-        taxi_row, taxi_col, pass_loc, dest_idx = self.decode(state)
-        if taxi_row < 4:
-            mask[0] = 1
-        if taxi_row > 0:
-            mask[1] = 1
-        if taxi_col < 4 and self.desc[taxi_row + 1, 2 * taxi_col + 2] == b":":
-            mask[2] = 1
-        if taxi_col > 0 and self.desc[taxi_row + 1, 2 * taxi_col] == b":":
-            mask[3] = 1
-        if pass_loc < 4 and (taxi_row, taxi_col) == self.locs[pass_loc]:
-            mask[4] = 1
-        if pass_loc == 4 and (
-            (taxi_row, taxi_col) == self.locs[dest_idx]
-            or (taxi_row, taxi_col) in self.locs
-        ):
-            mask[5] = 1
-        return mask
+        """Action mask of the state (a copy of the precomputed row)."""
+        return self.action_masks[state].copy()
 
     def step(self, a):
-        transitions = self.P[self.s][a]
-        i = categorical_sample([t[0] for t in transitions], self.np_random)
-        p, s, r, t = transitions[i]
+        # transitions are deterministic, no sampling needed
+        s = int(self.next_states[self.s, a])
+        r = int(self.rewards[self.s, a])
+        t = bool(self.terminations[self.s, a])
         self.s = s
         self.lastaction = a
 
         if self.render_mode == "human":
             self.render()
-        return {'state': int(s)}, r, t, False, {"prob": p, "action_mask": self.action_mask(s)}
+        return {'state': s}, r, t, False, {"prob": 1.0, "action_mask": self.action_mask(s)}
 
     def reset(
         self,
@@ -560,6 +627,114 @@ class TaxiEnv(Env, LLMEnv):
         +---------+
         """
 
+    def get_reward_type(self):
+        return int
+
+    def heuristic_action(self, observation):
+        """Optimal action of the state (shortest path to the passenger and then to the destination)"""
+        return int(_optimal_actions()[int(observation['state'])])
+
+
+
+class TaxiVectorEnv(VectorEnv, LLMEnv):
+    """Steps `num_envs` independent taxi episodes at once by indexing the shared transition tables with arrays.
+
+    Each sub-env keeps its own random generator, so an episode reset with a given seed starts from the same state
+    as `TaxiEnv`. Finished sub-envs are reset on the next step (gymnasium next-step autoreset) or through
+    `reset(options={'reset_mask': mask})`. Rendering is not supported, use the sync vectorization mode for it.
+    """
+
+    metadata = {
+        "render_modes": [],
+        "autoreset_mode": AutoresetMode.NEXT_STEP,
+    }
+
+    def __init__(self, num_envs: int, render_mode: Optional[str] = None, max_episode_steps: Optional[int] = None):
+        if render_mode is not None:
+            raise ValueError(
+                f"TaxiVectorEnv does not render, got render_mode={render_mode}. Use vectorization_mode='sync' to render"
+            )
+
+        tables = _transition_tables()
+        self.next_states = tables["next_states"]
+        self.rewards = tables["rewards"]
+        self.terminations = tables["terminations"]
+        self.action_masks = tables["action_masks"]
+        self.initial_state_distrib = tables["initial_state_distrib"]
+
+        num_states, num_actions = self.next_states.shape
+        self.num_envs = num_envs
+        self.render_mode = render_mode
+        self.max_episode_steps = max_episode_steps
+
+        self.single_action_space = spaces.Discrete(num_actions)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.single_observation_space = spaces.Dict({'state': spaces.Discrete(num_states)})
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        self._np_randoms = [None] * num_envs
+        self._states = np.zeros(num_envs, dtype=np.int64)
+        self._elapsed_steps = np.zeros(num_envs, dtype=np.int64)
+        self._autoreset_envs = np.zeros(num_envs, dtype=np.bool_)
+
+    def reset(
+        self,
+        *,
+        seed=None,
+        options: Optional[dict] = None,
+    ):
+        seeds = get_vector_seeds(seed, self.num_envs)
+        reset_mask = get_reset_mask(options, self.num_envs)
+
+        for i in np.flatnonzero(reset_mask):
+            self._reset_env(i, seeds[i])
+        self._autoreset_envs[reset_mask] = False
+
+        return self._get_obs(), self._get_info()
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        states = self._states
+
+        rewards = self.rewards[states, actions].astype(np.float64)
+        terminations = self.terminations[states, actions].copy()
+        self._states = self.next_states[states, actions]
+
+        self._elapsed_steps += 1
+        if self.max_episode_steps is not None:
+            truncations = self._elapsed_steps >= self.max_episode_steps
+        else:
+            truncations = np.zeros(self.num_envs, dtype=np.bool_)
+
+        # sub-envs that finished on the previous step are reset instead of stepped
+        autoreset = self._autoreset_envs
+        for i in np.flatnonzero(autoreset):
+            self._reset_env(i, None)
+        rewards[autoreset] = 0.0
+        terminations[autoreset] = False
+        truncations[autoreset] = False
+
+        self._autoreset_envs = terminations | truncations
+
+        return self._get_obs(), rewards, terminations, truncations, self._get_info()
+
+    def _reset_env(self, index: int, seed: Optional[int]):
+        if seed is not None or self._np_randoms[index] is None:
+            self._np_randoms[index], _ = seeding.np_random(seed)
+        self._states[index] = categorical_sample(self.initial_state_distrib, self._np_randoms[index])
+        self._elapsed_steps[index] = 0
+
+    def _get_obs(self):
+        return {'state': self._states.copy()}
+
+    def _get_info(self):
+        return {"action_mask": self.action_masks[self._states], "_action_mask": np.ones(self.num_envs, dtype=np.bool_)}
+
+    get_action_schema = TaxiEnv.get_action_schema
+    get_observation_schema = TaxiEnv.get_observation_schema
+    get_goal_description = TaxiEnv.get_goal_description
+    get_reward_type = TaxiEnv.get_reward_type
+
 
 # Taxi rider from https://franuka.itch.io/rpg-asset-pack
 # All other assets by Mel Tillery http://www.cyaneus.com/
\ No newline at end of file
@@ -0,0 +1,29 @@
+from typing import List, Optional
+
+import numpy as np
+
+
+def get_vector_seeds(seed, num_envs: int) -> List[Optional[int]]:
+    """Per sub-env seeds, following gymnasium: None, an int (`seed + i`) or a list of `num_envs` seeds"""
+    if seed is None:
+        return [None] * num_envs
+
+    if isinstance(seed, (int, np.integer)):
+        return [int(seed) + i for i in range(num_envs)]
+
+    if len(seed) != num_envs:
+        raise ValueError(f'If seeds are passed as a list the length must match num_envs={num_envs} but got length={len(seed)}')
+
+    return list(seed)
+
+
+def get_reset_mask(options: Optional[dict], num_envs: int) -> np.ndarray:
+    """Sub-envs to reset: `options['reset_mask']` if given, all of them otherwise"""
+    if options is None or 'reset_mask' not in options:
+        return np.ones(num_envs, dtype=np.bool_)
+
+    reset_mask = options['reset_mask']
+    if not isinstance(reset_mask, np.ndarray) or reset_mask.dtype != np.bool_ or reset_mask.shape != (num_envs,):
+        raise ValueError(f"options['reset_mask'] must be a boolean numpy array of shape ({num_envs},), got {reset_mask}")
+
+    return reset_mask
@@ -1,12 +1,17 @@
-from gym_llm.agent import Agent
+from gym_llm.agent import Agent, BatchAgent
 from gym_llm.llm_env import LLMEnv
 from gym_llm.utils import parse_config, get_env_definition, get_env, run_experiment
+from gym_llm.sweep import run_sweep
+from gym_llm.replay import replay_experiment
 
 __all__ = [
     'Agent',
+    'BatchAgent',
     'LLMEnv',
     'parse_config',
     'get_env_definition',
     'get_env',
-    'run_experiment'
+    'run_experiment',
+    'run_sweep',
+    'replay_experiment'
 ]
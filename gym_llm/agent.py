@@ -1,9 +1,14 @@
+import asyncio
 import gymnasium as gym
 
-from typing import Dict
+from typing import Dict, List, Sequence
 
+from gym_llm.encoders import get_observation_encoder
 from gym_llm.llms.ollama_llm import OllamaLLM
 from gym_llm.llms.openai_llm import OpenAILLM
+from gym_llm.llms.cache import get_response_cache, DEFAULT_CACHE_PATH, DEFAULT_MAX_SIZE_MB
+from gym_llm.llms.rate_limit import (get_rate_limiter, DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_RETRIES, DEFAULT_BACKOFF,
+                                     DEFAULT_MAX_BACKOFF)
 from gym_llm.logger import get_logger
 
 
@@ -16,6 +21,13 @@ class Agent:
 
         self.llm = None
 
+        # streaming parses the action as soon as it is generated, so it is asked before the reflection
+        self.stream = config.get('stream', False)
+
+        def answer_fields(reflection, action, indent, separator=','):
+            fields = [f'"action": {action}', f'"reflection": {reflection}'] if self.stream else [f'"reflection": {reflection}', f'"action": {action}']
+            return f'{"," if self.stream else separator}\n{indent}'.join(fields)
+
         self.system_prompt = f"""You are an intelligent agent interacting with a dynamic environment.
         Your task is to achieve the following goal: {goal_description}.
         You will be provided with the most recent observation and a flag indicating if it is the initial observation.
@@ -25,8 +37,7 @@ class Agent:
         When deciding on an action, you should output the key corresponding to that action, not its description.
         You are required to produce a JSON object with the following format:
         {{
-          "reflection": <short_reasoning>,
-          "action": <action_key>
+          {answer_fields('<short_reasoning>', '<action_key>', '          ')}
         }}
         Your reflection should be concise, serving as a brief chain of thought. Ensure that each reflection is unique and please, you must strictly consider the observation input for the reflection. 
         You have already been provided with the observation and action schema. Do not invent anything.
@@ -34,15 +45,13 @@ class Agent:
         Example answer for some use case:
         If the observation shows that the agent is near a wall and the goal is to move forward (0: left, 1: forward), the reflection might be:
         {{
-        "reflection": "Since the agent is near a wall, moving forward might result in a collision. It would be better to turn left to avoid the obstacle and continue toward the goal."
-        "action": "0"
+        {answer_fields('"Since the agent is near a wall, moving forward might result in a collision. It would be better to turn left to avoid the obstacle and continue toward the goal."', '"0"', '        ', separator='')}
         }}
         
         Another Example reasoning:
         If the observation shows that the agent is in an open area with the goal to reach a specific point ahead (0: left, 1: forward, 2: backward, 4: right), the reflection might be:
         {{
-          "reflection": "The agent is in an open area with no obstacles in front, so moving forward is the most direct path to reach the goal. It does not make sense to go backward or turn left or right.",
-          "action": "1"
+          {answer_fields('"The agent is in an open area with no obstacles in front, so moving forward is the most direct path to reach the goal. It does not make sense to go backward or turn left or right."', '"1"', '          ')}
         }}
         
         You must provide in the reflection key a reasoning of the effect of each of the actions (on the action schema) as depicted in the previous examples.
@@ -58,61 +67,175 @@ class Agent:
         self.action_count = -1
         self.last_action = None
 
-        if self.action_rate > history_len:
+        if history_len is not None and self.action_rate > history_len:
             raise ValueError('Action rate must be less than equal to history length')
 
+        llm_kwargs = {}
+        if config.get('max_context_tokens', None) is not None:
+            llm_kwargs['max_context_tokens'] = config['max_context_tokens']
+
         self.action_schema = action_schema
 
+        self.observation_encoder = get_observation_encoder(config.get('observation_format', 'repr'),
+                                                           observation_schema=observation_schema,
+                                                           float_precision=config.get('float_precision', 3))
+
         if backend == 'ollama':
-            self.llm = OllamaLLM(model=model, temperature=temperature, system_prompt=self.system_prompt, history_len=history_len)
+            self.llm = OllamaLLM(model=model, temperature=temperature, system_prompt=self.system_prompt, history_len=history_len,
+                                 keep_alive=config.get('keep_alive', None), incremental=config.get('incremental', False),
+                                 host=config.get('host', None), warmup=config.get('warmup', False), **llm_kwargs)
         elif backend == 'openai':
-            self.llm = OpenAILLM(model=model, temperature=temperature, system_prompt=self.system_prompt, history_len=history_len)
+            self.llm = OpenAILLM(model=model, temperature=temperature, system_prompt=self.system_prompt, history_len=history_len,
+                                 base_url=config.get('base_url', None), **llm_kwargs)
         else:
             raise ValueError('Unknown LLM backend')
 
+        rate_limit_config = get_rate_limit_config(config)
+        if rate_limit_config is not None:
+            if backend != 'openai':
+                raise ValueError('Rate limiting is only available with the openai backend')
+            # every agent of the process calling the same endpoint and model shares the budgets
+            self.llm.set_rate_limiter(get_rate_limiter(f'{self.llm.openai_client.base_url}|{model}', **rate_limit_config))
+
+        if self.stream:
+            self.llm.set_stream(remainder=config.get('stream_remainder', 'cancel'))
+
+        cache_config = get_cache_config(config)
+        if cache_config is not None:
+            self.llm.set_cache(get_response_cache(path=cache_config['path'], max_size_mb=cache_config['max_size_mb']),
+                               bypass=cache_config['bypass'])
+
     def get_action(self, observation: gym.spaces.Dict):
+        if not self.observe(observation):
+            return {'reflection': '', 'action': self.last_action}, self.last_action
+
+        return self.act(self.llm.generate())
+
+    async def aget_action(self, observation: gym.spaces.Dict):
+        if not self.observe(observation):
+            return {'reflection': '', 'action': self.last_action}, self.last_action
+
+        return self.act(await self.llm.agenerate())
+
+    def observe(self, observation: gym.spaces.Dict) -> bool:
+        """Appends the observation to the history and returns whether an action must be generated"""
         self.action_count += 1
 
         self.llm.history.append(
             {
                 'role': 'user',
-                'content':
-                    str({
-                        'observation': str(observation),
-                        'start': self.action_count == 0
-                    })
+                'content': self.observation_encoder.encode(observation, start=self.action_count == 0)
             }
         )
 
-        if self.action_count % self.action_rate == 0:
-            result = self.llm.generate()
+        return self.action_count % self.action_rate == 0
 
-            if result['action'] is not None:
-                try:
-                    self.last_action = int(result['action'])
-                except ValueError:
-                    get_logger().warn(f"Action must be an integer, got {result['action']}")
+    def steps_to_decision(self) -> int:
+        """Number of observations until the next one that requires an action (0: the next one)"""
+        return -(self.action_count + 1) % self.action_rate
 
-                result['action'] = self.last_action
-                content = result
+    def act(self, result: Dict):
+        if result['action'] is not None:
+            action = parse_action(result['action'])
+            if action is None:
+                get_logger().warn(f"Action must be an integer, got {result['action']}")
             else:
-                content = {
-                    'reflection': '',
-                    'action': self.last_action
-                }
+                self.last_action = action
 
-            self.llm.history.append(
-                {
-                    'role': 'assistant',
-                    'content': str(content)
-                }
-            )
+            result['action'] = self.last_action
+            content = result
+        else:
+            content = {
+                'reflection': '',
+                'action': self.last_action
+            }
 
-            return result, self.last_action
+        self.llm.history.append(
+            {
+                'role': 'assistant',
+                'content': str(content)
+            }
+        )
 
-        return {'reflection': '', 'action': self.last_action}, self.last_action
+        return result, self.last_action
 
     def reset(self, seed: int | None):
         self.action_count = -1
         self.llm.reset()
         self.last_action = None
+
+
+class BatchAgent:
+    """Drives one `Agent` (with its own history) per sub-environment of a vector environment"""
+
+    def __init__(self,
+                 config: Dict,
+                 num_envs: int,
+                 observation_schema: str,
+                 goal_description: str,
+                 action_schema: str):
+
+        self.agents = [Agent(config=config,
+                             observation_schema=observation_schema,
+                             goal_description=goal_description,
+                             action_schema=action_schema) for _ in range(num_envs)]
+        self.observation_schema = observation_schema
+        self.action_schema = action_schema
+
+    async def aget_actions(self, observations: Sequence, indices: Sequence[int]) -> List:
+        """Asks the agents of the given sub-envs for an action at once, `observations` is indexed by sub-env"""
+        return await asyncio.gather(*[self.agents[i].aget_action(observations[i]) for i in indices])
+
+    def get_actions(self, observations: Sequence, indices: Sequence[int]) -> List:
+        return asyncio.run(self.aget_actions(observations, indices))
+
+    def reset(self, index: int, seed: int | None):
+        self.agents[index].reset(seed=seed)
+
+
+def parse_action(action) -> int | None:
+    """Integer action of an LLM answer, None if it has none or it is not an integer"""
+    if action is None:
+        return None
+    try:
+        return int(action)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_cache_config(config: Dict) -> Dict | None:
+    """Normalizes the agent `cache` entry, which can be a boolean or a dict with path, max_size_mb and bypass"""
+    cache_config = config.get('cache', False)
+
+    if not cache_config:
+        return None
+
+    if cache_config is True:
+        cache_config = {}
+
+    return {
+        'path': cache_config.get('path', DEFAULT_CACHE_PATH),
+        'max_size_mb': cache_config.get('max_size_mb', DEFAULT_MAX_SIZE_MB),
+        'bypass': cache_config.get('bypass', False)
+    }
+
+
+def get_rate_limit_config(config: Dict) -> Dict | None:
+    """Normalizes the agent `rate_limit` entry, which can be a boolean or a dict with rpm, tpm, max_concurrency,
+    max_retries, backoff and max_backoff"""
+    rate_limit_config = config.get('rate_limit', False)
+
+    if not rate_limit_config:
+        return None
+
+    if rate_limit_config is True:
+        rate_limit_config = {}
+
+    return {
+        'rpm': rate_limit_config.get('rpm', None),
+        'tpm': rate_limit_config.get('tpm', None),
+        'max_concurrency': rate_limit_config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+        'max_retries': rate_limit_config.get('max_retries', DEFAULT_MAX_RETRIES),
+        'backoff': rate_limit_config.get('backoff', DEFAULT_BACKOFF),
+        'max_backoff': rate_limit_config.get('max_backoff', DEFAULT_MAX_BACKOFF)
+    }
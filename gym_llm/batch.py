@@ -0,0 +1,134 @@
+import json
+import time
+from pathlib import Path
+from typing import Dict
+
+from gym_llm.episode import start_episode, record_step, finish_episode
+from gym_llm.logger import get_logger
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+BATCH_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class OpenAIBatchClient:
+    """Sends a set of chat completion requests through the OpenAI Batch API and waits for the answers"""
+
+    def __init__(self, client, completion_window: str = '24h', poll_interval: float = 10.0, timeout: float | None = None):
+        self.client = client
+        self.completion_window = completion_window
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def run(self, requests: Dict[str, Dict], input_path: Path) -> Dict[str, str | None]:
+        """Runs the `custom_id -> request body` requests and returns `custom_id -> answer content` (None on failure)"""
+        with open(input_path, 'w') as f:
+            for custom_id, body in requests.items():
+                f.write(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': BATCH_ENDPOINT, 'body': body}) + '\n')
+
+        with open(input_path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose='batch')
+
+        batch = self.client.batches.create(input_file_id=input_file.id,
+                                           endpoint=BATCH_ENDPOINT,
+                                           completion_window=self.completion_window)
+
+        start = time.time()
+        while batch.status not in BATCH_FINAL_STATUSES:
+            if self.timeout is not None and time.time() - start > self.timeout:
+                self.client.batches.cancel(batch.id)
+                raise TimeoutError(f'Batch {batch.id} did not finish in {self.timeout} seconds')
+            time.sleep(self.poll_interval)
+            batch = self.client.batches.retrieve(batch.id)
+
+        answers = {custom_id: None for custom_id in requests}
+
+        if batch.status != 'completed':
+            get_logger().warn(f'Batch {batch.id} finished with status {batch.status}')
+
+        if batch.output_file_id:
+            for line in self.client.files.content(batch.output_file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                output = json.loads(line)
+                response = output.get('response') or {}
+                if response.get('status_code') == 200:
+                    answers[output['custom_id']] = response['body']['choices'][0]['message']['content']
+                else:
+                    get_logger().warn(f'Error in batch request {output["custom_id"]}: {output.get("error") or response}')
+
+        if batch.error_file_id:
+            for line in self.client.files.content(batch.error_file_id).text.splitlines():
+                if line.strip():
+                    output = json.loads(line)
+                    get_logger().warn(f'Error in batch request {output["custom_id"]}: {output.get("error") or output.get("response")}')
+
+        return answers
+
+
+def run_batch_episodes(envs, agents, runs, batch_client: OpenAIBatchClient, work_dir: Path, logger, on_episode,
+                       recorder=None, trajectories=None):
+    """Advances every `(run_idx, seed)` episode in lock-step, one Batch API job per step.
+
+    `envs[k]` and `agents[k]` play `runs[k]`. Cached answers are used directly and never sent. The frames and
+    steps of each run go to its own `recorder` and `trajectories` writers.
+    """
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    episodes = []
+    for env, agent, (run_idx, seed) in zip(envs, agents, runs):
+        obs, _ = env.reset(seed=seed)
+        agent.reset(seed=seed)
+        episode = start_episode(agent, obs, frames=recorder.open(run_idx, seed) if recorder is not None else None,
+                                trajectory=trajectories.open(run_idx, seed) if trajectories is not None else None)
+        episodes.append({**episode, 'run_idx': run_idx, 'seed': seed, 'obs': obs, 'done': False})
+
+    step = 0
+    while not all(episode['done'] for episode in episodes):
+        active = [k for k, episode in enumerate(episodes) if not episode['done']]
+
+        requests = {}
+        answers = {}
+        messages = {}
+        for k in active:
+            if not agents[k].observe(episodes[k]['obs']):
+                continue
+
+            messages[k] = agents[k].llm.get_messages()
+            cached = agents[k].llm.lookup_cache(messages[k])
+            if cached is not None:
+                answers[k] = cached
+            else:
+                requests[f'run-{episodes[k]["run_idx"]}-step-{step}'] = (k, agents[k].llm.request_body(messages[k]))
+
+        if requests:
+            logger.info(f'Submitting batch with {len(requests)} requests for step {step}')
+            contents = batch_client.run({custom_id: body for custom_id, (_, body) in requests.items()},
+                                        input_path=work_dir / f'step_{step}.jsonl')
+            for custom_id, (k, _) in requests.items():
+                answers[k] = contents[custom_id]
+                agents[k].llm.store_cache(messages[k], answers[k])
+
+        for k in active:
+            episode = episodes[k]
+            agent = agents[k]
+
+            if k in messages:
+                raw_output, action = agent.act(agent.llm.parse_answer(answers[k]))
+            else:
+                raw_output, action = {'reflection': '', 'action': agent.last_action}, agent.last_action
+
+            obs, reward, terminated, truncated, _ = envs[k].step(action)
+
+            episode['obs'] = obs
+            episode['done'] = record_step(episode, agent, logger, obs, raw_output, action, reward, terminated, truncated,
+                                          render=envs[k].render)
+
+            if episode['done']:
+                result = finish_episode(episode, agent, logger)
+                if episode['frames'] is not None:
+                    episode['frames'].close()
+                if episode['trajectory'] is not None:
+                    episode['trajectory'].close()
+                on_episode(episode['run_idx'], episode['seed'], result)
+
+        step += 1
@@ -0,0 +1,136 @@
+import itertools
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from gym_llm.trajectory import Trajectory, META_FILE
+
+RUNS_FILE = 'runs.jsonl'
+
+
+def save_completed_run(exp_save_path: Path, run_idx: int, seed: int, episode: Dict):
+    """Appends the totals of a finished run to `runs.jsonl`, the runs a resumed experiment skips"""
+    record = {
+        'run_idx': run_idx,
+        'seed': seed,
+        'total_reward': episode['total_reward'],
+        'num_steps': episode['num_steps'],
+        'llm_stats': episode['llm_stats']
+    }
+    if 'realtime' in episode:
+        record['realtime'] = episode['realtime']
+
+    with open(exp_save_path / RUNS_FILE, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def load_completed_runs(exp_save_path: Path, runs: List[Tuple[int, int]]) -> Dict[int, Dict]:
+    """Episodes of the `(run_idx, seed)` runs already finished in `exp_save_path`, with their LLM calls"""
+    if not (exp_save_path / RUNS_FILE).exists():
+        return {}
+
+    seeds = dict(runs)
+    completed = {}
+    with open(exp_save_path / RUNS_FILE) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # the line being written when the process died
+                continue
+            if seeds.get(record['run_idx']) != record['seed']:
+                continue
+
+            episode = {key: value for key, value in record.items() if key not in ('run_idx', 'seed')}
+            llm_calls_path = exp_save_path / f'run_{record["run_idx"]}_seed_{record["seed"]}_llm_calls.json'
+            episode['llm_calls'] = []
+            if llm_calls_path.exists():
+                with open(llm_calls_path) as calls_file:
+                    episode['llm_calls'] = json.load(calls_file)
+            completed[record['run_idx']] = episode
+
+    return completed
+
+
+def check_resume_config(saved_config: Dict, config: Dict):
+    """Resumed runs must play the same env, agent and seeds as the finished ones"""
+    for section in ('agent', 'environment'):
+        saved, current = saved_config.get(section) or {}, config.get(section) or {}
+        keys = sorted(key for key in set(saved) | set(current) if saved.get(key) != current.get(key))
+        if keys:
+            raise ValueError(f'Cannot resume, the {section} config differs from the saved one in {", ".join(keys)}')
+
+    saved_seed = saved_config.get('experiment', {}).get('seed', 0)
+    seed = config.get('experiment').get('seed', 0)
+    if saved_seed != seed:
+        raise ValueError(f'Cannot resume, the experiment seed differs from the saved one: {saved_seed} != {seed}')
+
+
+class EpisodeCheckpoint:
+    """Agent state of an episode in progress, saved after every step so that a resumed experiment can continue it.
+
+    The steps played until the checkpoint are not saved again: their actions and raw outputs are read back from
+    the trajectory of the run, and replayed on the env to get back to the same state.
+    """
+
+    def __init__(self, path: Path, trajectory_path: Path):
+        self.path = path
+        self.trajectory_path = trajectory_path
+        # loaded when resuming, consumed by the episode runner
+        self.state = None
+
+    def save(self, agent, num_steps: int, trajectory=None):
+        # the trajectory must hold every step before the checkpoint that refers to them
+        if trajectory is not None:
+            trajectory.flush()
+
+        state = {
+            'num_steps': num_steps,
+            'action_count': agent.action_count,
+            'last_action': agent.last_action,
+            'history': list(agent.llm.history)
+        }
+
+        # written aside and renamed, a crash while writing leaves the previous checkpoint
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> Dict | None:
+        """Loads the checkpoint with the steps played until it, None if the run cannot be continued"""
+        self.state = None
+        if not self.path.exists() or not (self.trajectory_path / META_FILE).exists():
+            return None
+
+        with open(self.path) as f:
+            state = json.load(f)
+
+        trajectory = Trajectory(self.trajectory_path)
+        num_steps = state['num_steps']
+        if trajectory.num_steps < num_steps:
+            return None
+
+        # copied, the trajectory files are truncated when the run starts recording again
+        state['actions'] = np.array(trajectory.actions[:num_steps]).tolist()
+        state['raw_outputs'] = list(itertools.islice(trajectory.texts(), num_steps))
+        self.state = state
+        return state
+
+    def remove(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+class CheckpointRecorder:
+    """Opens the checkpoint of each run in the experiment folder"""
+
+    def __init__(self, exp_save_path: Path):
+        self.exp_save_path = exp_save_path
+
+    def open(self, run_idx: int, seed: int) -> EpisodeCheckpoint:
+        return EpisodeCheckpoint(self.exp_save_path / f'run_{run_idx}_seed_{seed}_checkpoint.json',
+                                 self.exp_save_path / f'run_{run_idx}_seed_{seed}_trajectory')
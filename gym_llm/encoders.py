@@ -0,0 +1,93 @@
+import json
+from abc import abstractmethod, ABC
+from typing import Dict
+
+import numpy as np
+
+
+class ObservationEncoder(ABC):
+    """Turns an observation into the content of the user message sent to the LLM"""
+
+    @abstractmethod
+    def encode(self, observation, start: bool) -> str:
+        ...
+
+
+class ReprEncoder(ObservationEncoder):
+    """Original format: python repr of the observation (numpy arrays included) nested in a stringified dict"""
+
+    def encode(self, observation, start: bool) -> str:
+        return str({
+            'observation': str(observation),
+            'start': start
+        })
+
+
+class SchemaEncoder(ObservationEncoder, ABC):
+    """Base for compact encoders, rounding each field according to the `type` of the observation schema.
+
+    Float fields are rounded to the schema `precision` (or `float_precision`), int and bool fields are
+    written as integers, and fields of `size` 1 as scalars.
+    """
+
+    def __init__(self, observation_schema: Dict, float_precision: int = 3):
+        self.observation_schema = observation_schema
+        self.float_precision = float_precision
+
+    def fields(self, observation) -> Dict:
+        return {key: self._field(key, value) for key, value in observation.items()}
+
+    def _field(self, key, value):
+        field_schema = self.observation_schema.get(key, {}) if isinstance(self.observation_schema, dict) else {}
+        field_type = field_schema.get('type', None)
+
+        values = np.asarray(value).reshape(-1)
+        if field_type == 'float':
+            precision = field_schema.get('precision', self.float_precision)
+            # + 0.0 turns -0.0 into 0.0
+            values = [round(float(v), precision) + 0.0 for v in values]
+        elif field_type in ('int', 'bool'):
+            values = [int(v) for v in values]
+        else:
+            values = values.tolist()
+
+        size = field_schema.get('size', len(values))
+        return values[0] if size == 1 and len(values) == 1 else values
+
+
+class JSONEncoder(SchemaEncoder):
+    """Compact JSON, e.g. `{"observation":{"players_sum":11,"dealers_card":10,"usable_ace":0},"start":true}`"""
+
+    def encode(self, observation, start: bool) -> str:
+        return json.dumps({'observation': self.fields(observation), 'start': start}, separators=(',', ':'))
+
+
+class KeyValueEncoder(SchemaEncoder):
+    """Space separated key=value pairs, e.g. `players_sum=11 dealers_card=10 usable_ace=0 start=1`"""
+
+    def encode(self, observation, start: bool) -> str:
+        pairs = [f'{key}={self._format(value)}' for key, value in self.fields(observation).items()]
+        return ' '.join(pairs + [f'start={int(start)}'])
+
+    @staticmethod
+    def _format(value):
+        if isinstance(value, list):
+            return ','.join(str(v) for v in value)
+        return str(value)
+
+
+ENCODERS = {
+    'repr': ReprEncoder,
+    'json': JSONEncoder,
+    'kv': KeyValueEncoder
+}
+
+
+def get_observation_encoder(name: str, observation_schema: Dict, float_precision: int = 3) -> ObservationEncoder:
+    if name not in ENCODERS:
+        raise ValueError(f'Unknown observation format {name}, expected one of {list(ENCODERS)}')
+
+    if name == 'repr':
+        return ReprEncoder()
+
+    return ENCODERS[name](observation_schema=observation_schema, float_precision=float_precision)
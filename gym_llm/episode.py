@@ -0,0 +1,276 @@
+import json
+from pathlib import Path
+from typing import Dict
+
+import gymnasium as gym
+import numpy as np
+
+from gym_llm.llm_env import LLMEnv
+from gym_llm.logger import EmptyLogger
+
+
+def log_step(logger, agent, obs, raw_output, reward, total_reward, num_steps, terminated, truncated):
+    logger.info('********************************')
+    logger.info(f'    Observation: {obs}')
+    logger.info(f'    Reflection: {raw_output["reflection"]}')
+    action = raw_output['action']
+    # failed answers have no action, the env keeps playing the last one
+    logger.info(f'    Action: {action} -> {agent.action_schema.get(int(action), "Unknown action") if action is not None else "No answer"}')
+    logger.info(f'    Reward: {reward} -> Total reward: {total_reward}')
+    logger.info(f'    Num steps: {num_steps}')
+    logger.info(f'    Terminated: {terminated}')
+    logger.info(f'    Truncated: {truncated}')
+
+
+def log_episode(logger, episode):
+    logger.info('********************************')
+    logger.info(f'    Total reward: {episode["total_reward"]}')
+    logger.info(f'    Num steps: {episode["num_steps"]}')
+
+
+def start_episode(agent, obs, frames=None, trajectory=None, checkpoint=None) -> Dict:
+    """Running totals of an episode starting at `obs`, and the writers `record_step` feeds"""
+    if trajectory is not None:
+        trajectory.reset(obs)
+
+    return {
+        'total_reward': 0,
+        'num_steps': 0,
+        'raw_outputs': {},
+        'frames': frames,
+        'trajectory': trajectory,
+        'checkpoint': checkpoint,
+        'llm_stats': dict(agent.llm.stats)
+    }
+
+
+def record_step(episode: Dict, agent, logger, obs, raw_output, action, reward, terminated, truncated, render=None) -> bool:
+    """Adds a step to the `episode`: frame (from `render()`), trajectory, totals, log, raw output and, if the
+    episode goes on, checkpoint. Returns whether the episode is done."""
+    if episode['frames'] is not None:
+        episode['frames'].append(render())
+
+    if episode['trajectory'] is not None:
+        episode['trajectory'].append(obs, raw_output, action, reward, terminated, truncated)
+
+    episode['total_reward'] += reward
+    episode['num_steps'] += 1
+    done = terminated or truncated
+
+    log_step(logger, agent, obs, raw_output, reward, episode['total_reward'], episode['num_steps'], terminated, truncated)
+
+    episode['raw_outputs'][episode['num_steps']] = raw_output
+
+    if episode['checkpoint'] is not None and not done:
+        episode['checkpoint'].save(agent, episode['num_steps'], trajectory=episode['trajectory'])
+
+    return done
+
+
+def finish_episode(episode: Dict, agent, logger, **extra) -> Dict:
+    """Results of a finished episode, `extra` items are added to them"""
+    result = {
+        'total_reward': episode['total_reward'],
+        'num_steps': episode['num_steps'],
+        'raw_outputs': episode['raw_outputs'],
+        'llm_stats': stats_delta(episode['llm_stats'], agent.llm.stats),
+        'llm_calls': agent.llm.calls,
+        **extra
+    }
+    log_episode(logger, result)
+
+    return result
+
+
+def _begin_episode(env, agent, seed: int, logger, frames=None, trajectory=None, checkpoint=None):
+    if checkpoint is not None and checkpoint.state is not None:
+        obs, episode = restore_episode(env, agent, seed, checkpoint.state, frames=frames, trajectory=trajectory)
+        episode['checkpoint'] = checkpoint
+        logger.info(f'    Resumed at step {episode["num_steps"]}')
+        return obs, episode
+
+    obs, _ = env.reset(seed=seed)
+    agent.reset(seed=seed)
+    return obs, start_episode(agent, obs, frames=frames, trajectory=trajectory, checkpoint=checkpoint)
+
+
+def run_episode(env, agent, seed: int, logger, frames=None, trajectory=None, checkpoint=None):
+    obs, episode = _begin_episode(env, agent, seed, logger, frames=frames, trajectory=trajectory, checkpoint=checkpoint)
+
+    done = False
+    while not done:
+        raw_output, action = agent.get_action(obs)
+        obs, reward, terminated, truncated, _ = env.step(action)
+        done = record_step(episode, agent, logger, obs, raw_output, action, reward, terminated, truncated, render=env.render)
+
+    return finish_episode(episode, agent, logger)
+
+
+async def arun_episode(env, agent, seed: int, logger, frames=None, trajectory=None, checkpoint=None):
+    """Same as `run_episode` but awaits the LLM so other episodes can progress meanwhile"""
+    obs, episode = _begin_episode(env, agent, seed, logger, frames=frames, trajectory=trajectory, checkpoint=checkpoint)
+
+    done = False
+    while not done:
+        raw_output, action = await agent.aget_action(obs)
+        obs, reward, terminated, truncated, _ = env.step(action)
+        done = record_step(episode, agent, logger, obs, raw_output, action, reward, terminated, truncated, render=env.render)
+
+    return finish_episode(episode, agent, logger)
+
+
+def restore_episode(env, agent, seed: int, state, frames=None, trajectory=None):
+    """Plays again the steps of an interrupted episode until its checkpoint `state`, with the recorded actions, and
+    restores the agent as it was there. Returns the observation and the episode so far (see `start_episode`)."""
+    obs, _ = env.reset(seed=seed)
+    agent.reset(seed=seed)
+    episode = start_episode(agent, obs, frames=frames, trajectory=trajectory)
+
+    # replayed steps were logged when they were played
+    logger = EmptyLogger()
+    for action, raw_output in zip(state['actions'], state['raw_outputs']):
+        obs, reward, terminated, truncated, _ = env.step(action)
+        record_step(episode, agent, logger, obs, {**raw_output, 'action': action}, action, reward, terminated, truncated,
+                    render=env.render)
+
+    agent.action_count = state['action_count']
+    agent.last_action = state['last_action']
+    agent.llm.history.extend(state['history'])
+
+    return obs, episode
+
+
+def stats_delta(before, after):
+    return {key: value - before.get(key, 0) for key, value in after.items()}
+
+
+def sum_stats(episodes):
+    """Adds up the `llm_stats` of the episodes"""
+    total = {}
+    for episode in episodes:
+        for key, value in episode['llm_stats'].items():
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def save_episode(exp_save_path: Path, run_idx: int, seed: int, episode, raw_outputs: bool = True):
+    if raw_outputs:
+        with open(exp_save_path / f'run_{run_idx}_seed_{seed}_raw_outputs.json', 'w') as f:
+            json.dump(episode['raw_outputs'], f, separators=(',', ':'))
+
+    if episode.get('llm_calls'):
+        with open(exp_save_path / f'run_{run_idx}_seed_{seed}_llm_calls.json', 'w') as f:
+            json.dump(episode['llm_calls'], f, indent=4)
+
+
+def unbatch_observation(space, observations, index: int, keys=None):
+    """Extracts the observation of one sub-env with the same python types a single env would return.
+
+    `gym.spaces.Dict` sorts its keys, `keys` (e.g. the observation schema) restores the env's own order.
+    """
+    if isinstance(space, gym.spaces.Dict):
+        keys = [key for key in keys or [] if key in space.spaces] + [key for key in space.spaces if key not in (keys or [])]
+        return {key: unbatch_observation(space[key], observations[key], index) for key in keys}
+
+    if isinstance(space, gym.spaces.Discrete):
+        return int(observations[index])
+
+    return observations[index]
+
+
+def get_reward_type(env):
+    """Python type of the rewards of the sub-envs of a vector env, which batches them as floats"""
+    # native vector envs implement LLMEnv themselves, sync/async ones ask the first sub-env
+    if isinstance(env.unwrapped, LLMEnv):
+        return env.unwrapped.get_reward_type()
+    return env.call('get_reward_type')[0]
+
+
+async def arun_vector_episodes(env, agent, runs, logger, on_episode, recorder=None, trajectories=None):
+    """Runs the `(run_idx, seed)` episodes over the sub-envs of a vector env.
+
+    Every step asks the agents of all active sub-envs at once. When a sub-env finishes, it is
+    reset on its own with the seed of the next pending run, so each run sees the same seed
+    as in the sequential path. `on_episode(run_idx, seed, episode)` is called as runs finish, and
+    the frames and steps of each run go to its own `recorder` and `trajectories` writers.
+    """
+    num_envs = env.num_envs
+    keys = list(agent.observation_schema)
+    # rewards are recorded with the type a single env returns, so that the results do not depend on the mode
+    reward_type = get_reward_type(env)
+    pending = list(runs)
+    slots = [None] * num_envs
+
+    seeds = [None] * num_envs
+    for i in range(num_envs):
+        if pending:
+            slots[i] = _new_slot(*pending.pop(0))
+            seeds[i] = slots[i]['seed']
+            agent.reset(i, seed=seeds[i])
+
+    obs, _ = env.reset(seed=seeds)
+    _start_episodes(env, agent, obs, slots, range(num_envs), keys, recorder, trajectories)
+
+    while any(slot is not None for slot in slots):
+        active = [i for i in range(num_envs) if slots[i] is not None]
+        observations = {i: unbatch_observation(env.single_observation_space, obs, i, keys) for i in active}
+
+        outputs = await agent.aget_actions(observations, active)
+
+        # idle sub-envs (no runs left) still need a valid action
+        actions = [0] * num_envs
+        for i, (raw_output, action) in zip(active, outputs):
+            actions[i] = action
+            slots[i]['raw_output'] = raw_output
+
+        obs, rewards, terminations, truncations, _ = env.step(np.array(actions))
+
+        imgs = env.render() if recorder is not None else None
+
+        reset_mask = np.zeros(num_envs, dtype=np.bool_)
+        seeds = [None] * num_envs
+        for i in active:
+            slot = slots[i]
+            episode = slot['episode']
+            done = record_step(episode, agent.agents[i], logger, unbatch_observation(env.single_observation_space, obs, i, keys),
+                               slot['raw_output'], actions[i], reward_type(rewards[i].item()), bool(terminations[i]),
+                               bool(truncations[i]), render=lambda: imgs[i])
+
+            if done:
+                result = finish_episode(episode, agent.agents[i], logger)
+                if episode['frames'] is not None:
+                    episode['frames'].close()
+                if episode['trajectory'] is not None:
+                    episode['trajectory'].close()
+                on_episode(slot['run_idx'], slot['seed'], result)
+
+                slots[i] = None
+                if pending:
+                    slots[i] = _new_slot(*pending.pop(0))
+                    seeds[i] = slots[i]['seed']
+                    reset_mask[i] = True
+                    agent.reset(i, seed=seeds[i])
+
+        if reset_mask.any():
+            obs, _ = env.reset(seed=seeds, options={'reset_mask': reset_mask})
+            _start_episodes(env, agent, obs, slots, np.flatnonzero(reset_mask), keys, recorder, trajectories)
+
+
+def _start_episodes(env, agent, obs, slots, indices, keys, recorder=None, trajectories=None):
+    for i in indices:
+        slot = slots[i]
+        if slot is None:
+            continue
+        run_idx, seed = slot['run_idx'], slot['seed']
+        slot['episode'] = start_episode(agent.agents[i], unbatch_observation(env.single_observation_space, obs, i, keys),
+                                        frames=recorder.open(run_idx, seed) if recorder is not None else None,
+                                        trajectory=trajectories.open(run_idx, seed) if trajectories is not None else None)
+
+
+def _new_slot(run_idx: int, seed: int):
+    return {
+        'run_idx': run_idx,
+        'seed': seed,
+        'raw_output': None,
+        'episode': None
+    }
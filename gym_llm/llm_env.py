@@ -13,4 +13,8 @@ class LLMEnv:
 
     @abstractmethod
     def get_action_schema(self):
-        ...
\ No newline at end of file
+        ...
+
+    def get_reward_type(self):
+        """Python type of the step rewards, vector envs batch them as floats whatever the env returns"""
+        return float
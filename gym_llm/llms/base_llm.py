@@ -1,17 +1,317 @@
+import asyncio
+import json
+import threading
+import time
 from abc import abstractmethod, ABC
 from collections import deque
 
+from gym_llm.logger import get_logger
+from gym_llm.llms.streaming import ActionStreamParser
+from gym_llm.llms.tokens import get_token_counter, MESSAGE_OVERHEAD
+
+STREAM_REMAINDERS = ('cancel', 'background')
+
 
 class BaseLLM(ABC):
-    def __init__(self, model: str, temperature: float = 0.8, system_prompt: str = '', history_len: int = 10):
+    def __init__(self, model: str, temperature: float = 0.8, system_prompt: str = '', history_len: int | None = 10,
+                 max_context_tokens: int | None = None, max_output_tokens: int = 256):
         self.model = model
         self.temperature = temperature
         self.system_prompt = system_prompt
         self.history = deque(maxlen=history_len)
 
+        # the oldest turns are evicted so that the prompt plus the answer fit in max_context_tokens
+        self.max_context_tokens = max_context_tokens
+        self.max_output_tokens = max_output_tokens
+        self.count_tokens = get_token_counter(model)
+        self.prompt_tokens = 0
+
+        self.cache = None
+        self.cache_bypass = False
+
+        # streaming returns as soon as the action is parsed, the rest of the answer is cancelled or finished in background
+        self.stream = False
+        self.stream_remainder = 'cancel'
+        self._background_tasks = set()
+
+        # backend counters, accumulated over the agent lifetime
+        self.stats = {}
+
+        # one record per generate call of the current episode (latency, tokens, errors)
+        self.calls = []
+
+        self._async_client = None
+        self._async_client_loop = None
+
+    def get_messages(self):
+        self.prompt_tokens = self._fit_history()
+        return [{'role': 'system', 'content': self.system_prompt}] + list(self.history)
+
+    def count_message_tokens(self, message) -> int:
+        return self.count_tokens(message['content']) + MESSAGE_OVERHEAD
+
+    def _fit_history(self) -> int:
+        """Evicts the oldest turns until the prompt fits the token budget, returns the prompt tokens"""
+        system_tokens = self.count_message_tokens({'content': self.system_prompt})
+        counts = deque(self.count_message_tokens(message) for message in self.history)
+        total = system_tokens + sum(counts)
+
+        if self.max_context_tokens is None:
+            return total
+
+        budget = self.max_context_tokens - self.max_output_tokens
+        evicted = False
+        while len(self.history) > 1 and (total > budget or (evicted and self.history[0]['role'] == 'assistant')):
+            # an assistant turn without its observation is dropped as well
+            total -= counts.popleft()
+            self.history.popleft()
+            evicted = True
+
+        if total > budget:
+            get_logger().warn(f'Prompt of {total} tokens does not fit the context budget of {budget} tokens')
+
+        return total
+
+    def set_cache(self, cache, bypass: bool = False):
+        """Enables the response cache. With `bypass` the backend is always queried and the cached entry refreshed"""
+        self.cache = cache
+        self.cache_bypass = bypass
+
+    def set_stream(self, remainder: str = 'cancel'):
+        """Enables streaming. `remainder` is what happens with the answer once the action is parsed: 'cancel' closes
+        the stream, 'background' finishes it to fill the reflection of the returned answer (and the cache)"""
+        if remainder not in STREAM_REMAINDERS:
+            raise ValueError(f'Unknown stream remainder {remainder}, expected one of {STREAM_REMAINDERS}')
+        self.stream = True
+        self.stream_remainder = remainder
+
+    def cache_key(self, messages):
+        return self.cache.make_key({'backend': type(self).__name__,
+                                    'endpoint': self.endpoint(),
+                                    'model': self.model,
+                                    'options': self.request_options(),
+                                    'messages': messages})
+
+    def endpoint(self) -> str | None:
+        """URL of the server answering the requests, used to build the cache key"""
+        return None
+
+    def request_options(self):
+        """Generation options that change the answer, used to build the cache key"""
+        return {'temperature': self.temperature}
+
+    def lookup_cache(self, messages):
+        """Returns the cached answer content for the messages, None if missing or the cache is disabled/bypassed"""
+        if self.cache is None or self.cache_bypass:
+            return None
+        return self.cache.get(self.cache_key(messages))
+
+    def store_cache(self, messages, message_content):
+        if self.cache is None or message_content is None:
+            return
+        self.cache.put(self.cache_key(messages), message_content)
+
+    def generate(self, messages=None):
+        """Answers the current history, or a `messages` snapshot taken earlier with `get_messages`"""
+        if messages is None:
+            messages = self.get_messages()
+
+        call = self._new_call()
+        message_content = self.lookup_cache(messages)
+        if message_content is not None:
+            call['cached'] = True
+        elif self.stream:
+            return self._finish_call(call, self._generate_stream(messages, call))
+        else:
+            message_content = self._complete(messages, call)
+            call['error'] = message_content is None
+            self.store_cache(messages, message_content)
+
+        return self._finish_call(call, self.parse_answer(message_content))
+
+    async def agenerate(self, messages=None):
+        if messages is None:
+            messages = self.get_messages()
+
+        call = self._new_call()
+        message_content = self.lookup_cache(messages)
+        if message_content is not None:
+            call['cached'] = True
+        elif self.stream:
+            return self._finish_call(call, await self._agenerate_stream(messages, call))
+        else:
+            message_content = await self._acomplete(messages, call)
+            call['error'] = message_content is None
+            self.store_cache(messages, message_content)
+
+        return self._finish_call(call, self.parse_answer(message_content))
+
+    def _new_call(self):
+        """Per-call record, the backends fill the token counts and retries they know about"""
+        return {
+            'start': time.perf_counter(),
+            'latency': None,
+            'ttft': None,
+            'prompt_tokens': None,
+            'completion_tokens': None,
+            'generation_time': None,
+            'load_time': None,
+            'retries': 0,
+            'cached': False,
+            'error': False,
+            'parse_error': False
+        }
+
+    def _finish_call(self, call, answer):
+        call['latency'] = time.perf_counter() - call.pop('start')
+        if call['generation_time'] is None and call['ttft'] is None and call['completion_tokens'] is not None:
+            # without backend timings the whole (non streamed) call is counted as generation
+            call['generation_time'] = call['latency']
+        if not call['error']:
+            call['parse_error'] = answer['action'] is None
+        self.calls.append(call)
+        return answer
+
+    def _generate_stream(self, messages, call):
+        start = call['start']
+        first_chunk = None
+        parser = ActionStreamParser()
+        chunks = self._stream(messages, call)
+        try:
+            for chunk in chunks:
+                if first_chunk is None:
+                    first_chunk = time.perf_counter()
+                    call['ttft'] = first_chunk - start
+                if parser.feed(chunk):
+                    break
+            else:
+                return self._finish_answer(messages, parser, call, first_chunk)
+        except Exception as e:
+            get_logger().warn(f'Error in generation: {e}')
+            call['error'] = True
+            chunks.close()
+            return self.parse_answer(None)
+
+        answer = {'reflection': '', 'action': parser.action}
+        if self.stream_remainder == 'background':
+            threading.Thread(target=self._finish_stream, args=(messages, chunks, parser, answer, call, first_chunk),
+                             daemon=True).start()
+        else:
+            chunks.close()
+
+        return answer
+
+    async def _agenerate_stream(self, messages, call):
+        start = call['start']
+        first_chunk = None
+        parser = ActionStreamParser()
+        chunks = self._astream(messages, call)
+        try:
+            async for chunk in chunks:
+                if first_chunk is None:
+                    first_chunk = time.perf_counter()
+                    call['ttft'] = first_chunk - start
+                if parser.feed(chunk):
+                    break
+            else:
+                return self._finish_answer(messages, parser, call, first_chunk)
+        except Exception as e:
+            get_logger().warn(f'Error in generation: {e}')
+            call['error'] = True
+            await chunks.aclose()
+            return self.parse_answer(None)
+
+        answer = {'reflection': '', 'action': parser.action}
+        if self.stream_remainder == 'background':
+            # keep a reference, the event loop only holds weak ones
+            task = asyncio.create_task(self._afinish_stream(messages, chunks, parser, answer, call, first_chunk))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+        else:
+            await chunks.aclose()
+
+        return answer
+
+    def _finish_stream(self, messages, chunks, parser, answer, call, first_chunk):
+        try:
+            for chunk in chunks:
+                parser.feed(chunk)
+        except Exception as e:
+            get_logger().warn(f'Error in background generation: {e}')
+            return
+        answer['reflection'] = self._finish_answer(messages, parser, call, first_chunk)['reflection']
+
+    async def _afinish_stream(self, messages, chunks, parser, answer, call, first_chunk):
+        try:
+            async for chunk in chunks:
+                parser.feed(chunk)
+        except Exception as e:
+            get_logger().warn(f'Error in background generation: {e}')
+            return
+        answer['reflection'] = self._finish_answer(messages, parser, call, first_chunk)['reflection']
+
+    def _finish_answer(self, messages, parser, call, first_chunk):
+        # only complete answers are cached
+        self.store_cache(messages, parser.text)
+        if call['generation_time'] is None and first_chunk is not None:
+            call['generation_time'] = time.perf_counter() - first_chunk
+        return self.parse_answer(parser.text)
+
+    @abstractmethod
+    def _complete(self, messages, call):
+        """Sends the messages to the backend and returns the raw answer content (None on failure).
+
+        Token counts, generation time and retries reported by the backend are written to the `call` record.
+        """
+        ...
+
+    @abstractmethod
+    async def _acomplete(self, messages, call):
+        """Async counterpart of `_complete`"""
+        ...
+
+    @abstractmethod
+    def _stream(self, messages, call):
+        """Sends the messages to the backend and yields the answer content chunks, closing it cancels the request"""
+        ...
+
     @abstractmethod
-    def generate(self):
+    async def _astream(self, messages, call):
+        """Async counterpart of `_stream`"""
         ...
 
+    @abstractmethod
+    def _create_async_client(self):
+        ...
+
+    def _get_async_client(self):
+        # async clients hold connections bound to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = self._create_async_client()
+            self._async_client_loop = loop
+        return self._async_client
+
+    @staticmethod
+    def parse_answer(message_content):
+        if message_content is None:
+            return {'reflection': '', 'action': None}
+
+        try:
+            answer_json = json.loads(message_content)
+            action = answer_json.get('action', None)
+            reflection = answer_json.get('reflection', '')
+        except (json.JSONDecodeError, TypeError, AttributeError):
+            action = None
+            reflection = ''
+            get_logger().warn(f'Error in parsing the message content as JSON: {message_content}')
+
+        return {
+            'reflection': reflection,
+            'action': action
+        }
+
     def reset(self):
-        self.history.clear()
\ No newline at end of file
+        self.history.clear()
+        # a new list, records of the previous episode may still be referenced (and completed by background streams)
+        self.calls = []
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+DEFAULT_CACHE_PATH = '.cache/llm_responses.sqlite'
+DEFAULT_MAX_SIZE_MB = 512
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class ResponseCache:
+    """Persistent LLM response cache stored in a SQLite file.
+
+    Entries are keyed by a hash of the exact request (messages and generation options) and evicted
+    in least-recently-used order once the stored responses exceed `max_size_mb`.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_CACHE_PATH, max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+
+    @staticmethod
+    def make_key(request: Dict) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock, self._connection:
+            row = self._connection.execute('SELECT value FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._connection.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode('utf-8'))
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)',
+                (key, value, size, time.time())
+            )
+            self._evict()
+
+    def _evict(self):
+        total_size = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        rows = self._connection.execute('SELECT key, size FROM responses ORDER BY last_access ASC').fetchall()
+        evicted = []
+        for key, size in rows:
+            if total_size <= self.max_size:
+                break
+            evicted.append((key,))
+            total_size -= size
+
+        self._connection.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': entries,
+            'size_mb': size / 1024 / 1024
+        }
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM responses')
+
+
+def get_response_cache(path: str | Path = DEFAULT_CACHE_PATH, max_size_mb: float = DEFAULT_MAX_SIZE_MB) -> ResponseCache:
+    """Returns the process-wide cache for `path` so that every agent shares one connection and its counters"""
+    key = str(Path(path).resolve())
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = ResponseCache(path=path, max_size_mb=max_size_mb)
+        return _caches[key]
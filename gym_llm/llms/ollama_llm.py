@@ -1,44 +1,256 @@
+import threading
+
 from .base_llm import BaseLLM
-import ollama
-import json
 from gym_llm.logger import get_logger
+import ollama
+
+
+# num_ctx only takes these values so that growing prompts trigger few model reloads on the server
+NUM_CTX_BUCKETS = (2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+# models loaded by the warm-up of this process, `host|model -> load seconds`
+_warmed_up = {}
+_warmed_up_lock = threading.Lock()
 
 
 class OllamaLLM(BaseLLM):
-    def __init__(self, model: str, temperature: float = 0.8, system_prompt: str = '', history_len: int = 10):
+    def __init__(self, model: str, temperature: float = 0.8, system_prompt: str = '', history_len: int | None = 10,
+                 max_context_tokens: int = 8192, keep_alive: float | str | None = None, incremental: bool = False,
+                 host: str | None = None, warmup: bool = False):
 
-        super().__init__(model=model, temperature=temperature, system_prompt=system_prompt, history_len=history_len)
+        super().__init__(model=model, temperature=temperature, system_prompt=system_prompt, history_len=history_len,
+                         max_context_tokens=max_context_tokens)
 
         self.ollama_options = ollama.Options(
             temperature=temperature,
-            num_predict=256,
-            num_ctx=4096,
+            num_predict=self.max_output_tokens,
+            num_ctx=NUM_CTX_BUCKETS[0],
         )
 
-    def generate(self):
-        answer = ollama.chat(
-            model=self.model,
-            options=self.ollama_options,
-            messages=[{'role': 'system', 'content': self.system_prompt}] + list(self.history),
-            format='json'
-        )
+        # host=None falls back to OLLAMA_HOST or the local server
+        self.host = host
+        self.client = ollama.Client(host=host)
+
+        # how long the server keeps the model (and its KV cache) loaded after a request
+        self.keep_alive = keep_alive
+
+        # incremental mode extends the server-side `context` of the previous answer instead of re-sending the history
+        self.incremental = incremental
+        self._context = None
+        self._context_messages = 0
+        self._last_synced = None
+        self._skip_reply = False
+
+        self.stats['prefill_tokens_reused'] = 0
+        self.stats['prefill_tokens_evaluated'] = 0
+
+        if warmup:
+            self.warmup()
+
+    def warmup(self):
+        """Loads the model on the server (kept for `keep_alive`) before the first request, once per process and host"""
+        key = f'{self.host}|{self.model}'
+        with _warmed_up_lock:
+            if key in _warmed_up:
+                return
+            try:
+                # a request without prompt only loads the model
+                answer = self.client.generate(model=self.model, keep_alive=self.keep_alive)
+            except Exception as e:
+                get_logger().warn(f'Could not warm up {self.model}: {e}')
+                return
+            _warmed_up[key] = (answer.get('load_duration') or 0) / 1e9
+
+    def get_messages(self):
+        messages = super().get_messages()
+        self._size_context(self.prompt_tokens + self.max_output_tokens)
+        return messages
+
+    def _size_context(self, tokens: int):
+        """Grows num_ctx to the smallest bucket holding `tokens`, it never shrinks to avoid reloading the model"""
+        limit = max(self.max_context_tokens, NUM_CTX_BUCKETS[0])
+        for num_ctx in NUM_CTX_BUCKETS:
+            if num_ctx >= tokens or num_ctx >= limit:
+                break
+        num_ctx = min(num_ctx, limit)
+        if num_ctx > self.ollama_options.num_ctx:
+            self.ollama_options.num_ctx = num_ctx
+
+    def endpoint(self):
+        # the host resolved by the client (OLLAMA_HOST or the local server when None)
+        return str(self.client._client.base_url)
+
+    def request_options(self):
+        # num_ctx only follows the prompt size, it does not change the answer
+        options = {key: value for key, value in dict(self.ollama_options).items() if value is not None and key != 'num_ctx'}
+        options['format'] = 'json'
+        options['incremental'] = self.incremental
+        return options
+
+    def _create_async_client(self):
+        return ollama.AsyncClient(host=self.host)
+
+    def _complete(self, messages, call):
+        try:
+            if self.incremental:
+                kwargs, new_messages = self._incremental_kwargs(messages)
+                answer = self.client.generate(model=self.model, options=self.ollama_options, format='json',
+                                              keep_alive=self.keep_alive, **kwargs)
+            else:
+                answer = self.client.chat(
+                    model=self.model,
+                    options=self.ollama_options,
+                    messages=messages,
+                    format='json',
+                    keep_alive=self.keep_alive
+                )
+        except Exception as e:
+            get_logger().warn(f'Error in generation: {e}')
+            return None
+
+        if self.incremental:
+            self._record_usage(call, answer)
+            return self._incremental_update(messages, kwargs, new_messages, answer)
+
+        self.stats['prefill_tokens_evaluated'] += answer.get('prompt_eval_count') or 0
+        self._record_usage(call, answer)
 
+        return answer['message']['content']
 
+    async def _acomplete(self, messages, call):
         try:
-            answer_json = json.loads(answer['message']['content'])
-            action = answer_json.get('action', None)
-            reflection = answer_json.get('reflection', '')
+            if self.incremental:
+                kwargs, new_messages = self._incremental_kwargs(messages)
+                answer = await self._get_async_client().generate(model=self.model, options=self.ollama_options,
+                                                                 format='json', keep_alive=self.keep_alive, **kwargs)
+            else:
+                answer = await self._get_async_client().chat(
+                    model=self.model,
+                    options=self.ollama_options,
+                    messages=messages,
+                    format='json',
+                    keep_alive=self.keep_alive
+                )
         except Exception as e:
-            action = None
-            reflection = ''
             get_logger().warn(f'Error in generation: {e}')
+            return None
+
+        if self.incremental:
+            self._record_usage(call, answer)
+            return self._incremental_update(messages, kwargs, new_messages, answer)
+
+        self.stats['prefill_tokens_evaluated'] += answer.get('prompt_eval_count') or 0
+        self._record_usage(call, answer)
+
+        return answer['message']['content']
+
+    def set_stream(self, remainder: str = 'cancel'):
+        if self.incremental:
+            # the context of a cancelled answer is never returned by the server
+            raise ValueError('Streaming is not supported in incremental mode')
+        super().set_stream(remainder=remainder)
+
+    def _stream(self, messages, call):
+        stream = self.client.chat(model=self.model, options=self.ollama_options, messages=messages, format='json',
+                                  keep_alive=self.keep_alive, stream=True)
+        try:
+            for part in stream:
+                if part.get('done'):
+                    self.stats['prefill_tokens_evaluated'] += part.get('prompt_eval_count') or 0
+                    self._record_usage(call, part)
+                yield part['message']['content']
+        finally:
+            stream.close()
+
+    async def _astream(self, messages, call):
+        stream = await self._get_async_client().chat(model=self.model, options=self.ollama_options, messages=messages,
+                                                     format='json', keep_alive=self.keep_alive, stream=True)
+        try:
+            async for part in stream:
+                if part.get('done'):
+                    self.stats['prefill_tokens_evaluated'] += part.get('prompt_eval_count') or 0
+                    self._record_usage(call, part)
+                yield part['message']['content']
+        finally:
+            await stream.aclose()
+
+    def _incremental_kwargs(self, messages):
+        """Builds the `generate` arguments (and the number of turns they add): only the new turns on top of
+        the cached context, or a full prefill.
+
+        The context is rebuilt when it would hold more turns than the history length or would not fit
+        in `num_ctx`. Rebuilds only prefill the newest half of the window so that the following steps can
+        grow it again, hence the model sees between half and the whole history window.
+        """
+        history = messages[1:]
+        new_messages = self._new_messages(history)
+
+        if self._context is not None and new_messages is not None:
+            prompt = self._render(new_messages)
+            fits_window = self.history.maxlen is None or self._context_messages + len(new_messages) <= self.history.maxlen
+            # ~3 characters per token is a conservative estimate for JSON-like prompts
+            fits_context = len(self._context) + len(prompt) // 3 + self.ollama_options.num_predict <= self.ollama_options.num_ctx
+            if fits_window and fits_context:
+                return {'prompt': prompt, 'context': self._context}, len(new_messages)
+
+        if self.history.maxlen is not None:
+            start = max(len(history) - max(self.history.maxlen // 2, len(new_messages or [1])), 0)
+            # start the window on a user turn
+            while start > 0 and history[start]['role'] != 'user':
+                start -= 1
+            history = history[start:]
+
+        return {'prompt': self._render(history), 'system': self.system_prompt}, len(history)
+
+    def _new_messages(self, history):
+        """Messages appended since the last request, None if the last synced message left the window"""
+        for i in range(len(history) - 1, -1, -1):
+            if history[i] is self._last_synced:
+                new_messages = history[i + 1:]
+                # the assistant turn that follows the last request is already in the context as the model output
+                if self._skip_reply and new_messages and new_messages[0]['role'] == 'assistant':
+                    new_messages = new_messages[1:]
+                return new_messages
+        return None
+
+    def _incremental_update(self, messages, kwargs, new_messages, answer):
+        if kwargs.get('context') is not None:
+            self.stats['prefill_tokens_reused'] += len(kwargs['context'])
+            self._context_messages += new_messages + 1
+        else:
+            self._context_messages = new_messages + 1
+        self.stats['prefill_tokens_evaluated'] += answer.get('prompt_eval_count') or 0
+
+        self._context = answer.get('context')
+        self._last_synced = messages[-1]
+        self._skip_reply = True
+
+        return answer['response']
 
+    @staticmethod
+    def _record_usage(call, answer):
+        call['prompt_tokens'] = answer.get('prompt_eval_count')
+        call['completion_tokens'] = answer.get('eval_count')
+        if answer.get('eval_duration'):
+            # nanoseconds
+            call['generation_time'] = answer['eval_duration'] / 1e9
+        if answer.get('load_duration') is not None:
+            # loading the model on the server, a model swap when it was not loaded
+            call['load_time'] = answer['load_duration'] / 1e9
 
-        content = {
-            'reflection': reflection,
-            'action': action
-        }
+    @staticmethod
+    def _render(messages):
+        return '\n'.join(f"{message['role']}: {message['content']}" for message in messages)
 
-        return content
+    def reset(self):
+        super().reset()
+        self._context = None
+        self._context_messages = 0
+        self._last_synced = None
+        self._skip_reply = False
 
 
+def get_model_load_times():
+    """Load seconds of the models warmed up by the process, by `host|model`"""
+    with _warmed_up_lock:
+        return dict(_warmed_up)
@@ -1,45 +1,120 @@
-from openai import OpenAI
-import json
+from openai import OpenAI, AsyncOpenAI, APIConnectionError
 from gym_llm.logger import get_logger
 from gym_llm.llms.base_llm import BaseLLM
 
 
 
 class OpenAILLM(BaseLLM):
-    def __init__(self, model: str, temperature: float = 0.8, system_prompt: str = '', history_len: int = 10):
-        super().__init__(model=model, temperature=temperature, system_prompt=system_prompt, history_len=history_len)
+    def __init__(self, model: str, temperature: float = 0.8, system_prompt: str = '', history_len: int | None = 10,
+                 max_context_tokens: int | None = None, base_url: str | None = None):
+        super().__init__(model=model, temperature=temperature, system_prompt=system_prompt, history_len=history_len,
+                         max_context_tokens=max_context_tokens)
 
-        self.openai_client = OpenAI()
+        # base_url=None falls back to OPENAI_BASE_URL or the official endpoint
+        self.base_url = base_url
+        self.openai_client = OpenAI(base_url=base_url)
 
-    def generate(self):
+        self.rate_limiter = None
+
+    def set_rate_limiter(self, rate_limiter):
+        """Schedules the requests with a (shared) `RateLimiter`, which takes over the retries of the client"""
+        self.rate_limiter = rate_limiter
+        self.openai_client = self.openai_client.with_options(max_retries=0)
+        self._async_client = None
+
+    def _create_async_client(self):
+        if self.rate_limiter is not None:
+            return AsyncOpenAI(base_url=self.base_url, max_retries=0)
+        return AsyncOpenAI(base_url=self.base_url)
+
+    def _create(self, messages, call, **kwargs):
+        create = self.openai_client.chat.completions.with_raw_response.create
+        if self.rate_limiter is None:
+            raw_response = create(**self.request_body(messages), **kwargs)
+            call['retries'] = raw_response.retries_taken
+            return raw_response
+
+        raw_response, call['retries'] = self.rate_limiter.run(lambda: create(**self.request_body(messages), **kwargs),
+                                                              tokens=self._request_tokens(messages),
+                                                              retry_on=(APIConnectionError,))
+        return raw_response
+
+    async def _acreate(self, messages, call, **kwargs):
+        create = self._get_async_client().chat.completions.with_raw_response.create
+        if self.rate_limiter is None:
+            raw_response = await create(**self.request_body(messages), **kwargs)
+            call['retries'] = raw_response.retries_taken
+            return raw_response
+
+        raw_response, call['retries'] = await self.rate_limiter.arun(lambda: create(**self.request_body(messages), **kwargs),
+                                                                     tokens=self._request_tokens(messages),
+                                                                     retry_on=(APIConnectionError,))
+        return raw_response
+
+    def _request_tokens(self, messages) -> int:
+        # the answer counts against the tokens per minute budget up to max_tokens
+        return sum(self.count_message_tokens(message) for message in messages) + self.max_output_tokens
+
+    def endpoint(self):
+        return str(self.openai_client.base_url)
+
+    def request_options(self):
+        options = self.request_body(messages=[])
+        del options['messages']
+        return options
+
+    def request_body(self, messages):
+        return {
+            'model': self.model,
+            'messages': messages,
+            'temperature': self.temperature,
+            'max_tokens': self.max_output_tokens,
+            'response_format': {"type": "json_object"}
+        }
+
+    def _complete(self, messages, call):
         try:
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
-                messages=[{'role': 'system', 'content': self.system_prompt}] + list(self.history),
-                temperature=self.temperature,
-                max_tokens=256,
-                response_format={"type": "json_object"}
-            )
-
-            message_content = response.choices[0].message.content
-
-            try:
-                answer_json = json.loads(message_content)
-                action = answer_json.get('action', None)
-                reflection = answer_json.get('reflection', '')
-            except json.JSONDecodeError:
-                action = None
-                reflection = ''
-                get_logger().warn(f'Error in parsing the message content as JSON: {message_content}')
+            response = self._create(messages, call).parse()
+        except Exception as e:
+            get_logger().warn(f'Error in generation: {e}')
+            return None
 
+        self._record_usage(call, response.usage)
+        return response.choices[0].message.content
+
+    async def _acomplete(self, messages, call):
+        try:
+            response = (await self._acreate(messages, call)).parse()
         except Exception as e:
-            action = None
-            reflection = ''
             get_logger().warn(f'Error in generation: {e}')
+            return None
 
-        content = {
-            'reflection': reflection,
-            'action': action
-        }
+        self._record_usage(call, response.usage)
+        return response.choices[0].message.content
+
+    def _stream(self, messages, call):
+        stream = self._create(messages, call, stream=True, stream_options={'include_usage': True}).parse()
+        try:
+            for chunk in stream:
+                # the usage comes in a last chunk without choices
+                self._record_usage(call, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
+    async def _astream(self, messages, call):
+        stream = (await self._acreate(messages, call, stream=True, stream_options={'include_usage': True})).parse()
+        try:
+            async for chunk in stream:
+                self._record_usage(call, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
 
-        return content
\ No newline at end of file
+    @staticmethod
+    def _record_usage(call, usage):
+        if usage is not None:
+            call['prompt_tokens'] = usage.prompt_tokens
+            call['completion_tokens'] = usage.completion_tokens
@@ -0,0 +1,275 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Dict
+
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+
+# 408 timeout, 409 lock conflict, 429 rate limited and server errors are worth another try
+RETRYABLE_STATUS = (408, 409, 429)
+
+# polling period while waiting for a concurrency slot
+_SLOT_WAIT = 0.01
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Budget of `capacity` units per minute, refilled continuously"""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.rate = capacity / 60
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (requests larger than the bucket wait for a full one)"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def consume(self, amount: float):
+        self.level -= amount
+
+    def sync(self, remaining: float, now: float):
+        """Lowers the level to the budget left reported by the server (which also counts other clients)"""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+
+class RateLimiter:
+    """Request scheduler shared by every agent calling the same endpoint and model.
+
+    Requests wait for the requests (`rpm`) and tokens (`tpm`) per minute budgets and for one of the
+    `concurrency` slots. The budgets follow the `x-ratelimit-remaining-*` response headers. Concurrency
+    is adapted AIMD-style: it grows by one slot per window of successful requests up to `max_concurrency`
+    and halves on a 429. Throttled (429, honouring `retry-after`), server error and connection failures
+    are retried up to `max_retries` times with a jittered exponential backoff.
+    """
+
+    def __init__(self, rpm: float | None = None, tpm: float | None = None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, max_backoff: float = DEFAULT_MAX_BACKOFF):
+        if max_concurrency < 1:
+            raise ValueError(f'Rate limit max_concurrency must be at least 1, got {max_concurrency}')
+
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.in_flight = 0
+        self.stats = {
+            'requests': 0,
+            'retries': 0,
+            'throttled': 0,
+            'wait_time': 0.0
+        }
+
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Takes a slot and the budgets of a request, or returns the seconds to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._blocked_until - now
+            if self.requests is not None:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                return wait
+            if self.in_flight >= int(self.concurrency):
+                return _SLOT_WAIT
+
+            self.in_flight += 1
+            self.stats['requests'] += 1
+            if self.requests is not None:
+                self.requests.consume(1)
+            if self.tokens is not None:
+                self.tokens.consume(tokens)
+            return 0.0
+
+    def acquire(self, tokens: int = 0):
+        start = time.monotonic()
+        while (wait := self._try_acquire(tokens)) > 0:
+            time.sleep(wait)
+        self._add_wait(time.monotonic() - start)
+
+    async def aacquire(self, tokens: int = 0):
+        start = time.monotonic()
+        while (wait := self._try_acquire(tokens)) > 0:
+            await asyncio.sleep(wait)
+        self._add_wait(time.monotonic() - start)
+
+    def _add_wait(self, wait: float):
+        with self._lock:
+            self.stats['wait_time'] += wait
+
+    def release(self, headers=None, error: Exception | None = None):
+        """Frees the slot of a finished request, syncs the budgets with its headers and adapts the concurrency"""
+        with self._lock:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if headers is not None:
+                self._sync(headers, now)
+
+            if error is None:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            elif _status(error) == 429:
+                self.stats['throttled'] += 1
+                self.concurrency = max(1.0, self.concurrency / 2)
+                retry_after = get_retry_after(headers) if headers is not None else None
+                if retry_after is not None:
+                    # every request waits, not only the throttled one
+                    self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def _sync(self, headers, now: float):
+        for bucket, name in ((self.requests, 'requests'), (self.tokens, 'tokens')):
+            remaining = headers.get(f'x-ratelimit-remaining-{name}')
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+
+            if bucket is not None:
+                bucket.sync(remaining, now)
+            elif remaining <= 0:
+                # no local budget, wait for the server one to reset
+                reset = parse_duration(headers.get(f'x-ratelimit-reset-{name}'))
+                if reset is not None:
+                    self._blocked_until = max(self._blocked_until, now + reset)
+
+    def retry_delay(self, attempt: int, error: Exception, retry_on=()) -> float | None:
+        """Seconds to wait before retrying after `error` (attempt 0 is the first retry), None to give up"""
+        status = _status(error)
+        retryable = status in RETRYABLE_STATUS or (status is not None and status >= 500) or isinstance(error, retry_on)
+        if not retryable or attempt >= self.max_retries:
+            return None
+
+        # full jitter, so that the requests throttled together do not retry together
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        headers = _headers(error)
+        retry_after = get_retry_after(headers) if headers is not None else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        with self._lock:
+            self.stats['retries'] += 1
+        return delay
+
+    def run(self, request, tokens: int = 0, retry_on=()):
+        """Calls `request()` within the limits, retrying it on throttling and transient errors.
+
+        Returns the response and the number of retries. `retry_on` are extra exception types to retry.
+        """
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            try:
+                response = request()
+            except Exception as e:
+                self.release(_headers(e), error=e)
+                delay = self.retry_delay(attempt, e, retry_on)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            self.release(getattr(response, 'headers', None))
+            return response, attempt
+
+    async def arun(self, request, tokens: int = 0, retry_on=()):
+        """Async counterpart of `run`, `request()` returns an awaitable"""
+        attempt = 0
+        while True:
+            await self.aacquire(tokens)
+            try:
+                response = await request()
+            except Exception as e:
+                self.release(_headers(e), error=e)
+                delay = self.retry_delay(attempt, e, retry_on)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            self.release(getattr(response, 'headers', None))
+            return response, attempt
+
+
+def _status(error: Exception) -> int | None:
+    return getattr(error, 'status_code', None)
+
+
+def _headers(error: Exception):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'headers', None)
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Seconds of a rate limit reset header, either a number of seconds or a duration such as '6m0s' or '20ms'"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    units = {'ms': 0.001, 'h': 3600, 'm': 60, 's': 1}
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def get_retry_after(headers) -> float | None:
+    """Seconds asked by the server before retrying (`retry-after-ms` or `retry-after`), None if absent"""
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            # HTTP dates are not worth parsing here, the backoff applies
+            return None
+    return None
+
+
+def get_rate_limiter(key: str, **kwargs) -> RateLimiter:
+    """Returns the process-wide limiter for `key` (endpoint and model), created with `kwargs` on first use"""
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(**kwargs)
+        return _limiters[key]
+
+
+def get_rate_limit_stats() -> Dict:
+    """Counters of every limiter of the process, by key"""
+    with _limiters_lock:
+        return {key: dict(limiter.stats) for key, limiter in _limiters.items()}
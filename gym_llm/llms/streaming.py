@@ -0,0 +1,97 @@
+import json
+
+_WHITESPACE = ' \t\r\n'
+
+
+class ActionStreamParser:
+    """Incremental JSON scanner that detects when the top-level `action` value of a streamed answer is complete.
+
+    Chunks are fed as they arrive, `feed` returns True once `action` is available (and keeps accumulating
+    the text afterwards so the full answer can still be parsed).
+    """
+
+    def __init__(self, key: str = 'action'):
+        self.key = key
+        self.text = ''
+        self.action = None
+        self.done = False
+
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expect_value = False
+        self._current_key = None
+        self._scalar_start = None
+
+    def feed(self, chunk: str) -> bool:
+        self.text += chunk
+        if not self.done:
+            self._scan()
+        return self.done
+
+    def _scan(self):
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            char = text[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._end_string(text[self._string_start:self._pos + 1])
+                self._pos += 1
+                continue
+
+            if self._scalar_start is not None:
+                if char in _WHITESPACE or char in ',}]':
+                    self._end_scalar(text[self._scalar_start:self._pos])
+                    continue
+                self._pos += 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+            elif self._depth == 1:
+                if char == ':':
+                    self._expect_value = True
+                elif char == ',':
+                    self._expect_value = False
+                    self._current_key = None
+                elif char not in _WHITESPACE and self._expect_value and self._current_key == self.key:
+                    # number, true, false or null
+                    self._scalar_start = self._pos
+            self._pos += 1
+
+    def _end_string(self, literal: str):
+        try:
+            value = json.loads(literal)
+        except json.JSONDecodeError:
+            value = None
+
+        if not self._expect_value:
+            self._current_key = value
+        elif self._current_key == self.key:
+            self._set_action(value)
+
+    def _end_scalar(self, literal: str):
+        self._scalar_start = None
+        try:
+            value = json.loads(literal)
+        except json.JSONDecodeError:
+            value = literal
+        self._set_action(value)
+
+    def _set_action(self, value):
+        self.action = value
+        self.done = True
@@ -0,0 +1,43 @@
+import re
+from typing import Callable, Dict
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# per message formatting tokens added by chat templates (role markers, separators)
+MESSAGE_OVERHEAD = 4
+
+# short letter runs, numbers in groups of 3 and single symbols roughly match BPE tokenizers on JSON-like prompts
+_TOKEN_RE = re.compile(r'[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]')
+
+_tokenizers: Dict[str, Callable[[str], int]] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate, used when no tokenizer is registered for the model"""
+    return len(_TOKEN_RE.findall(text))
+
+
+def register_tokenizer(model_prefix: str, count_tokens: Callable[[str], int]):
+    """Registers `count_tokens(text) -> int` for every model whose name starts with `model_prefix`"""
+    _tokenizers[model_prefix] = count_tokens
+
+
+def get_token_counter(model: str) -> Callable[[str], int]:
+    """Returns the registered tokenizer with the longest matching prefix, tiktoken for OpenAI models if
+    installed, or `estimate_tokens`"""
+    prefixes = [prefix for prefix in _tokenizers if model.startswith(prefix)]
+    if prefixes:
+        return _tokenizers[max(prefixes, key=len)]
+
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+        else:
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+    return estimate_tokens
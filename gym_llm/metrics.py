@@ -0,0 +1,42 @@
+from typing import Dict, List
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentiles(values: List[float]) -> Dict | None:
+    if not values:
+        return None
+    return {f'p{q}': float(np.percentile(values, q)) for q in PERCENTILES}
+
+
+def summarize_calls(calls: List[Dict]) -> Dict:
+    """Aggregates the per-call records of `BaseLLM.calls`.
+
+    Latency percentiles only include the calls that reached the backend (not the cached ones), and
+    tokens/s is the completion tokens over the generation time of the calls reporting both. The time the
+    server spent loading the model (Ollama) is split from the inference time of the calls.
+    """
+    backend_calls = [call for call in calls if not call['cached']]
+    timed_calls = [call for call in backend_calls
+                   if call['completion_tokens'] is not None and call['generation_time']]
+
+    generation_time = sum(call['generation_time'] for call in timed_calls)
+    # records saved before load times were reported have no `load_time`
+    load_time = float(sum(call.get('load_time') or 0 for call in backend_calls))
+
+    return {
+        'calls': len(calls),
+        'cached': len(calls) - len(backend_calls),
+        'errors': sum(call['error'] for call in calls),
+        'parse_errors': sum(call['parse_error'] for call in calls),
+        'retries': sum(call['retries'] for call in calls),
+        'latency': percentiles([call['latency'] for call in backend_calls]),
+        'ttft': percentiles([call['ttft'] for call in backend_calls if call['ttft'] is not None]),
+        'prompt_tokens': sum(call['prompt_tokens'] or 0 for call in backend_calls),
+        'completion_tokens': sum(call['completion_tokens'] or 0 for call in backend_calls),
+        'tokens_per_second': sum(call['completion_tokens'] for call in timed_calls) / generation_time if generation_time else None,
+        'load_time': load_time,
+        'inference_time': float(sum(call['latency'] for call in backend_calls)) - load_time
+    }
@@ -0,0 +1,597 @@
+import ast
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+from gym_llm.llms.tokens import estimate_tokens, MESSAGE_OVERHEAD
+
+LATENCY_DISTRIBUTIONS = ('constant', 'uniform', 'normal', 'lognormal')
+POLICIES = ('random', 'scripted', 'oracle')
+
+# every character belongs to a chunk, so that the streamed chunks add up to the answer
+_CHUNK_RE = re.compile(r'[A-Za-z]{1,6}|\d{1,3}|\s+|[^\sA-Za-z\d]')
+_ACTION_SCHEMA_RE = re.compile(r'Actions must be generated based on this structure: (\{.*?\})\.\n', re.DOTALL)
+# numpy scalars and arrays in the repr observation format
+_NUMPY_SCALAR_RE = re.compile(r'np\.\w+\(([^()]*)\)')
+_NUMPY_ARRAY_RE = re.compile(r'array\((\[[^()]*\])(?:,\s*dtype=\w+)?\)')
+
+_WORDS = ('the', 'agent', 'should', 'move', 'toward', 'goal', 'avoid', 'state', 'action', 'observation', 'reward', 'next')
+
+
+def get_latency_sampler(latency) -> Callable[[random.Random], float]:
+    """Time to first token sampler (seconds) from a number (constant) or 'constant:s', 'uniform:low,high',
+    'normal:mean,std' or 'lognormal:median,sigma'"""
+    if isinstance(latency, (int, float)) or ':' not in latency:
+        return lambda rng: float(latency)
+
+    name, _, params = latency.partition(':')
+    if name not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f'Unknown latency distribution {name}, expected one of {LATENCY_DISTRIBUTIONS}')
+    params = [float(param) for param in params.split(',')]
+
+    if name == 'constant':
+        return lambda rng: params[0]
+    if name == 'uniform':
+        return lambda rng: rng.uniform(params[0], params[1])
+    if name == 'normal':
+        return lambda rng: max(rng.gauss(params[0], params[1]), 0.0)
+    return lambda rng: rng.lognormvariate(math.log(params[0]), params[1])
+
+
+def get_policy(policy, env_id: str | None = None, actions: List[int] | None = None) -> Callable:
+    """Action policy `(observation, num_actions, rng) -> action`: 'random', 'scripted' (cycles through `actions` in
+    the order the requests arrive), 'oracle' (the `heuristic_action` of `env_id`) or any such callable"""
+    if callable(policy):
+        return policy
+
+    if policy not in POLICIES:
+        raise ValueError(f'Unknown policy {policy}, expected one of {POLICIES}')
+
+    if policy == 'random':
+        return lambda observation, num_actions, rng: rng.randrange(num_actions)
+
+    if policy == 'scripted':
+        if not actions:
+            raise ValueError('The scripted policy needs a list of actions')
+        count = iter(range(2 ** 62))
+        lock = threading.Lock()
+
+        def scripted(observation, num_actions, rng):
+            with lock:
+                return actions[next(count) % len(actions)]
+
+        return scripted
+
+    if env_id is None:
+        raise ValueError('The oracle policy needs the id of the environment')
+
+    import gymnasium as gym
+
+    env = gym.make(env_id).unwrapped
+    if not hasattr(env, 'heuristic_action'):
+        raise ValueError(f'{type(env).__name__} has no heuristic_action for the oracle policy')
+
+    def oracle(observation, num_actions, rng):
+        if observation is None:
+            return rng.randrange(num_actions)
+        return int(env.heuristic_action(observation))
+
+    return oracle
+
+
+def parse_observation(content: str) -> Dict | None:
+    """Observation dict of a user message in any of the encoder formats (repr, json or kv), None if not parsable"""
+    try:
+        return json.loads(content)['observation']
+    except (json.JSONDecodeError, TypeError, KeyError):
+        pass
+
+    try:
+        observation = ast.literal_eval(content)['observation']
+        observation = _NUMPY_ARRAY_RE.sub(r'\1', _NUMPY_SCALAR_RE.sub(r'\1', observation))
+        return ast.literal_eval(observation)
+    except (ValueError, SyntaxError, TypeError, KeyError):
+        pass
+
+    fields = {}
+    for pair in content.split():
+        key, separator, value = pair.partition('=')
+        if not separator:
+            return None
+        try:
+            values = [float(v) if '.' in v else int(v) for v in value.split(',')]
+        except ValueError:
+            return None
+        fields[key] = values[0] if len(values) == 1 else values
+    fields.pop('start', None)
+    return fields or None
+
+
+def get_num_actions(system_prompt: str) -> int:
+    """Number of actions of the action schema written in the agent system prompt (1 if not found)"""
+    match = _ACTION_SCHEMA_RE.search(system_prompt)
+    if match is None:
+        return 1
+    try:
+        return max(len(ast.literal_eval(match.group(1))), 1)
+    except (ValueError, SyntaxError):
+        return 1
+
+
+class MockLLMServer:
+    """Local stand-in for an LLM server speaking the OpenAI chat completions and the Ollama `/api/chat` and
+    `/api/generate` protocols, streamed or not.
+
+    Answers are JSON objects with the action chosen by `policy` on the observation of the last user message and a
+    filler reflection of `reflection_tokens` words. Each answer waits a time to first token drawn from `latency` and
+    then generates at `tokens_per_second` (unbounded if None). A fraction of the requests fail with a 500
+    (`error_rate`), a 429 with a `retry_after` seconds hint (`rate_limit_rate`) or get a truncated answer
+    (`malformed_rate`). Every random draw is seeded by `seed`, the request content and how many times it was received,
+    so the answers do not depend on the order concurrent episodes send their requests in. Like an Ollama server holding
+    a single model, Ollama requests for another model than the loaded one first wait `load_time` seconds.
+
+    The OpenAI `files` and `batches` endpoints run Batch API jobs with the same answers and request failures. A batch
+    stays in progress for `batch_latency` seconds, and a fraction of the batches fail as a whole (`batch_fail_rate`) or
+    expire with only half of their requests answered (`batch_expire_rate`).
+    """
+
+    def __init__(self, policy='random', env_id: str | None = None, actions: List[int] | None = None,
+                 latency: float | str = 0.0, tokens_per_second: float | None = None, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, malformed_rate: float = 0.0, retry_after: float = 0.1,
+                 reflection_tokens: int = 40, load_time: float = 0.0, batch_latency: float = 0.0,
+                 batch_fail_rate: float = 0.0, batch_expire_rate: float = 0.0, seed: int = 0, host: str = '127.0.0.1',
+                 port: int = 0):
+        self.policy = get_policy(policy, env_id=env_id, actions=actions)
+        self.sample_latency = get_latency_sampler(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.retry_after = retry_after
+        self.reflection_tokens = reflection_tokens
+        self.load_time = load_time
+        self.batch_latency = batch_latency
+        self.batch_fail_rate = batch_fail_rate
+        self.batch_expire_rate = batch_expire_rate
+        self.seed = seed
+
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'rate_limited': 0,
+            'malformed': 0,
+            'model_loads': 0,
+            'batches': 0
+        }
+
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._loaded_model = None
+        self._load_lock = threading.Lock()
+        # uploaded and generated files, `id -> (file object, content)`, and `id -> batch job`
+        self._files = {}
+        self._batches = {}
+        self._thread = None
+
+        self._server = _Server((host, port), _Handler)
+        self._server.mock = self
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def openai_base_url(self) -> str:
+        return f'{self.url}/v1'
+
+    def start(self):
+        """Serves from a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def request_rng(self, request: Dict) -> random.Random:
+        """Generator seeded by the request content and how many times the same request was received"""
+        key = hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+            self.stats['requests'] += 1
+        return random.Random(f'{self.seed}:{key}:{attempt}')
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def failure(self, rng: random.Random) -> int | None:
+        """HTTP status of a failed request, None if it succeeds"""
+        draw = rng.random()
+        if draw < self.rate_limit_rate:
+            self._count('rate_limited')
+            return 429
+        if draw < self.rate_limit_rate + self.error_rate:
+            self._count('errors')
+            return 500
+        return None
+
+    def load(self, model: str) -> float:
+        """Swaps the loaded model if needed (every request waits meanwhile) and returns the seconds it took"""
+        with self._load_lock:
+            if model == self._loaded_model:
+                return 0.0
+            time.sleep(self.load_time)
+            self._loaded_model = model
+            self._count('model_loads')
+            return self.load_time
+
+    def openai_error(self, rng: random.Random) -> Tuple[int, Dict, Dict] | None:
+        """Status, body and headers of a failed OpenAI request, None if it succeeds"""
+        status = self.failure(rng)
+        if status is None:
+            return None
+        headers = {'retry-after-ms': str(int(self.retry_after * 1000))} if status == 429 else {}
+        message = 'Rate limit reached' if status == 429 else 'The server had an error'
+        return status, {'error': {'message': message, 'type': 'mock_error', 'code': status}}, headers
+
+    def chat_completion(self, request: Dict, rng: random.Random) -> Tuple[Dict, str, float]:
+        """Non streamed OpenAI completion of the request, with its answer and time to first token"""
+        messages = request.get('messages', [])
+        answer = self.answer(messages, rng)
+        ttft = self.sample_latency(rng)
+        usage = {'prompt_tokens': _prompt_tokens(messages), 'completion_tokens': estimate_tokens(answer)}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        completion = {'id': 'chatcmpl-mock', 'object': 'chat.completion', 'created': int(time.time()),
+                      'model': request.get('model', 'mock'), 'usage': usage, 'choices': [
+                          {'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}]}
+        return completion, answer, ttft
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> Dict:
+        with self._lock:
+            file_id = f'file-mock-{len(self._files)}'
+            self._files[file_id] = ({'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                                     'filename': filename, 'purpose': purpose, 'status': 'processed'}, content)
+        return self._files[file_id][0]
+
+    def get_file(self, file_id: str) -> Tuple[Dict, bytes] | None:
+        return self._files.get(file_id)
+
+    def create_batch(self, request: Dict) -> Dict | None:
+        """Runs the requests of the input file at once, the batch shows them once `batch_latency` has elapsed.
+        None if the input file does not exist."""
+        input_file = self.get_file(request.get('input_file_id'))
+        if input_file is None:
+            return None
+
+        lines = [json.loads(line) for line in input_file[1].decode('utf-8').splitlines() if line.strip()]
+        rng = self.request_rng({'batch': lines})
+        draw = rng.random()
+
+        with self._lock:
+            batch_id = f'batch_mock_{len(self._batches)}'
+            self.stats['batches'] += 1
+
+        batch = {
+            'id': batch_id,
+            'object': 'batch',
+            'endpoint': request.get('endpoint'),
+            'input_file_id': request.get('input_file_id'),
+            'completion_window': request.get('completion_window'),
+            'created_at': int(time.time()),
+            'status': 'in_progress',
+            'output_file_id': None,
+            'error_file_id': None,
+            'errors': None,
+            'request_counts': {'total': len(lines), 'completed': 0, 'failed': 0}
+        }
+
+        if draw < self.batch_fail_rate:
+            final = {'status': 'failed', 'errors': {'object': 'list', 'data': [
+                {'code': 'mock_error', 'message': 'The batch failed', 'line': None, 'param': None}]}}
+        else:
+            expired = draw < self.batch_fail_rate + self.batch_expire_rate
+            # an expired batch only got to answer half of its requests
+            answered = len(lines) // 2 if expired else len(lines)
+            # requests that ran go to the output file (with their error status if they failed), the others to the
+            # error file
+            outputs, errors = [], []
+            failed = 0
+            for i, line in enumerate(lines):
+                output = {'id': f'{batch_id}_req_{i}', 'custom_id': line['custom_id'], 'response': None, 'error': None}
+                if i >= answered:
+                    output['error'] = {'code': 'batch_expired', 'message': 'The batch expired before the request ran'}
+                    errors.append(output)
+                    continue
+
+                request_rng = self.request_rng(line['body'])
+                error = self.openai_error(request_rng)
+                if error is not None:
+                    output['response'] = {'status_code': error[0], 'request_id': output['id'], 'body': error[1]}
+                    failed += 1
+                else:
+                    completion, _, _ = self.chat_completion(line['body'], request_rng)
+                    output['response'] = {'status_code': 200, 'request_id': output['id'], 'body': completion}
+                outputs.append(output)
+
+            final = {
+                'status': 'expired' if expired else 'completed',
+                'output_file_id': self._add_jsonl(outputs, f'{batch_id}_output.jsonl')['id'] if outputs else None,
+                'error_file_id': self._add_jsonl(errors, f'{batch_id}_error.jsonl')['id'] if errors else None,
+                'request_counts': {'total': len(lines), 'completed': len(outputs) - failed, 'failed': failed + len(errors)}
+            }
+
+        with self._lock:
+            self._batches[batch_id] = {'batch': batch, 'final': final, 'done_at': time.time() + self.batch_latency}
+        return self.get_batch(batch_id)
+
+    def get_batch(self, batch_id: str) -> Dict | None:
+        job = self._batches.get(batch_id)
+        if job is None:
+            return None
+        if time.time() < job['done_at']:
+            return dict(job['batch'])
+        return {**job['batch'], **job['final']}
+
+    def cancel_batch(self, batch_id: str) -> Dict | None:
+        job = self._batches.get(batch_id)
+        if job is not None and time.time() < job['done_at']:
+            job['final'] = {'status': 'cancelled'}
+            job['done_at'] = 0.0
+        return self.get_batch(batch_id)
+
+    def _add_jsonl(self, items: List[Dict], filename: str) -> Dict:
+        content = ''.join(json.dumps(item) + '\n' for item in items).encode('utf-8')
+        return self.add_file(content, filename, purpose='batch_output')
+
+    def answer(self, messages: List[Dict], rng: random.Random) -> str:
+        system_prompt = messages[0]['content'] if messages and messages[0]['role'] == 'system' else ''
+        user_messages = [message for message in messages if message['role'] == 'user']
+        observation = parse_observation(user_messages[-1]['content']) if user_messages else None
+
+        action = self.policy(observation, get_num_actions(system_prompt), rng)
+        reflection = ' '.join(rng.choice(_WORDS) for _ in range(self.reflection_tokens))
+
+        fields = {'action': str(action), 'reflection': reflection}
+        # the streaming prompt asks for the action first
+        if system_prompt.find('"reflection"') < system_prompt.find('"action"'):
+            fields = {'reflection': reflection, 'action': str(action)}
+        answer = json.dumps(fields)
+
+        if rng.random() < self.malformed_rate:
+            self._count('malformed')
+            answer = answer[:len(answer) // 2]
+        return answer
+
+    def chunks(self, answer: str, ttft: float):
+        """Yields the answer chunks at the pace of the time to first token and the generation speed"""
+        time.sleep(ttft)
+        for chunk in _CHUNK_RE.findall(answer):
+            if self.tokens_per_second and not chunk.isspace():
+                time.sleep(1 / self.tokens_per_second)
+            yield chunk
+
+    def generation_time(self, answer: str) -> float:
+        return estimate_tokens(answer) / self.tokens_per_second if self.tokens_per_second else 0.0
+
+
+class _Server(ThreadingHTTPServer):
+    # many agents may connect at once
+    request_queue_size = 256
+    mock: MockLLMServer
+
+    def handle_error(self, request, client_address):
+        # clients closing a cancelled stream are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        mock = self.server.mock
+        parts = self.path.strip('/').split('/')
+        if self.path in ('/', '/api/version'):
+            self._send_json(200, {'version': 'mock'})
+        elif parts[:2] == ['v1', 'files'] and len(parts) in (3, 4) and mock.get_file(parts[2]) is not None:
+            file, content = mock.get_file(parts[2])
+            if len(parts) == 3:
+                self._send_json(200, file)
+            elif parts[3] == 'content':
+                self._send_bytes(200, content, 'application/octet-stream')
+            else:
+                self._send_json(404, {'error': f'Unknown path {self.path}'})
+        elif parts[:2] == ['v1', 'batches'] and len(parts) == 3 and mock.get_batch(parts[2]) is not None:
+            self._send_json(200, mock.get_batch(parts[2]))
+        else:
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/v1/files':
+            self._upload_file(body)
+            return
+
+        request = json.loads(body or b'{}')
+        if self.path == '/v1/batches':
+            batch = self.server.mock.create_batch(request)
+            if batch is None:
+                self._send_json(404, {'error': {'message': f'No such file {request.get("input_file_id")}'}})
+            else:
+                self._send_json(200, batch)
+        elif self.path.startswith('/v1/batches/') and self.path.endswith('/cancel'):
+            batch = self.server.mock.cancel_batch(self.path.split('/')[3])
+            if batch is None:
+                self._send_json(404, {'error': f'Unknown path {self.path}'})
+            else:
+                self._send_json(200, batch)
+        elif self.path.endswith('/chat/completions'):
+            self._openai_chat(request)
+        elif self.path == '/api/chat':
+            self._ollama(request, generate=False)
+        elif self.path == '/api/generate':
+            self._ollama(request, generate=True)
+        else:
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+
+    def _upload_file(self, body: bytes):
+        # multipart/form-data with the `file` and its `purpose`
+        message = BytesParser(policy=HTTP).parsebytes(
+            b'Content-Type: ' + self.headers.get('Content-Type', '').encode('latin-1') + b'\r\n\r\n' + body)
+        fields = {part.get_param('name', header='content-disposition'): part for part in message.iter_parts()}
+        if 'file' not in fields:
+            self._send_json(400, {'error': {'message': 'Missing file'}})
+            return
+
+        purpose = (fields['purpose'].get_payload(decode=True) or b'').decode('utf-8') if 'purpose' in fields else ''
+        self._send_json(200, self.server.mock.add_file(fields['file'].get_payload(decode=True),
+                                                       filename=fields['file'].get_filename() or 'upload', purpose=purpose))
+
+    def _openai_chat(self, request):
+        mock = self.server.mock
+        rng = mock.request_rng(request)
+
+        error = mock.openai_error(rng)
+        if error is not None:
+            self._send_json(*error)
+            return
+
+        completion, answer, ttft = mock.chat_completion(request, rng)
+
+        if not request.get('stream'):
+            time.sleep(ttft + mock.generation_time(answer))
+            self._send_json(200, completion)
+            return
+
+        usage = completion['usage']
+        chunk = {key: completion[key] for key in ('id', 'created', 'model')}
+        chunk['object'] = 'chat.completion.chunk'
+        self._start_stream('text/event-stream')
+        for content in mock.chunks(answer, ttft):
+            self._write_chunk('data: ' + json.dumps(
+                {**chunk, 'choices': [{'index': 0, 'delta': {'content': content}, 'finish_reason': None}]}) + '\n\n')
+        self._write_chunk('data: ' + json.dumps(
+            {**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}) + '\n\n')
+        if (request.get('stream_options') or {}).get('include_usage'):
+            self._write_chunk('data: ' + json.dumps({**chunk, 'choices': [], 'usage': usage}) + '\n\n')
+        self._write_chunk('data: [DONE]\n\n')
+        self._end_stream()
+
+    def _ollama(self, request, generate: bool):
+        mock = self.server.mock
+        rng = mock.request_rng(request)
+
+        status = mock.failure(rng)
+        if status is not None:
+            self._send_json(status, {'error': 'rate limit reached' if status == 429 else 'mock server error'})
+            return
+
+        load_duration = int(mock.load(request.get('model')) * 1e9)
+        response = {'model': request.get('model', 'mock'), 'created_at': datetime.now(timezone.utc).isoformat()}
+
+        if generate and not request.get('prompt'):
+            # a request without prompt only loads the model
+            self._send_json(200, {**response, 'response': '', 'done': True, 'done_reason': 'load',
+                                  'load_duration': load_duration})
+            return
+
+        if generate:
+            messages = [{'role': 'system', 'content': request.get('system') or ''},
+                        {'role': 'user', 'content': _last_turn(request.get('prompt', ''))}]
+            prompt_tokens = estimate_tokens(request.get('prompt', '')) + estimate_tokens(request.get('system') or '')
+        else:
+            messages = request.get('messages', [])
+            prompt_tokens = _prompt_tokens(messages)
+
+        answer = mock.answer(messages, rng)
+        ttft = mock.sample_latency(rng)
+        final = {
+            'done': True,
+            'done_reason': 'stop',
+            'load_duration': load_duration,
+            'prompt_eval_count': prompt_tokens,
+            'eval_count': estimate_tokens(answer),
+            'eval_duration': int(mock.generation_time(answer) * 1e9)
+        }
+        if generate:
+            # fake token ids, only the length of the context matters to the client
+            final['context'] = list(request.get('context') or []) + list(range(prompt_tokens + final['eval_count']))
+
+        def part(content):
+            return {**response, 'response': content} if generate else {**response, 'message': {'role': 'assistant', 'content': content}}
+
+        if not request.get('stream', True):
+            time.sleep(ttft + mock.generation_time(answer))
+            self._send_json(200, {**part(answer), **final})
+            return
+
+        self._start_stream('application/x-ndjson')
+        for content in mock.chunks(answer, ttft):
+            self._write_chunk(json.dumps({**part(content), 'done': False}) + '\n')
+        self._write_chunk(json.dumps({**part(''), **final}) + '\n')
+        self._end_stream()
+
+    def _send_json(self, status: int, body: Dict, headers: Dict | None = None):
+        self._send_bytes(status, json.dumps(body).encode('utf-8'), 'application/json', headers)
+
+    def _send_bytes(self, status: int, data: bytes, content_type: str, headers: Dict | None = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, text: str):
+        data = text.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b'0\r\n\r\n')
+
+
+def _prompt_tokens(messages: List[Dict]) -> int:
+    return sum(estimate_tokens(message.get('content') or '') + MESSAGE_OVERHEAD for message in messages)
+
+
+def _last_turn(prompt: str) -> str:
+    """Content of the last user turn of an incremental Ollama prompt ('role: content' lines)"""
+    turns = [turn for turn in re.split(r'\n(?=user: |assistant: )', prompt) if turn.startswith('user: ')]
+    return turns[-1][len('user: '):] if turns else prompt
@@ -0,0 +1,49 @@
+from concurrent.futures import Executor
+
+from gym_llm.episode import start_episode, record_step, finish_episode
+
+
+def run_pipelined_episode(env, agent, seed: int, logger, executor: Executor, prefetch: int = 0, frames=None,
+                          trajectory=None):
+    """Same as `run_episode`, but the LLM request of the next decision runs in `executor` while the current
+    step is rendered, logged and recorded.
+
+    With `action_rate > 1`, the request of the next decision is launched `prefetch` steps early, on the
+    latest observation available at that time, and the action is used once the decision step is reached.
+    """
+    obs, _ = env.reset(seed=seed)
+    agent.reset(seed=seed)
+    episode = start_episode(agent, obs, frames=frames, trajectory=trajectory)
+
+    prefetch = min(prefetch, agent.action_rate - 1)
+    pending = None
+
+    def observe(observation):
+        nonlocal pending
+        decision = agent.observe(observation)
+        if pending is None and (decision or agent.steps_to_decision() < prefetch):
+            pending = executor.submit(agent.llm.generate, agent.llm.get_messages())
+        return decision
+
+    done = False
+    decision = observe(obs)
+    while not done:
+        if decision:
+            raw_output, action = agent.act(pending.result())
+            pending = None
+        else:
+            raw_output, action = {'reflection': '', 'action': agent.last_action}, agent.last_action
+
+        obs, reward, terminated, truncated, _ = env.step(action)
+
+        # the next request is sent before rendering and logging the current step
+        if not (terminated or truncated):
+            decision = observe(obs)
+
+        done = record_step(episode, agent, logger, obs, raw_output, action, reward, terminated, truncated, render=env.render)
+
+    if pending is not None:
+        # a prefetched decision for a step that never came
+        pending.result()
+
+    return finish_episode(episode, agent, logger)
@@ -0,0 +1,152 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from gym_llm.agent import parse_action
+from gym_llm.episode import start_episode, record_step, finish_episode
+
+FALLBACKS = ('last', 'noop', 'scripted')
+
+
+def get_fallback_action(env, fallback: str, observation, last_action, noop_action: int):
+    """Action played on a tick without a fresh LLM decision"""
+    if fallback == 'last' and last_action is not None:
+        return last_action
+    if fallback == 'scripted':
+        return env.unwrapped.heuristic_action(observation)
+    return noop_action
+
+
+async def arun_realtime_episode(env, agent, seed: int, logger, fps: float, fallback: str = 'last', noop_action: int = 0,
+                                frames=None, trajectory=None):
+    """Runs an episode where the env advances every `1 / fps` seconds whatever the LLM latency.
+
+    A request is always in flight on the latest observation. Each tick plays the decision completed since
+    the previous tick, or the `fallback` action ('last' decision, 'noop' or the env 'scripted' controller)
+    if the deadline was missed. Staleness is the age in ticks of the observation behind the LLM action played.
+
+    The history holds the observations the requests were sent on: those of the ticks played while a request
+    was in flight are not added, so consecutive prompts are as far apart as the latency of the request. With
+    `action_rate > 1`, the observations that do not require an action are added without a request and their
+    ticks play the last decision, like the skipped frames of a sequential run.
+    """
+    if fallback not in FALLBACKS:
+        raise ValueError(f'Unknown fallback {fallback}, expected one of {FALLBACKS}')
+
+    if fallback == 'scripted' and not hasattr(env.unwrapped, 'heuristic_action'):
+        raise ValueError(f'{type(env.unwrapped).__name__} has no heuristic_action for the scripted fallback')
+
+    loop = asyncio.get_running_loop()
+    period = 1.0 / fps
+
+    # the env runs on its own thread so that stepping and rendering (pygame waits for its own clock in human
+    # mode) do not block the event loop while a request is in flight
+    env_executor = ThreadPoolExecutor(max_workers=1)
+
+    obs, _ = await loop.run_in_executor(env_executor, lambda: env.reset(seed=seed))
+    agent.reset(seed=seed)
+    episode = start_episode(agent, obs, frames=frames, trajectory=trajectory)
+
+    done = False
+    pending = None
+    pending_tick = 0
+    # tick of the observation behind the last valid decision
+    decision_tick = None
+
+    stats = {
+        'ticks': 0,
+        'decisions': 0,
+        'missed_deadlines': 0,
+        'overruns': 0,
+        'staleness': [],
+        'latency': []
+    }
+
+    next_tick = loop.time()
+    while not done:
+        skipped = False
+        if pending is None:
+            if agent.observe(obs):
+                pending = asyncio.create_task(_timed(agent.llm.agenerate(agent.llm.get_messages())))
+                pending_tick = episode['num_steps']
+            else:
+                skipped = decision_tick is not None
+
+        delay = next_tick - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            # env step, rendering and logging took longer than the tick
+            await asyncio.sleep(0)
+            if delay < -period:
+                stats['overruns'] += 1
+                next_tick = loop.time()
+        next_tick += period
+
+        fresh = False
+        if pending is not None and pending.done():
+            result, latency = pending.result()
+            # `act` replaces answers without a valid action by the last one, which is not a fresh decision
+            fresh = parse_action(result['action']) is not None
+            raw_output, action = agent.act(result)
+            stats['decisions'] += 1
+            stats['latency'].append(latency)
+            if fresh:
+                decision_tick = pending_tick
+            pending = None
+
+        held = False
+        if skipped:
+            action = agent.last_action
+            raw_output = {'reflection': '', 'action': action}
+        elif not fresh:
+            stats['missed_deadlines'] += 1
+            held = fallback == 'last' and decision_tick is not None
+            action = get_fallback_action(env, fallback, obs, agent.last_action if held else None, noop_action)
+            raw_output = {'reflection': '', 'action': action, 'fallback': fallback if held or fallback != 'last' else 'noop'}
+
+        if fresh or skipped or held:
+            stats['staleness'].append(episode['num_steps'] - decision_tick)
+
+        obs, reward, terminated, truncated, _ = await loop.run_in_executor(env_executor, env.step, action)
+
+        frame = await loop.run_in_executor(env_executor, env.render) if frames is not None else None
+
+        stats['ticks'] += 1
+        done = record_step(episode, agent, logger, obs, raw_output, action, reward, terminated, truncated,
+                           render=lambda: frame)
+
+    if pending is not None:
+        pending.cancel()
+        try:
+            await pending
+        except asyncio.CancelledError:
+            pass
+
+    env_executor.shutdown()
+
+    result = finish_episode(episode, agent, logger, realtime=summarize_realtime(stats))
+    logger.info(f'    Missed deadlines: {stats["missed_deadlines"]} / {stats["ticks"]} ticks')
+
+    return result
+
+
+async def _timed(coroutine):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    result = await coroutine
+    return result, loop.time() - start
+
+
+def summarize_realtime(stats: Dict) -> Dict:
+    staleness = stats['staleness']
+    latency = stats['latency']
+    return {
+        'ticks': stats['ticks'],
+        'decisions': stats['decisions'],
+        'missed_deadlines': stats['missed_deadlines'],
+        'overruns': stats['overruns'],
+        'mean_staleness': sum(staleness) / len(staleness) if staleness else None,
+        'max_staleness': max(staleness) if staleness else None,
+        'mean_latency': sum(latency) / len(latency) if latency else None
+    }
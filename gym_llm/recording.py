@@ -0,0 +1,152 @@
+import io
+import struct
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+
+class GifWriter:
+    """Writes an animated GIF frame by frame, so that only the current frame is held in memory.
+
+    Only the region that changed since the previous frame is encoded (on its own by Pillow) and appended
+    to the file with a local color table, exact when the region has at most 256 colors and quantized by
+    Pillow otherwise. `frame_skip` keeps one frame out of n (played n times longer) and `scale` downsizes
+    the frames.
+    """
+
+    def __init__(self, path: Path, fps: float, frame_skip: int = 1, scale: float = 1.0):
+        if frame_skip < 1:
+            raise ValueError(f'GIF frame skip must be at least 1, got {frame_skip}')
+        if not 0 < scale <= 1:
+            raise ValueError(f'GIF scale must be in (0, 1], got {scale}')
+
+        self.path = path
+        self.frame_skip = frame_skip
+        self.scale = scale
+        # GIF delays are in hundredths of a second
+        self.delay = max(round(100 * frame_skip / fps), 1)
+
+        self.num_frames = 0
+        self._file = open(path, 'wb')
+        self._previous = None
+
+    def append(self, frame: np.ndarray):
+        self.num_frames += 1
+        if (self.num_frames - 1) % self.frame_skip:
+            return
+
+        image = Image.fromarray(np.ascontiguousarray(frame))
+        if self.scale != 1:
+            image = image.resize((max(round(image.width * self.scale), 1), max(round(image.height * self.scale), 1)),
+                                 Image.Resampling.BILINEAR)
+
+        pixels = np.asarray(image)
+        left, top = 0, 0
+        if self._previous is None:
+            self._write_header(image.width, image.height)
+        elif pixels.shape != self._previous.shape:
+            raise ValueError(f'Frame shape {pixels.shape} differs from the first frame shape {self._previous.shape}')
+        else:
+            rows, columns = np.nonzero((pixels != self._previous).any(axis=-1))
+            if len(rows):
+                top, left = rows.min(), columns.min()
+                image = image.crop((left, top, columns.max() + 1, rows.max() + 1))
+            else:
+                image = image.crop((0, 0, 1, 1))
+        self._previous = pixels
+
+        buffer = io.BytesIO()
+        _to_palette(image).save(buffer, format='GIF', interlace=False)
+        color_table, image_descriptor, image_data = _split_gif(buffer.getvalue())
+
+        # graphic control extension: keep the previous frame under the region, delay, no transparency
+        self._file.write(b'\x21\xf9\x04\x04' + struct.pack('<H', self.delay) + b'\x00\x00')
+        # image descriptor with a local color table of the size of the encoded frame's table (keeping the interlace flag)
+        table_bits = (len(color_table) // 3).bit_length() - 2
+        self._file.write(b'\x2c' + struct.pack('<HH', left, top) + image_descriptor[5:9] +
+                         bytes([0x80 | (image_descriptor[9] & 0x40) | table_bits]))
+        self._file.write(color_table)
+        self._file.write(image_data)
+
+    def _write_header(self, width: int, height: int):
+        self._file.write(b'GIF89a' + struct.pack('<HH', width, height) + b'\x70\x00\x00')
+        # NETSCAPE2.0 application extension, loop forever
+        self._file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.write(b'\x3b')
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class GifRecorder:
+    """Opens one `GifWriter` per run in the experiment folder"""
+
+    def __init__(self, exp_save_path: Path, fps: float, frame_skip: int = 1, scale: float = 1.0):
+        self.exp_save_path = exp_save_path
+        self.fps = fps
+        self.frame_skip = frame_skip
+        self.scale = scale
+
+    def open(self, run_idx: int, seed: int) -> GifWriter:
+        return GifWriter(self.exp_save_path / f'run_{run_idx}_seed_{seed}.gif', fps=self.fps,
+                         frame_skip=self.frame_skip, scale=self.scale)
+
+
+def _to_palette(image: Image.Image) -> Image.Image:
+    """Palette image with the exact colors of an RGB image of at most 256 colors, the image itself otherwise"""
+    if image.mode != 'RGB':
+        return image
+
+    pixels = np.asarray(image, dtype=np.uint32)
+    packed = (pixels[..., 0] << 16) | (pixels[..., 1] << 8) | pixels[..., 2]
+    colors, indices = np.unique(packed, return_inverse=True)
+    if len(colors) > 256:
+        return image
+
+    palette_image = Image.fromarray(indices.reshape(packed.shape).astype(np.uint8), mode='P')
+    palette_image.putpalette(np.stack([colors >> 16, (colors >> 8) & 0xff, colors & 0xff], axis=-1).astype(np.uint8).tobytes())
+    return palette_image
+
+
+def _split_gif(data: bytes):
+    """Returns the color table, image descriptor and LZW data (with its block terminator) of a single frame GIF"""
+    pos = 13
+    color_table = b''
+    if data[10] & 0x80:
+        table_size = 3 * 2 ** ((data[10] & 0x07) + 1)
+        color_table = data[pos:pos + table_size]
+        pos += table_size
+
+    while data[pos] == 0x21:
+        # skip extensions
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+
+    if data[pos] != 0x2c:
+        raise ValueError('Unexpected GIF block while reading the encoded frame')
+
+    image_descriptor = data[pos:pos + 10]
+    pos += 10
+    if image_descriptor[9] & 0x80:
+        table_size = 3 * 2 ** ((image_descriptor[9] & 0x07) + 1)
+        color_table = data[pos:pos + table_size]
+        pos += table_size
+
+    start = pos
+    pos += 1  # LZW minimum code size
+    while data[pos]:
+        pos += data[pos] + 1
+    pos += 1
+
+    return color_table, image_descriptor, data[start:pos]
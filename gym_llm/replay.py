@@ -0,0 +1,225 @@
+import copy
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from gym_llm.episode import log_episode
+from gym_llm.logger import get_logger, EmptyLogger
+from gym_llm.recording import GifRecorder
+from gym_llm.trajectory import Trajectory, TrajectoryRecorder, META_FILE
+from gym_llm.utils import parse_config, get_env, _recording
+
+_RUN_RE = re.compile(r'run_(\d+)_seed_(-?\d+)_(?:trajectory|raw_outputs\.json)$')
+
+
+def get_recorded_runs(exp_path: Path) -> Dict[int, Dict]:
+    """Recorded `run_idx -> {seed, actions, trajectory}` of an experiment folder.
+
+    Actions come from the trajectory store when the run has one, from `raw_outputs.json` otherwise. A raw output
+    without action (unparsable answer) held the previous action.
+    """
+    runs = {}
+    for path in sorted(exp_path.iterdir()):
+        match = _RUN_RE.match(path.name)
+        if match is None:
+            continue
+        run_idx, seed = int(match.group(1)), int(match.group(2))
+
+        if path.is_dir():
+            if not (path / META_FILE).exists():
+                continue
+            trajectory = Trajectory(path)
+            runs[run_idx] = {'seed': seed, 'actions': np.asarray(trajectory.actions), 'trajectory': trajectory}
+        elif run_idx not in runs:
+            with open(path) as f:
+                raw_outputs = json.load(f)
+            actions = []
+            for step in sorted(raw_outputs, key=int):
+                action = raw_outputs[step].get('action')
+                actions.append(action if action is not None else (actions[-1] if actions else None))
+            runs[run_idx] = {'seed': seed, 'actions': actions, 'trajectory': None}
+
+    return dict(sorted(runs.items()))
+
+
+def _as_columns(observation) -> Dict[str, np.ndarray]:
+    if not isinstance(observation, dict):
+        return {'observation': np.asarray(observation)}
+    return {key: np.asarray(value) for key, value in observation.items()}
+
+
+def _diverged_fields(trajectory: Trajectory, step: int, obs, reward, terminated, truncated, tolerance: float) -> List[str]:
+    """Fields of the replayed `step` (0 is the reset) that differ from the recorded ones"""
+    fields = []
+    recorded = trajectory.observations
+    for key, value in _as_columns(obs).items():
+        if key not in recorded or not np.allclose(recorded[key][step], value, rtol=tolerance, atol=tolerance):
+            fields.append(f'observation.{key}')
+
+    if step > 0:
+        if not np.isclose(trajectory.rewards[step - 1], reward, rtol=tolerance, atol=tolerance):
+            fields.append('reward')
+        if bool(trajectory.terminated[step - 1]) != terminated:
+            fields.append('terminated')
+        if bool(trajectory.truncated[step - 1]) != truncated:
+            fields.append('truncated')
+    return fields
+
+
+def replay_episode(env, actions: Sequence, seed: int, logger, trajectory: Trajectory | None = None,
+                   frames=None, record=None, on_step=None, tolerance: float = 1e-6) -> Dict:
+    """Plays the recorded `actions` from `env.reset(seed)` without any LLM.
+
+    Each step is checked against the recorded `trajectory` if any, and the replay stops at the first divergence
+    (reported as `{'step', 'fields'}`, step 0 being the reset). Running out of actions before the end of the
+    episode, or ending before the last one, is a divergence too. `frames` and `record` are GIF and trajectory
+    writers, and `on_step(step, obs, action, reward, terminated, truncated)` is called after every step.
+    """
+    obs, _ = env.reset(seed=seed)
+    if record is not None:
+        record.reset(obs)
+
+    divergence = None
+    if trajectory is not None:
+        fields = _diverged_fields(trajectory, 0, obs, None, None, None, tolerance)
+        if fields:
+            divergence = {'step': 0, 'fields': fields}
+
+    done = False
+    total_reward = 0
+    num_steps = 0
+
+    while not done and divergence is None:
+        if num_steps == len(actions):
+            divergence = {'step': num_steps, 'fields': ['actions']}
+            break
+
+        action = actions[num_steps]
+        obs, reward, terminated, truncated, _ = env.step(action)
+
+        if frames is not None:
+            frames.append(env.render())
+
+        if record is not None:
+            record.append(obs, {}, action, reward, terminated, truncated)
+
+        total_reward += reward
+        num_steps += 1
+        done = terminated or truncated
+
+        if on_step is not None:
+            on_step(num_steps, obs, action, reward, terminated, truncated)
+
+        if trajectory is not None:
+            fields = _diverged_fields(trajectory, num_steps, obs, reward, terminated, truncated, tolerance)
+            if fields:
+                divergence = {'step': num_steps, 'fields': fields}
+
+    if divergence is None and num_steps < len(actions):
+        divergence = {'step': num_steps, 'fields': ['actions']}
+
+    episode = {
+        'total_reward': float(total_reward),
+        'num_steps': num_steps,
+        'divergence': divergence
+    }
+    log_episode(logger, episode)
+
+    return episode
+
+
+def replay_experiment(exp_path: Path, output: Path | None = None, runs: Sequence[int] | None = None,
+                      save_gif: bool = False, save_trajectory: bool = False, on_step=None,
+                      tolerance: float = 1e-6, verbose: bool = False) -> Path:
+    """Replays the recorded runs of an experiment folder on the env of its `config.yaml`, without any LLM.
+
+    GIFs (with the gif settings of the experiment) and trajectories are regenerated on demand into `output`
+    (`<exp_path>/replay` by default) along with a `results.json`. Runs without a trajectory store are checked
+    against the total reward and steps of the original `results.json`. Divergent runs are logged as warnings.
+    """
+    exp_path = Path(exp_path)
+    config = parse_config(path=exp_path / 'config.yaml')
+    exp_config = config.get('experiment')
+
+    output = Path(output) if output is not None else exp_path / 'replay'
+    output.mkdir(parents=True, exist_ok=True)
+
+    logger = get_logger() if verbose else EmptyLogger()
+
+    recorded = get_recorded_runs(exp_path)
+    if runs is not None:
+        missing = [run_idx for run_idx in runs if run_idx not in recorded]
+        if missing:
+            raise ValueError(f'No recorded actions for runs {missing} in {exp_path}')
+        recorded = {run_idx: recorded[run_idx] for run_idx in runs}
+    if not recorded:
+        raise ValueError(f'No recorded runs (trajectories or raw outputs) in {exp_path}')
+
+    original = {}
+    if (exp_path / 'results.json').exists():
+        with open(exp_path / 'results.json') as f:
+            original = json.load(f)
+
+    # vector runs are replayed one by one, each sub-env plays the same episodes as a single env
+    env_config = copy.deepcopy(config.get('environment'))
+    env_config['num_envs'] = 1
+    env_config['kwargs'] = {**(env_config.get('kwargs') or {}), 'render_mode': 'rgb_array' if save_gif else None}
+    env = get_env(env_config=env_config)
+
+    recorder = None
+    if save_gif:
+        recorder = GifRecorder(output, fps=exp_config.get('gif_fps', 30), frame_skip=exp_config.get('gif_frame_skip', 1),
+                               scale=exp_config.get('gif_scale', 1.0))
+
+    trajectories = TrajectoryRecorder(output) if save_trajectory else None
+
+    episodes = {}
+    for run_idx, run in recorded.items():
+        seed = run['seed']
+        with _recording(recorder, run_idx, seed) as frames, _recording(trajectories, run_idx, seed) as record:
+            episode = replay_episode(env, run['actions'], seed=seed, logger=logger, trajectory=run['trajectory'],
+                                     frames=frames, record=record, on_step=on_step, tolerance=tolerance)
+
+        if episode['divergence'] is None and run['trajectory'] is None and run_idx < len(original.get('total_steps', [])):
+            fields = []
+            if episode['num_steps'] != original['total_steps'][run_idx]:
+                fields.append('num_steps')
+            if not np.isclose(episode['total_reward'], original['total_rewards'][run_idx], rtol=tolerance, atol=tolerance):
+                fields.append('total_reward')
+            if fields:
+                episode['divergence'] = {'step': None, 'fields': fields}
+
+        if episode['divergence'] is not None:
+            step = episode['divergence']['step']
+            get_logger().warn(f'Replay of run {run_idx} (seed {seed}) diverged{f" at step {step}" if step is not None else ""}: '
+                              f'{", ".join(episode["divergence"]["fields"])}')
+
+        episode['source'] = 'trajectory' if run['trajectory'] is not None else 'raw_outputs'
+        episodes[run_idx] = episode
+
+    env.close()
+
+    total_rewards = [episode['total_reward'] for episode in episodes.values()]
+    total_steps = [episode['num_steps'] for episode in episodes.values()]
+    results = {
+        'runs': list(episodes),
+        'total_rewards': total_rewards,
+        'total_steps': total_steps,
+        'avg_reward': sum(total_rewards) / len(episodes),
+        'avg_steps': sum(total_steps) / len(episodes),
+        'diverged_runs': [run_idx for run_idx, episode in episodes.items() if episode['divergence'] is not None],
+        'episodes': {str(run_idx): episode for run_idx, episode in episodes.items()}
+    }
+
+    with open(output / 'results.json', 'w') as f:
+        json.dump(results, f, indent=4)
+
+    logger.info('********************************')
+    logger.info(f'    Replayed runs: {len(episodes)} -> Diverged: {len(results["diverged_runs"])}')
+    logger.info(f'    Average reward: {results["avg_reward"]}')
+
+    return output
+
@@ -0,0 +1,240 @@
+import copy
+import glob
+import importlib
+import itertools
+import json
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from gym_llm.logger import get_logger
+from gym_llm.utils import parse_config, get_experiment_path, run_experiment
+
+# agent keys that can be swept from the command line
+GRID_KEYS = ('model', 'temperature', 'history', 'action_rate')
+# summary columns in seconds, written with a fixed precision in the markdown table
+TIME_COLUMNS = ('load_time', 'inference_time')
+
+
+def expand_config_paths(patterns: Sequence[str]) -> List[Path]:
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(str(pattern)))
+        if not matches:
+            raise ValueError(f'No config file matches {pattern}')
+        paths += [Path(match) for match in matches if Path(match) not in paths]
+
+    return paths
+
+
+def expand_jobs(config_paths: Sequence[Path], grid: Dict | None = None) -> List[Dict]:
+    """Builds one config per (config file, grid combination).
+
+    Sweep jobs never use `use_datetime` so that a finished job can be detected from its `results.json`, and
+    resume by default so that an interrupted job skips its finished runs. Ollama jobs warm their model up by default.
+    """
+    grid = grid or {}
+
+    for key in grid:
+        if key not in GRID_KEYS:
+            raise ValueError(f'Unknown grid key {key}, expected one of {GRID_KEYS}')
+
+    keys = list(grid.keys())
+    combinations = list(itertools.product(*[grid[key] for key in keys]))
+
+    jobs = []
+    for path in config_paths:
+        base_config = parse_config(path=path)
+
+        for values in combinations:
+            config = copy.deepcopy(base_config)
+            overrides = dict(zip(keys, values))
+            config['agent'].update(overrides)
+
+            exp_config = config['experiment']
+            exp_config['use_datetime'] = False
+            exp_config.setdefault('resume', True)
+            if config['agent'].get('backend', 'ollama') == 'ollama':
+                config['agent'].setdefault('warmup', True)
+            if overrides:
+                exp_config['name'] = str(Path(exp_config['name']) / '_'.join(f'{key}={value}' for key, value in overrides.items()))
+
+            jobs.append({'config_path': str(path), 'overrides': overrides, 'config': config})
+
+    return jobs
+
+
+def get_affinity_key(config: Dict) -> tuple:
+    """`(backend, host, model)` of a job, jobs sharing it reuse the model loaded on the server"""
+    agent_config = config['agent']
+    backend = agent_config.get('backend', 'ollama')
+    host = agent_config.get('host') if backend == 'ollama' else agent_config.get('base_url')
+    return backend, host, agent_config.get('model', 'llama3.1')
+
+
+class AffinityScheduler:
+    """Orders the pending jobs so that an Ollama server does not swap models back and forth.
+
+    Jobs are grouped by `(backend, host, model)`. An Ollama host drains the group of its loaded model before
+    starting another one, while the other workers may run jobs of other hosts or backends meanwhile.
+    """
+
+    def __init__(self, jobs: Sequence[Dict]):
+        self.groups = {}
+        for job in jobs:
+            self.groups.setdefault(get_affinity_key(job['config']), []).append(job)
+        # ollama host -> group being drained
+        self.draining = {}
+        # group -> number of its jobs running
+        self.running = {}
+
+    def __bool__(self):
+        return bool(self.groups)
+
+    def next_job(self) -> Dict | None:
+        """Next job to start, None if every pending job waits for its Ollama host to finish another model"""
+        # the groups being drained come first
+        for key in sorted(self.groups, key=lambda key: key not in self.draining.values()):
+            backend, host, model = key
+            if backend == 'ollama':
+                if host not in self.draining:
+                    get_logger().info(f'Running the {model} jobs on ollama host {host or "default"}')
+                if self.draining.setdefault(host, key) != key:
+                    continue
+            job = self.groups[key].pop(0)
+            if not self.groups[key]:
+                del self.groups[key]
+            self.running[key] = self.running.get(key, 0) + 1
+            return job
+        return None
+
+    def finish(self, job: Dict):
+        key = get_affinity_key(job['config'])
+        self.running[key] -= 1
+        if not self.running[key] and key not in self.groups and self.draining.get(key[1]) == key:
+            del self.draining[key[1]]
+
+
+def _init_worker(env_modules: Sequence[str]):
+    # environments are registered on import, every worker process needs them
+    for module in env_modules:
+        importlib.import_module(module)
+
+
+def _run_job(config: Dict) -> Dict:
+    exp_save_path = run_experiment(config=config)
+
+    with open(exp_save_path / 'results.json', 'r') as f:
+        return json.load(f)
+
+
+def run_sweep(config_patterns: Sequence[str],
+              grid: Dict | None = None,
+              workers: int = 1,
+              summary_path: Path = Path('experiments/sweep_summary'),
+              env_modules: Sequence[str] = ('environments',)) -> List[Dict]:
+    jobs = expand_jobs(expand_config_paths(config_patterns), grid=grid)
+    logger = get_logger()
+
+    pending = []
+    for job in jobs:
+        job['path'] = get_experiment_path(job['config'])
+        if (job['path'] / 'results.json').exists():
+            with open(job['path'] / 'results.json', 'r') as f:
+                job['results'] = json.load(f)
+            job['status'] = 'skipped'
+            logger.info(f'Skipping {job["path"]}, results.json already exists')
+        else:
+            pending.append(job)
+
+    logger.info(f'Running {len(pending)} of {len(jobs)} jobs with {workers} workers')
+
+    scheduler = AffinityScheduler(pending)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tuple(env_modules),)) as executor:
+        futures = {}
+        while scheduler or futures:
+            while len(futures) < workers and (job := scheduler.next_job()) is not None:
+                futures[executor.submit(_run_job, job['config'])] = job
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = futures.pop(future)
+                scheduler.finish(job)
+                try:
+                    job['results'] = future.result()
+                    job['status'] = 'done'
+                    logger.info(f'Finished {job["path"]}')
+                except Exception as e:
+                    job['results'] = None
+                    job['status'] = 'failed'
+                    logger.error(f'Job {job["path"]} failed: {e}')
+
+    summary = [_summarize(job) for job in jobs]
+    write_summary(summary, summary_path)
+
+    return summary
+
+
+def _summarize(job: Dict) -> Dict:
+    config = job['config']
+    results = job['results'] or {}
+
+    return {
+        'config': job['config_path'],
+        'path': str(job['path']),
+        'environment': config['environment'].get('name'),
+        'backend': config['agent'].get('backend'),
+        'model': config['agent'].get('model'),
+        'temperature': config['agent'].get('temperature'),
+        'history': config['agent'].get('history'),
+        'action_rate': config['agent'].get('action_rate'),
+        'seed': config['experiment'].get('seed', 0),
+        'num_runs': config['experiment'].get('num_runs', 1),
+        'avg_reward': results.get('avg_reward'),
+        'avg_steps': results.get('avg_steps'),
+        'load_time': _load_time(results),
+        'inference_time': _inference_time(results),
+        'status': job['status']
+    }
+
+
+def _load_time(results: Dict) -> float | None:
+    """Seconds the server spent loading the model while this job ran: its warm-up (done once per model and worker,
+    so it is charged to the first job of the model on each worker) and the `load_duration` of its calls"""
+    if not results.get('llm_calls') and not results.get('model_load'):
+        return None
+    calls = (results.get('llm_calls') or {}).get('experiment', {})
+    return float(sum((results.get('model_load') or {}).values()) + (calls.get('load_time') or 0))
+
+
+def _inference_time(results: Dict) -> float | None:
+    inference_time = (results.get('llm_calls') or {}).get('experiment', {}).get('inference_time')
+    return None if inference_time is None else float(inference_time)
+
+
+def _format(column: str, value) -> str:
+    if value is None:
+        return '-'
+    if column in TIME_COLUMNS:
+        return f'{value:.2f}'
+    return str(value)
+
+
+def write_summary(summary: List[Dict], summary_path: Path):
+    """Writes the summary as `<summary_path>.json` and as a markdown table in `<summary_path>.md`"""
+    summary_path = Path(summary_path)
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(summary_path.with_suffix('.json'), 'w') as f:
+        json.dump(summary, f, indent=4)
+
+    columns = ['environment', 'backend', 'model', 'temperature', 'history', 'action_rate',
+               'seed', 'num_runs', 'avg_reward', 'avg_steps', 'load_time', 'inference_time', 'status']
+
+    lines = ['| ' + ' | '.join(f'**{column}**' for column in columns) + ' |',
+             '|' + '|'.join(':---:' for _ in columns) + '|']
+    for row in summary:
+        lines.append('| ' + ' | '.join(_format(column, row[column]) for column in columns) + ' |')
+
+    with open(summary_path.with_suffix('.md'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,206 @@
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+META_FILE = 'meta.json'
+TEXT_FILE = 'steps.jsonl'
+STEP_COLUMNS = ('action', 'reward', 'terminated', 'truncated', 'time')
+
+_RUN_RE = re.compile(r'run_(\d+)_seed_(-?\d+)_trajectory$')
+
+
+class TrajectoryWriter:
+    """Appends the steps of an episode to a directory of columns as they are played.
+
+    Each observation key (`observation.<key>`), the action, reward, terminated and truncated flags and the time since
+    the reset are raw binary columns, one fixed size row per step, whose dtype and row shape are kept in `meta.json`.
+    The rest of the raw output (reflection, fallback...) goes to a JSON lines file. The first observation row is
+    the reset one, so the observation columns have one more row than the others.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.num_steps = 0
+        self.columns = {}
+        self._files = {}
+        self._text = open(self.path / TEXT_FILE, 'w')
+        self._start = time.perf_counter()
+
+    def reset(self, observation):
+        self._start = time.perf_counter()
+        self._write_observation(observation)
+
+    def append(self, observation, raw_output: Dict, action, reward, terminated: bool, truncated: bool):
+        self._write_observation(observation)
+        self._write('action', action)
+        self._write('reward', reward)
+        self._write('terminated', terminated)
+        self._write('truncated', truncated)
+        self._write('time', time.perf_counter() - self._start)
+
+        self._text.write(json.dumps({key: value for key, value in raw_output.items() if key != 'action'}, default=str) + '\n')
+        self.num_steps += 1
+
+    def _write_observation(self, observation):
+        if not isinstance(observation, dict):
+            observation = {'': observation}
+        for key, value in observation.items():
+            self._write(f'observation.{key}' if key else 'observation', value)
+
+    def _write(self, name: str, value):
+        value = np.asarray(value)
+        if name not in self.columns:
+            self.columns[name] = {'dtype': value.dtype.newbyteorder('<').str, 'shape': list(value.shape)}
+            self._files[name] = open(self.path / f'{name}.bin', 'wb')
+            self._write_meta(complete=False)
+        column = self.columns[name]
+        self._files[name].write(np.ascontiguousarray(value, dtype=column['dtype']).reshape(column['shape']).tobytes())
+
+    def _write_meta(self, complete: bool):
+        with open(self.path / META_FILE, 'w') as f:
+            json.dump({'columns': self.columns, 'num_steps': self.num_steps, 'complete': complete}, f)
+
+    def flush(self):
+        for file in self._files.values():
+            file.flush()
+        self._text.flush()
+
+    def close(self):
+        if self._text.closed:
+            return
+        for file in self._files.values():
+            file.close()
+        self._text.close()
+        self._write_meta(complete=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryRecorder:
+    """Opens one `TrajectoryWriter` per run in the experiment folder"""
+
+    def __init__(self, exp_save_path: Path):
+        self.exp_save_path = exp_save_path
+
+    def open(self, run_idx: int, seed: int) -> TrajectoryWriter:
+        return TrajectoryWriter(self.exp_save_path / f'run_{run_idx}_seed_{seed}_trajectory')
+
+
+class Trajectory:
+    """Recorded episode, read lazily: the numeric columns are memory-mapped on first access.
+
+    Runs interrupted before `close` are read up to their last complete step.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / META_FILE) as f:
+            meta = json.load(f)
+        self.columns = meta['columns']
+        self.complete = meta['complete']
+
+        match = _RUN_RE.search(self.path.name)
+        self.run_idx = int(match.group(1)) if match else None
+        self.seed = int(match.group(2)) if match else None
+
+        if self.complete:
+            self.num_steps = meta['num_steps']
+        else:
+            self.num_steps = min([self._rows(name) for name in STEP_COLUMNS if name in self.columns] +
+                                 [self._rows(name) - 1 for name in self.observation_keys()], default=0)
+            self.num_steps = max(self.num_steps, 0)
+        self._cache = {}
+
+    def _row_size(self, name: str) -> int:
+        column = self.columns[name]
+        return np.dtype(column['dtype']).itemsize * int(np.prod(column['shape'], dtype=np.int64))
+
+    def _rows(self, name: str) -> int:
+        return (self.path / f'{name}.bin').stat().st_size // self._row_size(name)
+
+    def observation_keys(self) -> List[str]:
+        return [name for name in self.columns if name.startswith('observation')]
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-mapped column, observations have `num_steps + 1` rows and the other columns `num_steps`"""
+        if name not in self._cache:
+            column = self.columns[name]
+            rows = self.num_steps + 1 if name.startswith('observation') else self.num_steps
+            if rows == 0:
+                self._cache[name] = np.zeros((0, *column['shape']), dtype=column['dtype'])
+            else:
+                self._cache[name] = np.memmap(self.path / f'{name}.bin', dtype=column['dtype'], mode='r',
+                                              shape=(rows, *column['shape']))
+        return self._cache[name]
+
+    @property
+    def observations(self) -> Dict[str, np.ndarray]:
+        return {name.partition('.')[2] or name: self.column(name) for name in self.observation_keys()}
+
+    @property
+    def actions(self) -> np.ndarray:
+        return self.column('action')
+
+    @property
+    def rewards(self) -> np.ndarray:
+        return self.column('reward')
+
+    @property
+    def terminated(self) -> np.ndarray:
+        return self.column('terminated')
+
+    @property
+    def truncated(self) -> np.ndarray:
+        return self.column('truncated')
+
+    @property
+    def times(self) -> np.ndarray:
+        return self.column('time')
+
+    @property
+    def total_reward(self) -> float:
+        return float(self.rewards.sum())
+
+    def texts(self) -> Iterator[Dict]:
+        """Non numeric part of the raw output of each step (reflection...)"""
+        with open(self.path / TEXT_FILE) as f:
+            for _, line in zip(range(self.num_steps), f):
+                yield json.loads(line)
+
+
+class ExperimentTrajectories:
+    """Trajectories of every run of an experiment folder, ordered by run index.
+
+    Only the metadata of each run is read up front. `column(name)` concatenates a column over the runs, with
+    `run_index(name)` giving the run of each row.
+    """
+
+    def __init__(self, exp_path: Path):
+        self.exp_path = Path(exp_path)
+        paths = [path for path in self.exp_path.glob('run_*_trajectory') if (path / META_FILE).exists()]
+        self.runs = sorted((Trajectory(path) for path in paths), key=lambda trajectory: trajectory.run_idx)
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __iter__(self):
+        return iter(self.runs)
+
+    def __getitem__(self, index: int) -> Trajectory:
+        return self.runs[index]
+
+    def column(self, name: str) -> np.ndarray:
+        return np.concatenate([run.column(name) for run in self.runs])
+
+    def run_index(self, name: str) -> np.ndarray:
+        return np.concatenate([np.full(len(run.column(name)), run.run_idx) for run in self.runs])
@@ -1,13 +1,28 @@
+import asyncio
 import yaml
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 from typing import Dict
 import gymnasium as gym
-import imageio
 from datetime import datetime
 import gym_llm
 import json
 
 from gym_llm.logger import get_logger, EmptyLogger
+from gym_llm.episode import run_episode, arun_episode, arun_vector_episodes, save_episode, sum_stats, stats_delta
+from gym_llm.agent import get_cache_config
+from gym_llm.batch import OpenAIBatchClient, run_batch_episodes
+from gym_llm.pipeline import run_pipelined_episode
+from gym_llm.realtime import arun_realtime_episode
+from gym_llm.recording import GifRecorder
+from gym_llm.trajectory import TrajectoryRecorder
+from gym_llm.checkpoint import (CheckpointRecorder, RUNS_FILE, save_completed_run, load_completed_runs,
+                                check_resume_config)
+from gym_llm.llms.cache import get_response_cache
+from gym_llm.llms.rate_limit import get_rate_limit_stats
+from gym_llm.llms.ollama_llm import get_model_load_times
+from gym_llm.metrics import summarize_calls
 
 
 def parse_config(path: Path) -> Dict:
@@ -16,9 +31,13 @@ def parse_config(path: Path) -> Dict:
 
     return yaml.safe_load(open(path, 'r'))
 
-def get_env(env_config: Dict, render_mode: str = 'human'):
+RENDER_MODES = ('none', 'human', 'rgb_array')
+
+
+def get_env(env_config: Dict, render_mode: str | None = None):
     name = env_config.get('name', '')
     kwargs = env_config.get('kwargs', {})
+    num_envs = env_config.get('num_envs', 1)
 
     if kwargs is None:
         kwargs = {}
@@ -26,9 +45,23 @@ def get_env(env_config: Dict, render_mode: str = 'human'):
     if 'render_mode' not in kwargs:
         kwargs['render_mode'] = render_mode
 
+    if num_envs > 1:
+        vectorization_mode = env_config.get('vectorization_mode', None)
+        if vectorization_mode is None and kwargs['render_mode'] is not None:
+            # native vector envs (vector_entry_point) do not render
+            vectorization_mode = 'sync'
+
+        return gym.make_vec(id=name, num_envs=num_envs,
+                            vectorization_mode=vectorization_mode,
+                            vector_kwargs=env_config.get('vector_kwargs', None),
+                            **kwargs)
+
     return gym.make(id=name, **kwargs)
 
 def get_env_definition(env):
+    if isinstance(env, gym.vector.VectorEnv):
+        return _get_vector_env_definition(env)
+
     if not isinstance(env.unwrapped, gym_llm.LLMEnv):
         raise ValueError(f'Expected an instance of LLMEnv, got {type(env)}')
 
@@ -41,16 +74,128 @@ def get_env_definition(env):
             }
 
 
-def run_experiment(config):
+def _get_vector_env_definition(env):
+    # native vector envs implement LLMEnv themselves, sync/async ones are asked for the first sub-env definition
+    if isinstance(env.unwrapped, gym_llm.LLMEnv):
+        llm_env = env.unwrapped
+        return {'observation_schema': llm_env.get_observation_schema(),
+                'action_schema': llm_env.get_action_schema(),
+                'goal_description': llm_env.get_goal_description()
+                }
+
+    try:
+        return {'observation_schema': env.call('get_observation_schema')[0],
+                'action_schema': env.call('get_action_schema')[0],
+                'goal_description': env.call('get_goal_description')[0]
+                }
+    except AttributeError as e:
+        raise ValueError(f'Expected sub-environments to be instances of LLMEnv: {e}') from e
+
+
+def get_batch_config(exp_config: Dict) -> Dict | None:
+    """Normalizes the experiment `batch` entry, which can be a boolean or a dict of Batch API options"""
+    batch_config = exp_config.get('batch', False)
+
+    if not batch_config:
+        return None
+
+    if batch_config is True:
+        batch_config = {}
+
+    return {
+        'completion_window': batch_config.get('completion_window', '24h'),
+        'poll_interval': batch_config.get('poll_interval', 10.0),
+        'timeout': batch_config.get('timeout', None),
+        'max_episodes': batch_config.get('max_episodes', None)
+    }
+
+
+def get_pipeline_config(exp_config: Dict) -> Dict | None:
+    """Normalizes the experiment `pipeline` entry, which can be a boolean or a dict with the prefetch steps"""
+    pipeline_config = exp_config.get('pipeline', False)
+
+    if not pipeline_config:
+        return None
+
+    if pipeline_config is True:
+        pipeline_config = {}
+
+    return {
+        'prefetch': pipeline_config.get('prefetch', 0)
+    }
+
+
+def get_realtime_config(exp_config: Dict) -> Dict | None:
+    """Normalizes the experiment `realtime` entry, which can be a boolean or a dict with fps, fallback and noop_action"""
+    realtime_config = exp_config.get('realtime', False)
+
+    if not realtime_config:
+        return None
+
+    if realtime_config is True:
+        realtime_config = {}
+
+    return {
+        'fps': realtime_config.get('fps', None),
+        'fallback': realtime_config.get('fallback', 'last'),
+        'noop_action': realtime_config.get('noop_action', 0)
+    }
+
+
+def get_render_mode(exp_config: Dict, save_gif: bool, parallel: bool) -> str | None:
+    """Env render mode from the experiment `render` entry ('none', 'human' or 'rgb_array').
+
+    Defaults to 'rgb_array' when saving GIFs and to 'none' otherwise, so that the envs neither import pygame
+    nor wait for their `render_fps` clock between steps.
+    """
+    render = exp_config.get('render', None)
+
+    if render is None:
+        render = 'rgb_array' if save_gif else 'none'
+
+    if render not in RENDER_MODES:
+        raise ValueError(f'Unknown render mode {render}, expected one of {RENDER_MODES}')
+
+    if save_gif and render != 'rgb_array':
+        raise ValueError(f'GIFs are recorded from rgb_array frames, got render {render} with save_gif')
+
+    if render == 'human' and parallel:
+        # a single pygame display cannot be shared by several episodes
+        raise ValueError('Human rendering cannot be combined with concurrency, num_envs or batch')
+
+    return None if render == 'none' else render
+
+
+def get_experiment_path(config: Dict) -> Path:
     exp_config = config.get('experiment')
 
     exp_save_path = Path(exp_config.get('parent')) / exp_config.get('name')
 
     if exp_config.get('use_datetime', False):
+        # a resumed experiment continues the latest dated folder
+        if exp_config.get('resume', False) and exp_save_path.exists():
+            previous = sorted(path for path in exp_save_path.iterdir() if (path / 'config.yaml').exists())
+            if previous:
+                return previous[-1]
         exp_save_path = exp_save_path / datetime.now().strftime('%Y-%m-%d_%H-%M')
 
+    return exp_save_path
+
+
+def run_experiment(config):
+    exp_config = config.get('experiment')
+
+    exp_save_path = get_experiment_path(config)
+
     exp_save_path.mkdir(parents=True, exist_ok=True)
 
+    resume = exp_config.get('resume', False)
+    if resume and (exp_save_path / 'config.yaml').exists():
+        check_resume_config(parse_config(exp_save_path / 'config.yaml'), config)
+    elif (exp_save_path / RUNS_FILE).exists():
+        # runs of a previous experiment in the same folder
+        (exp_save_path / RUNS_FILE).unlink()
+
     # save the config file
     with open(exp_save_path / 'config.yaml', 'w') as f:
         yaml.dump(config, f, default_flow_style=False)
@@ -58,86 +203,297 @@ def run_experiment(config):
     seed = exp_config.get('seed', 0)
     num_runs = exp_config.get('num_runs', 1)
     save_gif = exp_config.get('save_gif', False)
+    save_trajectory = exp_config.get('save_trajectory', True)
+    save_raw_outputs = exp_config.get('save_raw_outputs', False)
+    checkpoint = exp_config.get('checkpoint', False)
     gif_fps = exp_config.get('gif_fps', 30)
+    gif_frame_skip = exp_config.get('gif_frame_skip', 1)
+    gif_scale = exp_config.get('gif_scale', 1.0)
     verbose = exp_config.get('verbose', False)
+    concurrency = exp_config.get('concurrency', 1)
+
+    if concurrency < 1:
+        raise ValueError(f'Concurrency must be at least 1, got {concurrency}')
 
     logger = EmptyLogger()
     if verbose:
         logger = get_logger()
 
-    render_mode = 'human'
-    if save_gif:
-        render_mode = 'rgb_array'
-
-    env = get_env(env_config=config.get('environment'), render_mode=render_mode)
-
-    agent = gym_llm.Agent(config=config.get('agent'),
-                  **get_env_definition(env))
-
-    total_rewards = []
-    total_steps = []
-
-    for i in range(num_runs):
-        obs, _ = env.reset(seed=seed)
-        agent.reset(seed=seed)
+    num_envs = config.get('environment').get('num_envs', 1)
 
-        seed += 1
+    batch_config = get_batch_config(exp_config)
+    pipeline_config = get_pipeline_config(exp_config)
+    realtime_config = get_realtime_config(exp_config)
 
-        done = False
-        total_reward = 0
-        num_steps = 0
+    if concurrency > 1 and num_envs > 1:
+        raise ValueError('Use either experiment concurrency or a vector environment (num_envs), not both')
 
-        imgs = []
-        raw_outputs = {}
+    if batch_config is not None and (concurrency > 1 or num_envs > 1):
+        raise ValueError('Batch mode already advances every run at once, it cannot be combined with concurrency or num_envs')
 
-        while not done:
-            raw_output, action = agent.get_action(obs)
-            obs, reward, terminated, truncated, _ = env.step(action)
+    if pipeline_config is not None and (concurrency > 1 or num_envs > 1 or batch_config is not None):
+        raise ValueError('Pipelining only applies to sequential runs, it cannot be combined with concurrency, num_envs or batch')
 
-            if save_gif:
-                imgs.append(env.render())
+    if realtime_config is not None and (concurrency > 1 or num_envs > 1 or batch_config is not None or pipeline_config is not None):
+        raise ValueError('Realtime mode only applies to sequential runs, it cannot be combined with concurrency, num_envs, batch or pipeline')
 
-            total_reward += reward
-            num_steps += 1
-            done = terminated or truncated
+    if checkpoint and (num_envs > 1 or batch_config is not None or pipeline_config is not None or realtime_config is not None):
+        raise ValueError('Checkpoints only apply to sequential or concurrent runs, they cannot be combined with num_envs, batch, pipeline or realtime')
 
-            logger.info('********************************')
-            logger.info(f'    Observation: {obs}')
-            logger.info(f'    Reflection: {raw_output["reflection"]}')
-            logger.info(f'    Action: {raw_output["action"]} -> {agent.action_schema.get(int(raw_output["action"]), "Unknown action")}')
-            logger.info(f'    Reward: {reward} -> Total reward: {total_reward}')
-            logger.info(f'    Num steps: {num_steps}')
-            logger.info(f'    Terminated: {terminated}')
-            logger.info(f'    Truncated: {truncated}')
+    if checkpoint and not save_trajectory:
+        raise ValueError('Checkpoints resume episodes from their trajectory, they require save_trajectory')
 
-            raw_outputs[num_steps] = raw_output
+    if batch_config is not None and config.get('agent').get('backend', 'ollama') != 'openai':
+        raise ValueError('Batch mode is only available for the openai backend')
 
-        logger.info('********************************')
-        logger.info(f'    Total reward: {total_reward}')
-        logger.info(f'    Num steps: {num_steps}')
+    render_mode = get_render_mode(exp_config, save_gif=save_gif,
+                                  parallel=concurrency > 1 or num_envs > 1 or batch_config is not None)
 
-        if save_gif:
-            imageio.mimsave(exp_save_path / f'run_{i}_seed_{seed-1}.gif',
-                            imgs, fps=gif_fps)
+    cache = None
+    cache_config = get_cache_config(config.get('agent'))
+    if cache_config is not None:
+        cache = get_response_cache(path=cache_config['path'], max_size_mb=cache_config['max_size_mb'])
+        cache_hits, cache_misses = cache.hits, cache.misses
 
-        with open(exp_save_path / f'run_{i}_seed_{seed-1}_raw_outputs.json', 'w') as f:
-            json.dump(raw_outputs, f, indent=4)
+    # the limiters are shared by the experiments of the process
+    rate_limit_stats = get_rate_limit_stats()
+    # and models are warmed up once per process
+    model_load_times = get_model_load_times()
 
-        total_rewards.append(total_reward)
-        total_steps.append(num_steps)
+    # frames are written to disk as they are rendered
+    recorder = None
+    if save_gif:
+        recorder = GifRecorder(exp_save_path, fps=gif_fps, frame_skip=gif_frame_skip, scale=gif_scale)
+
+    # and so are the steps
+    trajectories = None
+    if save_trajectory:
+        trajectories = TrajectoryRecorder(exp_save_path)
+
+    # and the agent state, to continue interrupted episodes
+    checkpoints = None
+    if checkpoint:
+        checkpoints = CheckpointRecorder(exp_save_path)
+
+    runs = [(i, seed + i) for i in range(num_runs)]
+
+    completed = {}
+    if resume:
+        completed = load_completed_runs(exp_save_path, runs)
+        runs = [(i, run_seed) for i, run_seed in runs if i not in completed]
+        logger.info(f'Resuming {exp_save_path}: {len(completed)} finished runs skipped, {len(runs)} to run')
+
+    def on_episode(i, run_seed, episode):
+        save_episode(exp_save_path, run_idx=i, seed=run_seed, episode=episode, raw_outputs=save_raw_outputs)
+        save_completed_run(exp_save_path, run_idx=i, seed=run_seed, episode=episode)
+        if checkpoints is not None:
+            checkpoints.open(i, run_seed).remove()
+
+    if batch_config is not None:
+        episodes = _run_batch(config=config, runs=runs, batch_config=batch_config, render_mode=render_mode,
+                              recorder=recorder, trajectories=trajectories, exp_save_path=exp_save_path,
+                              logger=logger, on_episode=on_episode)
+    elif num_envs > 1:
+        episodes = asyncio.run(_run_vectorized(config=config, runs=runs, render_mode=render_mode, recorder=recorder,
+                                               trajectories=trajectories, logger=logger, on_episode=on_episode))
+    elif concurrency > 1:
+        episodes = asyncio.run(_run_concurrent(config=config, runs=runs, concurrency=concurrency,
+                                               render_mode=render_mode, recorder=recorder, trajectories=trajectories,
+                                               checkpoints=checkpoints, resume=resume, logger=logger,
+                                               on_episode=on_episode))
+    else:
+        env = get_env(env_config=config.get('environment'), render_mode=render_mode)
+
+        agent = gym_llm.Agent(config=config.get('agent'),
+                      **get_env_definition(env))
+
+        executor = None
+        if pipeline_config is not None:
+            executor = ThreadPoolExecutor(max_workers=1)
+
+        episodes = []
+        for i, run_seed in runs:
+            # loaded before the trajectory of the run is recorded again
+            run_checkpoint = _load_checkpoint(checkpoints, i, run_seed, resume)
+            with _recording(recorder, i, run_seed) as frames, _recording(trajectories, i, run_seed) as trajectory:
+                if realtime_config is not None:
+                    fps = realtime_config['fps'] or env.metadata.get('render_fps', 30)
+                    episode = asyncio.run(arun_realtime_episode(env, agent, seed=run_seed, logger=logger, fps=fps,
+                                                                fallback=realtime_config['fallback'],
+                                                                noop_action=realtime_config['noop_action'], frames=frames,
+                                                                trajectory=trajectory))
+                elif executor is not None:
+                    episode = run_pipelined_episode(env, agent, seed=run_seed, logger=logger, executor=executor,
+                                                    prefetch=pipeline_config['prefetch'], frames=frames,
+                                                    trajectory=trajectory)
+                else:
+                    episode = run_episode(env, agent, seed=run_seed, logger=logger, frames=frames, trajectory=trajectory,
+                                          checkpoint=run_checkpoint)
+            on_episode(i, run_seed, episode)
+            episodes.append(episode)
+
+        if executor is not None:
+            executor.shutdown()
+
+    # finished runs of the previous attempts, in run order
+    episodes = dict(zip([i for i, _ in runs], episodes)) | completed
+    episodes = [episodes[i] for i in range(num_runs)]
+
+    total_rewards = [episode['total_reward'] for episode in episodes]
+    total_steps = [episode['num_steps'] for episode in episodes]
 
     avg_reward = sum(total_rewards) / num_runs
     avg_steps = sum(total_steps) / num_runs
 
+    results = {
+        'total_rewards': total_rewards,
+        'total_steps': total_steps,
+        'avg_reward': avg_reward,
+        'avg_steps': avg_steps
+    }
+
+    llm_stats = sum_stats(episodes)
+    if llm_stats:
+        results['llm_stats'] = llm_stats
+
+    calls = [call for episode in episodes for call in episode.get('llm_calls', [])]
+    if calls:
+        results['llm_calls'] = {
+            'runs': [summarize_calls(episode['llm_calls']) for episode in episodes],
+            'experiment': summarize_calls(calls)
+        }
+        latency = results['llm_calls']['experiment']['latency']
+        if latency is not None:
+            logger.info(f'    LLM latency p50: {latency["p50"]:.3f}s -> p95: {latency["p95"]:.3f}s -> p99: {latency["p99"]:.3f}s')
+        if results['llm_calls']['experiment']['load_time']:
+            logger.info(f'    Model load time: {results["llm_calls"]["experiment"]["load_time"]:.1f}s -> '
+                        f'Inference time: {results["llm_calls"]["experiment"]["inference_time"]:.1f}s')
+
+    model_load = {key: load_time for key, load_time in get_model_load_times().items() if key not in model_load_times}
+    if model_load:
+        results['model_load'] = model_load
+
+    if completed:
+        results['resumed_runs'] = sorted(completed)
+
+    if realtime_config is not None:
+        results['realtime'] = [episode['realtime'] for episode in episodes]
+
+    if cache is not None:
+        results['cache'] = {
+            'hits': cache.hits - cache_hits,
+            'misses': cache.misses - cache_misses
+        }
+        logger.info(f'    Cache hits: {results["cache"]["hits"]} -> Cache misses: {results["cache"]["misses"]}')
+
+    rate_limit = {key: stats_delta(rate_limit_stats.get(key, {}), stats)
+                  for key, stats in get_rate_limit_stats().items() if stats != rate_limit_stats.get(key)}
+    if rate_limit:
+        results['rate_limit'] = rate_limit
+        for key, stats in rate_limit.items():
+            logger.info(f'    Rate limit {key}: {stats["retries"]} retries -> {stats["throttled"]} throttled -> '
+                        f'{stats["wait_time"]:.1f}s waiting')
+
     # save results in a json file
     with open(exp_save_path / 'results.json', 'w') as f:
-        json.dump({
-            'total_rewards': total_rewards,
-            'total_steps': total_steps,
-            'avg_reward': avg_reward,
-            'avg_steps': avg_steps
-        }, f, indent=4)
+        json.dump(results, f, indent=4)
 
     logger.info('********************************')
     logger.info(f'    Average reward: {avg_reward}')
-    logger.info(f'    Average steps: {avg_steps}')
\ No newline at end of file
+    logger.info(f'    Average steps: {avg_steps}')
+
+    return exp_save_path
+
+
+def _load_checkpoint(checkpoints, run_idx: int, seed: int, resume: bool):
+    """Checkpoint of the run, loaded with the state of its interrupted episode when resuming"""
+    if checkpoints is None:
+        return None
+
+    checkpoint = checkpoints.open(run_idx, seed)
+    if resume:
+        checkpoint.load()
+    return checkpoint
+
+
+def _recording(recorder, run_idx: int, seed: int):
+    """GIF or trajectory writer of the run (closed on exit), or a context yielding None when nothing is recorded"""
+    if recorder is None:
+        return nullcontext()
+    return recorder.open(run_idx, seed)
+
+
+async def _run_concurrent(config, runs, concurrency, render_mode, recorder, trajectories, checkpoints, resume, logger,
+                          on_episode):
+    """Runs the seeded episodes `concurrency` at a time, each worker owning its env and agent"""
+    pending = list(runs)
+    episodes = {}
+
+    async def worker():
+        env = get_env(env_config=config.get('environment'), render_mode=render_mode)
+        agent = gym_llm.Agent(config=config.get('agent'),
+                              **get_env_definition(env))
+
+        while pending:
+            i, run_seed = pending.pop(0)
+            run_checkpoint = _load_checkpoint(checkpoints, i, run_seed, resume)
+            with _recording(recorder, i, run_seed) as frames, _recording(trajectories, i, run_seed) as trajectory:
+                episode = await arun_episode(env, agent, seed=run_seed, logger=logger, frames=frames,
+                                             trajectory=trajectory, checkpoint=run_checkpoint)
+            on_episode(i, run_seed, episode)
+            episodes[i] = episode
+
+        env.close()
+
+    await asyncio.gather(*[worker() for _ in range(min(concurrency, len(runs)))])
+
+    return [episodes[i] for i, _ in runs]
+
+
+async def _run_vectorized(config, runs, render_mode, recorder, trajectories, logger, on_episode):
+    """Runs the seeded episodes on the sub-envs of a vector env, batching the LLM requests of each step"""
+    episodes = {}
+
+    env = get_env(env_config=config.get('environment'), render_mode=render_mode)
+    agent = gym_llm.BatchAgent(config=config.get('agent'), num_envs=env.num_envs,
+                               **get_env_definition(env))
+
+    def on_vector_episode(i, run_seed, episode):
+        on_episode(i, run_seed, episode)
+        episodes[i] = episode
+
+    await arun_vector_episodes(env, agent, runs=runs, logger=logger, on_episode=on_vector_episode, recorder=recorder,
+                               trajectories=trajectories)
+    env.close()
+
+    return [episodes[i] for i, _ in runs]
+
+
+def _run_batch(config, runs, batch_config, render_mode, recorder, trajectories, exp_save_path, logger, on_episode):
+    """Runs the seeded episodes in lock-step through the OpenAI Batch API, `max_episodes` at a time"""
+    episodes = {}
+    max_episodes = batch_config['max_episodes'] or len(runs)
+
+    def on_batch_episode(i, run_seed, episode):
+        on_episode(i, run_seed, episode)
+        episodes[i] = episode
+
+    for start in range(0, len(runs), max_episodes):
+        chunk = runs[start:start + max_episodes]
+        envs = [get_env(env_config=config.get('environment'), render_mode=render_mode) for _ in chunk]
+        agents = [gym_llm.Agent(config=config.get('agent'), **get_env_definition(env)) for env in envs]
+
+        batch_client = OpenAIBatchClient(client=agents[0].llm.openai_client,
+                                         completion_window=batch_config['completion_window'],
+                                         poll_interval=batch_config['poll_interval'],
+                                         timeout=batch_config['timeout'])
+
+        run_batch_episodes(envs, agents, runs=chunk, batch_client=batch_client,
+                           work_dir=exp_save_path / 'batches' / f'runs_{chunk[0][0]}-{chunk[-1][0]}',
+                           logger=logger, on_episode=on_batch_episode, recorder=recorder,
+                           trajectories=trajectories)
+
+        for env in envs:
+            env.close()
+
+    return [episodes[i] for i, _ in runs]
@@ -0,0 +1,43 @@
+import argparse
+
+import environments  # to register the environments
+
+from gym_llm.mock_server import MockLLMServer, POLICIES
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local OpenAI and Ollama compatible LLM server for benchmarks without a model')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--policy', choices=POLICIES, default='random', help='how the answered action is chosen')
+    parser.add_argument('--env', default=None, help='environment id of the oracle policy, e.g. TaxiLLM-v3')
+    parser.add_argument('--actions', default=None, help='comma separated actions of the scripted policy')
+    parser.add_argument('--latency', default='0', help="time to first token: seconds or 'uniform:low,high', "
+                                                        "'normal:mean,std', 'lognormal:median,sigma'")
+    parser.add_argument('--tokens-per-second', type=float, default=None, help='generation speed (unbounded by default)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests failing with a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of requests failing with a 429')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='fraction of truncated (unparsable) answers')
+    parser.add_argument('--retry-after', type=float, default=0.1, help='seconds asked by the 429 answers')
+    parser.add_argument('--reflection-tokens', type=int, default=40, help='words of the filler reflection')
+    parser.add_argument('--load-time', type=float, default=0.0, help='seconds to swap the loaded model (ollama requests)')
+    parser.add_argument('--batch-latency', type=float, default=0.0, help='seconds a Batch API job stays in progress')
+    parser.add_argument('--batch-fail-rate', type=float, default=0.0, help='fraction of Batch API jobs failing')
+    parser.add_argument('--batch-expire-rate', type=float, default=0.0, help='fraction of Batch API jobs expiring half done')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockLLMServer(policy=args.policy, env_id=args.env,
+                           actions=[int(action) for action in args.actions.split(',')] if args.actions else None,
+                           latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+                           rate_limit_rate=args.rate_limit_rate, malformed_rate=args.malformed_rate,
+                           retry_after=args.retry_after, reflection_tokens=args.reflection_tokens,
+                           load_time=args.load_time, batch_latency=args.batch_latency,
+                           batch_fail_rate=args.batch_fail_rate, batch_expire_rate=args.batch_expire_rate,
+                           seed=args.seed, host=args.host, port=args.port)
+
+    print(f'Serving on {server.url} (openai base_url: {server.openai_base_url}, ollama host: {server.url})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,27 @@
+import argparse
+from pathlib import Path
+
+import environments  # to register the environments
+
+from gym_llm.replay import replay_experiment
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay the recorded actions of an experiment without any LLM')
+    parser.add_argument('experiment', type=Path, help='experiment folder (with its config.yaml)')
+    parser.add_argument('--runs', type=int, nargs='+', default=None, help='run indices to replay (all by default)')
+    parser.add_argument('--output', type=Path, default=None, help='output folder (default: <experiment>/replay)')
+    parser.add_argument('--save_gif', action='store_true', help='render the runs again as GIFs')
+    parser.add_argument('--save_trajectory', action='store_true', help='record the replayed trajectories')
+    parser.add_argument('--tolerance', type=float, default=1e-6, help='tolerance of the divergence checks')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    output = replay_experiment(exp_path=args.experiment,
+                               output=args.output,
+                               runs=args.runs,
+                               save_gif=args.save_gif,
+                               save_trajectory=args.save_trajectory,
+                               tolerance=args.tolerance,
+                               verbose=args.verbose)
+    print(f'Replay saved in {output}')
@@ -0,0 +1,31 @@
+import argparse
+from pathlib import Path
+
+import yaml
+
+from gym_llm.sweep import run_sweep, GRID_KEYS
+
+
+def parse_grid(values):
+    grid = {}
+    for value in values or []:
+        key, _, options = value.partition('=')
+        if key not in GRID_KEYS or not options:
+            raise argparse.ArgumentTypeError(f'Grid overrides must look like key=v1,v2 with key in {GRID_KEYS}, got {value}')
+        grid[key] = [yaml.safe_load(option) for option in options.split(',')]
+    return grid
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run many experiment configs on a process pool')
+    parser.add_argument('configs', nargs='+', help='config files or glob patterns, e.g. "configs/*.yaml"')
+    parser.add_argument('--grid', action='append', help='agent override grid, e.g. --grid temperature=0,0.5')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--summary', type=Path, default=Path('experiments/sweep_summary'),
+                        help='summary files path (without extension)')
+    args = parser.parse_args()
+
+    run_sweep(config_patterns=args.configs,
+              grid=parse_grid(args.grid),
+              workers=args.workers,
+              summary_path=args.summary)
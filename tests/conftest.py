@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# the tests import `gym_llm` and `environments` from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import environments  # noqa: E402 to register the environments
+from gym_llm.mock_server import MockLLMServer  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    """Starts a `MockLLMServer(**kwargs)` on a free port, stopped at the end of the test"""
+    servers = []
+
+    def start(**kwargs):
+        server = MockLLMServer(**kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+
+    for server in servers:
+        server.stop()
@@ -0,0 +1,119 @@
+import json
+
+import pytest
+from openai import OpenAI
+
+import gym_llm
+from gym_llm.batch import OpenAIBatchClient, run_batch_episodes
+from gym_llm.logger import EmptyLogger
+from gym_llm.utils import get_env, get_env_definition
+
+
+def _batch_client(server, **kwargs):
+    return OpenAIBatchClient(OpenAI(base_url=server.openai_base_url, api_key='mock'), poll_interval=0.01, **kwargs)
+
+
+def _requests(num_requests):
+    return {f'request-{i}': {'model': 'mock', 'messages': [{'role': 'user', 'content': f"{{'state': {i}}}"}]}
+            for i in range(num_requests)}
+
+
+def test_completed_batch(mock_server, tmp_path):
+    server = mock_server(policy='scripted', actions=[3], batch_latency=0.05)
+    answers = _batch_client(server).run(_requests(4), input_path=tmp_path / 'input.jsonl')
+
+    assert list(answers) == [f'request-{i}' for i in range(4)]
+    assert all(json.loads(answer)['action'] == '3' for answer in answers.values())
+    assert server.stats['batches'] == 1
+    assert len((tmp_path / 'input.jsonl').read_text().splitlines()) == 4
+
+
+def test_failed_batch(mock_server, tmp_path):
+    server = mock_server(batch_fail_rate=1.0)
+    answers = _batch_client(server).run(_requests(4), input_path=tmp_path / 'input.jsonl')
+
+    assert answers == {f'request-{i}': None for i in range(4)}
+
+
+def test_expired_batch(mock_server, tmp_path):
+    server = mock_server(batch_expire_rate=1.0)
+    answers = _batch_client(server).run(_requests(4), input_path=tmp_path / 'input.jsonl')
+
+    # the requests that did not run come back in the error file
+    assert [answer is not None for answer in answers.values()] == [True, True, False, False]
+
+
+def test_request_errors(mock_server, tmp_path):
+    server = mock_server(error_rate=1.0)
+    answers = _batch_client(server).run(_requests(3), input_path=tmp_path / 'input.jsonl')
+
+    assert answers == {f'request-{i}': None for i in range(3)}
+    assert server.stats['errors'] == 3
+
+
+def test_timeout_cancels_the_batch(mock_server, tmp_path):
+    server = mock_server(batch_latency=60.0)
+    client = _batch_client(server, timeout=0.05)
+
+    with pytest.raises(TimeoutError):
+        client.run(_requests(2), input_path=tmp_path / 'input.jsonl')
+    assert client.client.batches.retrieve('batch_mock_0').status == 'cancelled'
+
+
+def test_batch_experiment_matches_sequential(monkeypatch, mock_server, tmp_path):
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    server = mock_server(policy='oracle', env_id='TaxiLLM-v3', seed=1)
+
+    def run(name, **exp_config):
+        config = {
+            'agent': {'backend': 'openai', 'model': 'mock', 'base_url': server.openai_base_url, 'history': 4},
+            'environment': {'name': 'TaxiLLM-v3'},
+            'experiment': {'parent': str(tmp_path), 'name': name, 'num_runs': 4, 'seed': 5, 'verbose': False,
+                           **exp_config}
+        }
+        path = gym_llm.run_experiment(config)
+        with open(path / 'results.json') as f:
+            return path, json.load(f)
+
+    _, results = run('sequential')
+    path, batch_results = run('batch', batch={'poll_interval': 0.01, 'max_episodes': 3})
+
+    assert batch_results['total_rewards'] == results['total_rewards']
+    assert batch_results['total_steps'] == results['total_steps']
+    # one job per step of each chunk of `max_episodes` runs
+    assert server.stats['batches'] == max(results['total_steps'][:3]) + results['total_steps'][3]
+    assert sorted(p.name for p in (path / 'batches').iterdir()) == ['runs_0-2', 'runs_3-3']
+
+
+def test_batch_episodes_survive_failures(monkeypatch, mock_server, tmp_path):
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    server = mock_server(policy='oracle', env_id='TaxiLLM-v3', seed=1)
+    # the first step is answered so that every agent has an action to hold, then a batch fails, another one expires
+    # and the following requests fail at random
+    failures = [{}, {'batch_fail_rate': 1.0}, {'batch_expire_rate': 1.0}, {'error_rate': 0.3, 'malformed_rate': 0.2}]
+
+    class FlakyBatchClient(OpenAIBatchClient):
+        def run(self, requests, input_path):
+            step = len(list(tmp_path.glob('work/step_*.jsonl')))
+            for key, value in {'batch_fail_rate': 0.0, 'batch_expire_rate': 0.0, **failures[min(step, 3)]}.items():
+                setattr(server, key, value)
+            return super().run(requests, input_path)
+
+    runs = [(0, 5), (1, 6), (2, 7), (3, 8)]
+    envs = [get_env(env_config={'name': 'TaxiLLM-v3'}) for _ in runs]
+    agents = [gym_llm.Agent(config={'backend': 'openai', 'model': 'mock', 'base_url': server.openai_base_url,
+                                    'history': 4}, **get_env_definition(env)) for env in envs]
+
+    episodes = {}
+    run_batch_episodes(envs, agents, runs, batch_client=FlakyBatchClient(agents[0].llm.openai_client, poll_interval=0.01),
+                       work_dir=tmp_path / 'work', logger=EmptyLogger(),
+                       on_episode=lambda run_idx, seed, episode: episodes.setdefault(run_idx, episode))
+
+    assert sorted(episodes) == [0, 1, 2, 3]
+    actions = [[raw_output['action'] for raw_output in episodes[run_idx]['raw_outputs'].values()] for run_idx in range(4)]
+    assert all(run_actions[0] is not None for run_actions in actions)
+    # the failed batch left every run without answer (the env played the previous action)
+    assert all(run_actions[1] is None for run_actions in actions)
+    # the expired batch answered the first half of its requests
+    assert [run_actions[2] is not None for run_actions in actions] == [True, True, False, False]
+    assert server.stats['errors'] + server.stats['malformed'] > 0
@@ -0,0 +1,74 @@
+from gym_llm.llms.cache import ResponseCache
+from gym_llm.llms.ollama_llm import OllamaLLM
+from gym_llm.llms.openai_llm import OpenAILLM
+
+
+def _openai_llm(monkeypatch, cache, base_url, temperature=0.0, bypass=False):
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    llm = OpenAILLM(model='mock', temperature=temperature, system_prompt='"reflection" "action"', base_url=base_url)
+    llm.set_cache(cache, bypass=bypass)
+    llm.history.append({'role': 'user', 'content': "{'state': 1}"})
+    return llm
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = ResponseCache(path=tmp_path / 'cache.sqlite')
+
+    assert cache.get('a') is None
+    cache.put('a', 'answer')
+    assert cache.get('a') == 'answer'
+    assert cache.get('b') is None
+
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+    assert cache.stats()['entries'] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    # room for three answers of 10 bytes
+    cache = ResponseCache(path=tmp_path / 'cache.sqlite', max_size_mb=30 / 1024 / 1024)
+    for key in 'abc':
+        cache.put(key, key * 10)
+    # `a` is now the most recently used
+    cache.get('a')
+    cache.put('d', 'd' * 10)
+
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['a' * 10, 'c' * 10, 'd' * 10]
+    assert cache.stats()['entries'] == 3
+
+
+def test_cached_answers_skip_the_backend(monkeypatch, mock_server, tmp_path):
+    server = mock_server(policy='scripted', actions=[1])
+    cache = ResponseCache(path=tmp_path / 'cache.sqlite')
+
+    llm = _openai_llm(monkeypatch, cache, server.openai_base_url)
+    assert llm.generate()['action'] == '1'
+    assert llm.generate()['action'] == '1'
+    assert [call['cached'] for call in llm.calls] == [False, True]
+    assert server.stats['requests'] == 1
+
+    # bypass always asks the backend and refreshes the entry
+    llm = _openai_llm(monkeypatch, cache, server.openai_base_url, bypass=True)
+    llm.generate()
+    assert llm.calls[-1]['cached'] is False
+    assert server.stats['requests'] == 2
+    assert cache.stats()['entries'] == 1
+
+
+def test_key_depends_on_the_options_and_endpoint(monkeypatch, tmp_path):
+    cache = ResponseCache(path=tmp_path / 'cache.sqlite')
+    messages = [{'role': 'user', 'content': "{'state': 1}"}]
+
+    def key(llm):
+        llm.set_cache(cache)
+        return llm.cache_key(messages)
+
+    base = key(_openai_llm(monkeypatch, cache, 'http://127.0.0.1:1/v1'))
+    assert key(_openai_llm(monkeypatch, cache, 'http://127.0.0.1:1/v1')) == base
+    assert key(_openai_llm(monkeypatch, cache, 'http://127.0.0.1:1/v1', temperature=0.5)) != base
+    assert key(_openai_llm(monkeypatch, cache, 'http://127.0.0.1:2/v1')) != base
+
+    ollama_key = key(OllamaLLM(model='mock', host='http://127.0.0.1:1'))
+    assert key(OllamaLLM(model='mock', host='http://127.0.0.1:1')) == ollama_key
+    assert key(OllamaLLM(model='mock', host='http://127.0.0.1:2')) != ollama_key
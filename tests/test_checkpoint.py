@@ -0,0 +1,155 @@
+import json
+
+import numpy as np
+import pytest
+
+import gym_llm
+import gym_llm.utils
+from gym_llm.checkpoint import CheckpointRecorder, EpisodeCheckpoint, check_resume_config
+from gym_llm.trajectory import ExperimentTrajectories
+
+NUM_RUNS = 4
+SEED = 3
+# the first run of the interrupted experiment that does not finish
+INTERRUPTED_RUN = 2
+# optimal taxi episodes take more steps than that
+INTERRUPTED_STEP = 3
+
+
+class Interrupted(Exception):
+    """Stand-in for the process being killed"""
+
+
+def _config(server, tmp_path, name, **experiment):
+    return {
+        'agent': {'backend': 'openai', 'model': 'mock', 'base_url': server.openai_base_url, 'history': 4},
+        'environment': {'name': 'TaxiLLM-v3'},
+        'experiment': {'parent': str(tmp_path), 'name': name, 'num_runs': NUM_RUNS, 'seed': SEED, 'verbose': False,
+                       **experiment}
+    }
+
+
+def _results(path):
+    with open(path / 'results.json') as f:
+        results = json.load(f)
+    return {key: results[key] for key in ('total_rewards', 'total_steps', 'avg_reward', 'avg_steps')}
+
+
+def _check_same_results(results, expected):
+    assert results == expected
+    # resumed totals keep the env's reward type
+    assert [type(reward) for reward in results['total_rewards']] == [type(reward) for reward in expected['total_rewards']]
+
+
+@pytest.fixture
+def server(monkeypatch, mock_server):
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    return mock_server(policy='oracle', env_id='TaxiLLM-v3', seed=2)
+
+
+@pytest.fixture
+def uninterrupted(server, tmp_path):
+    path = gym_llm.run_experiment(_config(server, tmp_path, 'uninterrupted'))
+    return path, _results(path)
+
+
+def test_resume_skips_finished_runs(monkeypatch, server, tmp_path, uninterrupted):
+    _, expected = uninterrupted
+    run_episode = gym_llm.utils.run_episode
+    played = []
+
+    def interrupted_run_episode(env, agent, seed, *args, **kwargs):
+        if interrupt and seed == SEED + INTERRUPTED_RUN:
+            raise Interrupted
+        played.append(seed)
+        return run_episode(env, agent, seed, *args, **kwargs)
+
+    monkeypatch.setattr(gym_llm.utils, 'run_episode', interrupted_run_episode)
+    config = _config(server, tmp_path, 'resumed')
+    interrupt = True
+    with pytest.raises(Interrupted):
+        gym_llm.run_experiment(config)
+    assert played == [SEED + i for i in range(INTERRUPTED_RUN)]
+
+    config['experiment']['resume'] = True
+    interrupt = False
+    played.clear()
+    path = gym_llm.run_experiment(config)
+
+    assert played == [SEED + i for i in range(INTERRUPTED_RUN, NUM_RUNS)]
+    _check_same_results(_results(path), expected)
+    with open(path / 'results.json') as f:
+        assert json.load(f)['resumed_runs'] == list(range(INTERRUPTED_RUN))
+
+
+def test_resume_continues_interrupted_episode(monkeypatch, mock_server, tmp_path, uninterrupted):
+    expected_path, expected = uninterrupted
+    server = mock_server(policy='oracle', env_id='TaxiLLM-v3', seed=2)
+    config = _config(server, tmp_path, 'resumed', checkpoint=True)
+    save = EpisodeCheckpoint.save
+
+    def interrupted_save(checkpoint, agent, num_steps, trajectory=None):
+        save(checkpoint, agent, num_steps, trajectory=trajectory)
+        if checkpoint.path.name.startswith(f'run_{INTERRUPTED_RUN}_') and num_steps == INTERRUPTED_STEP:
+            raise Interrupted
+
+    with monkeypatch.context() as patch:
+        patch.setattr(EpisodeCheckpoint, 'save', interrupted_save)
+        with pytest.raises(Interrupted):
+            gym_llm.run_experiment(config)
+
+    path = expected_path.parent / 'resumed'
+    expected_trajectories = ExperimentTrajectories(expected_path)
+    expected_actions = np.array(expected_trajectories[INTERRUPTED_RUN].actions)
+
+    # the checkpoint holds the steps played so far
+    checkpoint = CheckpointRecorder(path).open(INTERRUPTED_RUN, SEED + INTERRUPTED_RUN)
+    state = checkpoint.load()
+    assert state['num_steps'] == INTERRUPTED_STEP
+    assert state['actions'] == expected_actions[:INTERRUPTED_STEP].tolist()
+    assert len(state['raw_outputs']) == INTERRUPTED_STEP
+    # the history window of the agent, up to the answer of the last step
+    assert state['history'][-1]['role'] == 'assistant'
+    requests = server.stats['requests']
+
+    config['experiment']['resume'] = True
+    gym_llm.run_experiment(config)
+
+    _check_same_results(_results(path), expected)
+    # the steps before the checkpoint are replayed, not asked again
+    assert server.stats['requests'] - requests == sum(expected['total_steps'][INTERRUPTED_RUN:]) - INTERRUPTED_STEP
+    assert not checkpoint.path.exists()
+    for run, expected_run in zip(ExperimentTrajectories(path), expected_trajectories):
+        np.testing.assert_array_equal(run.actions, expected_run.actions)
+        np.testing.assert_array_equal(run.observations['state'], expected_run.observations['state'])
+
+
+def test_resume_rejects_another_experiment(server, tmp_path):
+    config = _config(server, tmp_path, 'taxi')
+    check_resume_config(config, json.loads(json.dumps(config)))
+
+    for section, key, value in [('agent', 'model', 'other'), ('agent', 'temperature', 0.5),
+                                ('environment', 'name', 'BlackjackLLM-v1'), ('environment', 'max_episode_steps', 10)]:
+        changed = json.loads(json.dumps(config))
+        changed[section][key] = value
+        with pytest.raises(ValueError, match=f'{section} config differs from the saved one in {key}'):
+            check_resume_config(config, changed)
+
+    changed = json.loads(json.dumps(config))
+    changed['experiment']['seed'] = SEED + 1
+    with pytest.raises(ValueError, match='seed differs'):
+        check_resume_config(config, changed)
+
+    # other experiment settings may change, e.g. more runs
+    changed = json.loads(json.dumps(config))
+    changed['experiment']['num_runs'] = NUM_RUNS + 2
+    check_resume_config(config, changed)
+
+    # and a resumed experiment checks the saved config
+    config['experiment']['num_runs'] = 1
+    path = gym_llm.run_experiment(config)
+    config['agent']['history'] = 2
+    config['experiment']['resume'] = True
+    with pytest.raises(ValueError, match='agent config differs'):
+        gym_llm.run_experiment(config)
+    assert len(_results(path)['total_steps']) == 1
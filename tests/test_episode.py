@@ -0,0 +1,75 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import gym_llm
+from gym_llm.episode import run_episode, arun_episode
+from gym_llm.logger import EmptyLogger
+from gym_llm.pipeline import run_pipelined_episode
+from gym_llm.trajectory import ExperimentTrajectories
+from gym_llm.utils import get_env, get_env_definition
+
+ENV_IDS = ['TaxiLLM-v3', 'BlackjackLLM-v1', 'LunarLanderLLM-v2']
+
+
+def _agent(server, env, **config):
+    config = {'backend': 'openai', 'model': 'mock', 'base_url': server.openai_base_url, 'history': 4, **config}
+    return gym_llm.Agent(config=config, **get_env_definition(env))
+
+
+def _results(episode):
+    # the mock server draws the reflections again for repeated requests, the actions stay the same
+    actions = {step: raw_output['action'] for step, raw_output in episode['raw_outputs'].items()}
+    return episode['total_reward'], episode['num_steps'], actions
+
+
+@pytest.mark.parametrize('env_id', ENV_IDS)
+@pytest.mark.parametrize('action_rate', [1, 2])
+def test_runners_play_the_same_episode(monkeypatch, mock_server, env_id, action_rate):
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    server = mock_server(policy='oracle', env_id=env_id, seed=1)
+    env = get_env(env_config={'name': env_id})
+    logger = EmptyLogger()
+
+    episode = run_episode(env, _agent(server, env, action_rate=action_rate), seed=3, logger=logger)
+    async_episode = asyncio.run(arun_episode(env, _agent(server, env, action_rate=action_rate), seed=3, logger=logger))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pipelined_episode = run_pipelined_episode(env, _agent(server, env, action_rate=action_rate), seed=3,
+                                                  logger=logger, executor=executor)
+
+    assert _results(async_episode) == _results(episode)
+    assert _results(pipelined_episode) == _results(episode)
+    assert len(episode['llm_calls']) == len(async_episode['llm_calls']) == len(pipelined_episode['llm_calls'])
+    env.close()
+
+
+@pytest.mark.parametrize('env_id', ENV_IDS)
+@pytest.mark.parametrize('save_gif', [False, True])
+def test_vector_results_match_sequential(monkeypatch, mock_server, tmp_path, env_id, save_gif):
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    server = mock_server(policy='oracle', env_id=env_id, seed=1)
+
+    def run(name, num_envs):
+        config = {
+            'agent': {'backend': 'openai', 'model': 'mock', 'base_url': server.openai_base_url, 'history': 4},
+            # rendering sub-envs run on the sync vectorization, the others on the native vector env if any
+            'environment': {'name': env_id, 'num_envs': num_envs},
+            'experiment': {'parent': str(tmp_path), 'name': name, 'num_runs': 3, 'seed': 5, 'verbose': False,
+                           'save_gif': save_gif}
+        }
+        path = gym_llm.run_experiment(config)
+        with open(path / 'results.json') as f:
+            return json.load(f), ExperimentTrajectories(path)
+
+    results, trajectories = run('sequential', num_envs=1)
+    vector_results, vector_trajectories = run('vector', num_envs=2)
+
+    assert vector_results['total_rewards'] == results['total_rewards']
+    assert [type(reward) for reward in vector_results['total_rewards']] == [type(reward) for reward in results['total_rewards']]
+    assert vector_results['total_steps'] == results['total_steps']
+    for trajectory, vector_trajectory in zip(trajectories, vector_trajectories):
+        assert vector_trajectory.rewards.dtype == trajectory.rewards.dtype
+        assert np.array_equal(vector_trajectory.rewards, trajectory.rewards)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from environments import LunarLander
+
+
+def _play(num_episodes, reuse_bodies, render_mode=None, **kwargs):
+    """Steps, with seeded random actions, of `num_episodes` episodes played on the same env"""
+    # the wind and turbulence offsets are drawn from the global numpy generator when the env is created
+    np.random.seed(0)
+    env = LunarLander(render_mode=render_mode, reuse_bodies=reuse_bodies, **kwargs)
+    rng = np.random.default_rng(0)
+
+    steps = []
+    for episode in range(num_episodes):
+        # every other episode goes on with the generator of the previous one instead of seeding it again
+        obs, _ = env.reset(seed=episode if episode % 2 == 0 else None)
+        steps.append((obs, None, False, False, None))
+        done = False
+        while not done:
+            obs, reward, terminated, truncated, _ = env.step(int(rng.integers(4)))
+            frame = env.render() if render_mode == 'rgb_array' else None
+            steps.append((obs, reward, terminated, truncated, frame))
+            done = terminated or truncated or len(steps) % 400 == 0
+    env.close()
+    return steps
+
+
+@pytest.mark.parametrize('num_episodes, render_mode, kwargs', [
+    (30, None, {}),
+    (30, None, {'enable_wind': True, 'turbulence_power': 2.0}),
+    (30, None, {'continuous': False, 'gravity': -5.0}),
+    (6, 'rgb_array', {}),
+    (6, 'rgb_array', {'enable_wind': True}),
+])
+def test_reused_bodies_play_the_same_episodes(num_episodes, render_mode, kwargs):
+    reused = _play(num_episodes, True, render_mode=render_mode, **kwargs)
+    recreated = _play(num_episodes, False, render_mode=render_mode, **kwargs)
+
+    assert len(reused) == len(recreated)
+    for (obs, reward, terminated, truncated, frame), expected in zip(reused, recreated):
+        assert list(obs) == list(expected[0])
+        for key, value in obs.items():
+            assert value.dtype == expected[0][key].dtype
+            assert value.tobytes() == expected[0][key].tobytes()
+        assert reward == expected[1]
+        assert terminated == expected[2]
+        assert truncated == expected[3]
+        if frame is not None:
+            np.testing.assert_array_equal(frame, expected[4])
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from gym_llm.llms.ollama_llm import OllamaLLM
+
+
+def _llm(host, incremental=False):
+    llm = OllamaLLM(model='mock', system_prompt='"reflection" "action"', host=host, incremental=incremental)
+    llm.history.append({'role': 'user', 'content': "{'state': 1}"})
+    return llm
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_server_errors_are_failed_calls(mock_server, incremental):
+    server = mock_server(error_rate=1.0)
+    llm = _llm(server.url, incremental=incremental)
+
+    assert llm.generate() == {'reflection': '', 'action': None}
+    assert asyncio.run(llm.agenerate()) == {'reflection': '', 'action': None}
+    assert [call['error'] for call in llm.calls] == [True, True]
+    assert server.stats['errors'] == 2
+
+
+def test_unreachable_server_is_a_failed_call():
+    # nothing listens on the discard port
+    llm = _llm('http://127.0.0.1:9')
+
+    assert llm.generate()['action'] is None
+    assert asyncio.run(llm.agenerate())['action'] is None
+    assert [call['error'] for call in llm.calls] == [True, True]
+
+
+def test_answer_is_parsed(mock_server):
+    server = mock_server(policy='scripted', actions=[2])
+    llm = _llm(server.url)
+
+    assert llm.generate()['action'] == '2'
+    assert llm.calls[-1]['error'] is False
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from gym_llm.llms.openai_llm import OpenAILLM
+from gym_llm.llms.rate_limit import RateLimiter, TokenBucket, get_retry_after, parse_duration
+
+
+class Throttled(Exception):
+    """Stand-in for an OpenAI 429 error"""
+    status_code = 429
+
+    def __init__(self, headers):
+        super().__init__('Rate limit reached')
+        self.response = type('Response', (), {'headers': headers})()
+
+
+def _llm(monkeypatch, server, limiter):
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    llm = OpenAILLM(model='mock', system_prompt='"reflection" "action"', base_url=server.openai_base_url)
+    llm.set_rate_limiter(limiter)
+    llm.history.append({'role': 'user', 'content': "{'state': 1}"})
+    return llm
+
+
+def test_throttled_requests_are_retried(monkeypatch, mock_server):
+    server = mock_server(policy='scripted', actions=[1], rate_limit_rate=0.5, retry_after=0.02, latency=0.01)
+    limiter = RateLimiter(max_concurrency=8, max_retries=20, backoff=0.01, max_backoff=0.05)
+
+    async def run():
+        llms = [_llm(monkeypatch, server, limiter) for _ in range(40)]
+        answers = await asyncio.gather(*[llm.agenerate() for llm in llms])
+        return answers, [call for llm in llms for call in llm.calls]
+
+    answers, calls = asyncio.run(run())
+
+    assert [answer['action'] for answer in answers] == ['1'] * 40
+    assert not any(call['error'] for call in calls)
+    assert server.stats['rate_limited'] > 0
+    assert limiter.stats['throttled'] == server.stats['rate_limited']
+    assert limiter.stats['retries'] == server.stats['rate_limited'] == sum(call['retries'] for call in calls)
+    assert limiter.stats['requests'] == server.stats['requests'] == 40 + server.stats['rate_limited']
+    assert limiter.in_flight == 0
+
+
+def test_gives_up_after_max_retries(monkeypatch, mock_server):
+    server = mock_server(policy='scripted', actions=[1], rate_limit_rate=1.0, retry_after=0.01)
+    limiter = RateLimiter(max_retries=2, backoff=0.01)
+    llm = _llm(monkeypatch, server, limiter)
+
+    assert llm.generate()['action'] is None
+    assert llm.calls[-1]['error'] is True
+    assert server.stats['rate_limited'] == 3
+    assert limiter.stats['retries'] == 2
+    assert limiter.stats['throttled'] == 3
+
+
+def test_throttling_halves_the_concurrency():
+    limiter = RateLimiter(max_concurrency=8)
+    for concurrency in [4, 2, 1, 1]:
+        assert limiter._try_acquire(0) == 0
+        limiter.release(error=Throttled({}))
+        assert limiter.concurrency == concurrency
+
+    # and it grows back by one slot per window of successes
+    for _ in range(3):
+        assert limiter._try_acquire(0) == 0
+        limiter.release()
+    assert 2 <= limiter.concurrency < 3
+
+
+def test_retry_after_blocks_every_caller():
+    limiter = RateLimiter(max_concurrency=8)
+    assert limiter._try_acquire(0) == 0
+    start = time.monotonic()
+    limiter.release({'retry-after-ms': '200'}, error=Throttled({'retry-after-ms': '200'}))
+    assert limiter._blocked_until == pytest.approx(start + 0.2, abs=0.05)
+
+    # other callers, with free slots, wait as well
+    waits = []
+
+    def acquire():
+        acquire_start = time.monotonic()
+        limiter.acquire()
+        waits.append(time.monotonic() - acquire_start)
+        limiter.release()
+
+    threads = [threading.Thread(target=acquire) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(waits) == 3 and min(waits) >= 0.15
+
+
+def test_budgets_follow_the_headers():
+    bucket = TokenBucket(60)
+    bucket.consume(60)
+    assert bucket.wait_time(1, bucket._updated) == pytest.approx(1.0)
+    assert bucket.wait_time(120, bucket._updated) == pytest.approx(60.0)
+
+    limiter = RateLimiter(rpm=100)
+    assert limiter._try_acquire(0) == 0
+    limiter.release({'x-ratelimit-remaining-requests': '0'})
+    assert limiter._try_acquire(0) > 0
+
+    # without a local budget, an exhausted server budget blocks until its reset
+    limiter = RateLimiter()
+    assert limiter._try_acquire(0) == 0
+    limiter.release({'x-ratelimit-remaining-tokens': '0', 'x-ratelimit-reset-tokens': '1s'})
+    assert limiter._try_acquire(0) == pytest.approx(1.0, abs=0.05)
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('6m0s', 360.0),
+    ('20ms', 0.02),
+    ('1h2m3.5s', 3723.5),
+    ('1.5', 1.5),
+    ('soon', None),
+    (None, None),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == (pytest.approx(seconds) if seconds is not None else None)
+
+
+@pytest.mark.parametrize('headers, seconds', [
+    ({'retry-after-ms': '250'}, 0.25),
+    ({'retry-after': '3'}, 3.0),
+    ({'retry-after-ms': '250', 'retry-after': '3'}, 0.25),
+    ({'retry-after-ms': 'x', 'retry-after': '3'}, 3.0),
+    ({'retry-after': 'Wed, 21 Oct 2026 07:28:00 GMT'}, None),
+    ({}, None),
+])
+def test_get_retry_after(headers, seconds):
+    assert get_retry_after(headers) == seconds
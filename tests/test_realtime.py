@@ -0,0 +1,114 @@
+import asyncio
+
+import gymnasium as gym
+import pytest
+
+import gym_llm
+from gym_llm.logger import EmptyLogger
+from gym_llm.realtime import arun_realtime_episode
+from gym_llm.utils import get_env_definition
+
+NUM_TICKS = 40
+FPS = 50
+NOOP_ACTION = 4
+
+
+class StepRecorder(gym.Wrapper):
+    """Records the observation each action was played on"""
+
+    def reset(self, **kwargs):
+        self.steps = []
+        self.obs, info = self.env.reset(**kwargs)
+        return self.obs, info
+
+    def step(self, action):
+        self.steps.append((self.obs, action))
+        self.obs, *rest = self.env.step(action)
+        return self.obs, *rest
+
+
+def _run(monkeypatch, server, fallback='last', action_rate=1):
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    env = StepRecorder(gym.wrappers.TimeLimit(gym.make('TaxiLLM-v3').unwrapped, max_episode_steps=NUM_TICKS))
+    agent = gym_llm.Agent(config={'backend': 'openai', 'model': 'mock', 'base_url': server.openai_base_url,
+                                  'action_rate': action_rate}, **get_env_definition(env))
+    episode = asyncio.run(arun_realtime_episode(env, agent, seed=0, logger=EmptyLogger(), fps=FPS, fallback=fallback,
+                                                noop_action=NOOP_ACTION))
+    raw_outputs = [episode['raw_outputs'][step] for step in sorted(episode['raw_outputs'])]
+    return episode, raw_outputs, env.steps, agent
+
+
+@pytest.mark.parametrize('fallback', ['last', 'noop', 'scripted'])
+def test_slow_decisions_miss_deadlines(monkeypatch, mock_server, fallback):
+    # a decision takes about 3 ticks
+    server = mock_server(policy='scripted', actions=[0, 1, 2, 3], latency=2.5 / FPS)
+    episode, raw_outputs, steps, agent = _run(monkeypatch, server, fallback=fallback)
+    realtime = episode['realtime']
+
+    decided = [raw_output for raw_output in raw_outputs if 'fallback' not in raw_output]
+    # the scripted fallback may finish the episode before the time limit
+    assert realtime['ticks'] == len(steps) == episode['num_steps']
+    assert 0 < realtime['decisions'] < realtime['ticks'] / 2
+    assert len(decided) == realtime['decisions']
+    assert realtime['missed_deadlines'] == realtime['ticks'] - realtime['decisions']
+    # a decision is at least as old as its latency when it is played
+    assert realtime['max_staleness'] >= 2
+    assert realtime['mean_staleness'] >= (2 if fallback != 'last' else 1)
+
+    # the first ticks have no decision to hold yet
+    assert raw_outputs[0]['fallback'] == ('noop' if fallback == 'last' else fallback)
+
+    heuristic_action = gym.make('TaxiLLM-v3').unwrapped.heuristic_action
+    last_decision = None
+    for raw_output, (obs, action) in zip(raw_outputs, steps):
+        assert raw_output['action'] == action
+        if 'fallback' not in raw_output:
+            last_decision = action
+        elif raw_output['fallback'] == 'last':
+            assert action == last_decision
+        elif raw_output['fallback'] == 'noop':
+            assert action == NOOP_ACTION
+            assert fallback != 'last' or last_decision is None
+        else:
+            assert action == heuristic_action(obs)
+
+    # only the observations the requests were sent on are in the history
+    user_turns = [message for message in agent.llm.history if message['role'] == 'user']
+    assert len(user_turns) <= realtime['decisions'] + 1
+
+
+def test_invalid_answers_are_missed_deadlines(monkeypatch, mock_server):
+    # every other answer has an action that is not an integer, `act` would replace it by the last one
+    server = mock_server(policy='scripted', actions=[1, 'up'], latency=2.5 / FPS)
+    episode, raw_outputs, _, _ = _run(monkeypatch, server, fallback='last')
+    realtime = episode['realtime']
+
+    decided = [raw_output for raw_output in raw_outputs if 'fallback' not in raw_output]
+    assert realtime['decisions'] >= 4
+    assert len(decided) == (realtime['decisions'] + 1) // 2
+    assert realtime['missed_deadlines'] == NUM_TICKS - len(decided)
+    # the held decision keeps aging through the invalid answers
+    assert realtime['max_staleness'] >= 5
+
+
+def test_malformed_answers_never_decide(monkeypatch, mock_server):
+    server = mock_server(policy='scripted', actions=[1], malformed_rate=1.0, latency=1 / FPS)
+    episode, raw_outputs, _, _ = _run(monkeypatch, server, fallback='last')
+    realtime = episode['realtime']
+
+    assert realtime['decisions'] > 0
+    assert realtime['missed_deadlines'] == NUM_TICKS
+    assert realtime['max_staleness'] is None
+    assert all(raw_output['fallback'] == 'noop' and raw_output['action'] == NOOP_ACTION for raw_output in raw_outputs)
+
+
+def test_action_rate_plays_the_last_decision(monkeypatch, mock_server):
+    server = mock_server(policy='scripted', actions=[0, 1, 2, 3], latency=0.5 / FPS)
+    episode, raw_outputs, _, _ = _run(monkeypatch, server, fallback='noop', action_rate=3)
+    realtime = episode['realtime']
+
+    skipped = [raw_output for raw_output in raw_outputs if 'fallback' not in raw_output and not raw_output['reflection']]
+    assert skipped
+    # ticks between decisions play the last one, they are not missed deadlines
+    assert realtime['missed_deadlines'] + realtime['decisions'] + len(skipped) == NUM_TICKS
+    assert realtime['decisions'] < NUM_TICKS / 3 + 1
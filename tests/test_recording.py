@@ -0,0 +1,113 @@
+import gymnasium as gym
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+
+from gym_llm.recording import GifWriter
+
+
+def _decode(path):
+    with Image.open(path) as image:
+        loop = image.info.get('loop')
+        frames = [(np.asarray(frame.convert('RGB')), frame.info['duration']) for frame in ImageSequence.Iterator(image)]
+    return frames, loop
+
+
+def _env_frames(env_id, num_frames):
+    env = gym.make(env_id, render_mode='rgb_array')
+    env.action_space.seed(0)
+    env.reset(seed=0)
+    frames = [env.render()]
+    while len(frames) < num_frames:
+        _, _, terminated, truncated, _ = env.step(env.action_space.sample())
+        frames.append(env.render())
+        if terminated or truncated:
+            env.reset()
+    return frames
+
+
+def _sprite_frames(num_frames, size=(60, 80)):
+    # a square moving over a background of 200 colors, so that every region fits a color table
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 200, size=size)
+    colors = rng.integers(0, 256, size=(201, 3), dtype=np.uint8)
+    frames = []
+    for i in range(num_frames):
+        indices = background.copy()
+        indices[10 + i:20 + i, 5 + 2 * i:15 + 2 * i] = 200
+        frames.append(colors[indices])
+    return frames
+
+
+def test_frames_with_few_colors_are_exact(tmp_path):
+    frames = _sprite_frames(20)
+    with GifWriter(tmp_path / 'sprite.gif', fps=20) as writer:
+        for frame in frames:
+            writer.append(frame)
+
+    decoded, loop = _decode(tmp_path / 'sprite.gif')
+    assert loop == 0
+    assert len(decoded) == len(frames)
+    for (pixels, duration), frame in zip(decoded, frames):
+        np.testing.assert_array_equal(pixels, frame)
+        assert duration == 50
+
+
+@pytest.mark.parametrize('env_id, max_error', [('TaxiLLM-v3', 1.0), ('LunarLanderLLM-v2', 0.01)])
+def test_env_frames_round_trip(tmp_path, env_id, max_error):
+    # Taxi frames have thousands of colors, the regions above 256 colors are quantized
+    frames = _env_frames(env_id, 30)
+    with GifWriter(tmp_path / 'env.gif', fps=30) as writer:
+        for frame in frames:
+            writer.append(frame)
+
+    decoded, _ = _decode(tmp_path / 'env.gif')
+    assert len(decoded) == len(frames)
+    for (pixels, _), frame in zip(decoded, frames):
+        assert pixels.shape == frame.shape
+        assert np.abs(pixels.astype(int) - frame.astype(int)).mean() < max_error
+
+
+def test_frame_skip_keeps_one_frame_out_of_n(tmp_path):
+    frames = _sprite_frames(20)
+    with GifWriter(tmp_path / 'skip.gif', fps=20, frame_skip=3) as writer:
+        for frame in frames:
+            writer.append(frame)
+
+    decoded, _ = _decode(tmp_path / 'skip.gif')
+    assert writer.num_frames == len(frames)
+    assert len(decoded) == len(frames[::3])
+    for (pixels, duration), frame in zip(decoded, frames[::3]):
+        np.testing.assert_array_equal(pixels, frame)
+        assert duration == 150
+
+
+def test_unchanged_frames_are_kept(tmp_path):
+    frame = _sprite_frames(1)[0]
+    with GifWriter(tmp_path / 'still.gif', fps=10) as writer:
+        for _ in range(5):
+            writer.append(frame)
+
+    decoded, _ = _decode(tmp_path / 'still.gif')
+    assert len(decoded) == 5
+    for pixels, duration in decoded:
+        np.testing.assert_array_equal(pixels, frame)
+        assert duration == 100
+
+
+def test_scale_downsizes_the_frames(tmp_path):
+    frames = _sprite_frames(4, size=(60, 80))
+    with GifWriter(tmp_path / 'scaled.gif', fps=10, scale=0.5) as writer:
+        for frame in frames:
+            writer.append(frame)
+
+    decoded, _ = _decode(tmp_path / 'scaled.gif')
+    assert len(decoded) == len(frames)
+    assert all(pixels.shape == (30, 40, 3) for pixels, _ in decoded)
+
+
+def test_frame_shape_change_raises(tmp_path):
+    with GifWriter(tmp_path / 'shape.gif', fps=10) as writer:
+        writer.append(np.zeros((10, 10, 3), dtype=np.uint8))
+        with pytest.raises(ValueError):
+            writer.append(np.zeros((12, 10, 3), dtype=np.uint8))
@@ -0,0 +1,125 @@
+import json
+import shutil
+
+import gymnasium as gym
+import numpy as np
+import pytest
+
+import gym_llm
+from gym_llm.logger import EmptyLogger
+from gym_llm.mock_server import MockLLMServer
+from gym_llm.replay import get_recorded_runs, replay_episode, replay_experiment
+from gym_llm.utils import get_env
+
+NUM_RUNS = 3
+
+
+@pytest.fixture
+def recorded(monkeypatch, tmp_path):
+    """Taxi experiment recorded with trajectories and raw outputs, the server is gone once it is done"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    with MockLLMServer(policy='oracle', env_id='TaxiLLM-v3', seed=2) as server:
+        config = {
+            'agent': {'backend': 'openai', 'model': 'mock', 'base_url': server.openai_base_url, 'history': 4},
+            'environment': {'name': 'TaxiLLM-v3'},
+            'experiment': {'parent': str(tmp_path), 'name': 'taxi', 'num_runs': NUM_RUNS, 'seed': 7, 'verbose': False,
+                           'save_trajectory': True, 'save_raw_outputs': True}
+        }
+        path = gym_llm.run_experiment(config)
+
+    with open(path / 'results.json') as f:
+        return path, json.load(f)
+
+
+def _replay(path, **kwargs):
+    output = replay_experiment(path, output=path / 'replay', **kwargs)
+    with open(output / 'results.json') as f:
+        return json.load(f)
+
+
+def test_trajectories_replay_without_backend(recorded):
+    path, results = recorded
+    replay = _replay(path, save_trajectory=True)
+
+    assert replay['diverged_runs'] == []
+    assert replay['total_rewards'] == results['total_rewards']
+    assert replay['total_steps'] == results['total_steps']
+    assert {episode['source'] for episode in replay['episodes'].values()} == {'trajectory'}
+
+    # the regenerated trajectories hold the same steps
+    for run_idx, run in get_recorded_runs(path / 'replay').items():
+        original = get_recorded_runs(path)[run_idx]['trajectory']
+        np.testing.assert_array_equal(run['trajectory'].actions, original.actions)
+        np.testing.assert_array_equal(run['trajectory'].observations['state'], original.observations['state'])
+
+
+def test_raw_outputs_replay_without_backend(recorded):
+    path, results = recorded
+    for trajectory in path.glob('run_*_trajectory'):
+        shutil.rmtree(trajectory)
+
+    replay = _replay(path)
+
+    assert replay['diverged_runs'] == []
+    assert replay['total_rewards'] == results['total_rewards']
+    assert replay['total_steps'] == results['total_steps']
+    assert {episode['source'] for episode in replay['episodes'].values()} == {'raw_outputs'}
+
+
+def test_perturbed_actions_are_divergences(recorded):
+    path, _ = recorded
+    trajectory = get_recorded_runs(path)[1]['trajectory']
+    # an illegal pickup or drop-off costs -10 where a move costs -1, and a legal one changes the state
+    action = int(trajectory.actions[2])
+    actions = np.memmap(trajectory.path / 'action.bin', dtype=trajectory.columns['action']['dtype'], mode='r+')
+    actions[2] = 4 if action != 4 else 5
+    actions.flush()
+
+    replay = _replay(path, runs=[0, 1])
+
+    assert replay['diverged_runs'] == [1]
+    divergence = replay['episodes']['1']['divergence']
+    assert divergence['step'] == 3
+    assert set(divergence['fields']) & {'observation.state', 'reward'}
+
+
+def test_perturbed_raw_outputs_are_divergences(recorded):
+    path, _ = recorded
+    for trajectory in path.glob('run_*_trajectory'):
+        shutil.rmtree(trajectory)
+    # an illegal pickup instead of the first move of the optimal episode
+    raw_outputs_path = next(path.glob('run_0_seed_*_raw_outputs.json'))
+    with open(raw_outputs_path) as f:
+        raw_outputs = json.load(f)
+    raw_outputs['1']['action'] = 4
+    with open(raw_outputs_path, 'w') as f:
+        json.dump(raw_outputs, f)
+
+    replay = _replay(path)
+
+    # without trajectory the replay is checked against the totals of results.json
+    assert replay['diverged_runs'] == [0]
+    assert replay['episodes']['0']['divergence'] is not None
+    assert replay['episodes']['0']['source'] == 'raw_outputs'
+
+
+def test_perturbed_env_is_a_divergence(recorded):
+    path, _ = recorded
+    run = get_recorded_runs(path)[0]
+    env = get_env(env_config={'name': 'TaxiLLM-v3'})
+
+    episode = replay_episode(env, run['actions'], seed=run['seed'], logger=EmptyLogger(), trajectory=run['trajectory'])
+    assert episode['divergence'] is None
+
+    # other dynamics
+    episode = replay_episode(gym.wrappers.TransformReward(env, lambda reward: reward * 2), run['actions'],
+                             seed=run['seed'], logger=EmptyLogger(), trajectory=run['trajectory'])
+    assert episode['divergence'] == {'step': 1, 'fields': ['reward']}
+
+    # another start state
+    episode = replay_episode(env, run['actions'], seed=run['seed'] + 1, logger=EmptyLogger(), trajectory=run['trajectory'])
+    assert episode['divergence'] == {'step': 0, 'fields': ['observation.state']}
+
+    # missing actions
+    episode = replay_episode(env, run['actions'][:2], seed=run['seed'], logger=EmptyLogger(), trajectory=run['trajectory'])
+    assert episode['divergence'] == {'step': 2, 'fields': ['actions']}
@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+
+import gym_llm
+from gym_llm.llms.base_llm import BaseLLM
+from gym_llm.llms.streaming import ActionStreamParser
+from gym_llm.utils import get_env, get_env_definition
+
+ANSWERS = [
+    '{"action": "2", "reflection": "go"}',
+    '{"reflection": "go", "action": 2}',
+    '{"reflection": "go", "action": 12.5e1}',
+    '{"reflection": "go", "action": null}',
+    '{"reflection": "go", "action": true}',
+    # quotes, braces and the key itself inside the reflection
+    '{"reflection": "say \\"action\\": 3, {or} [4] \\\\", "action": "1"}',
+    '{"reflection": "action", "action": 0}',
+    # nested values, their `action` keys are not the answer
+    '{"plan": {"action": 5, "next": ["action", 6]}, "reflection": "x", "action": 3}',
+    '{"steps": [{"action": 1}, {"action": 2}], "action": "2"}',
+    '{"\\u0061ction": 4}',
+    ' {\n  "reflection" : "spaces",\n  "action" : 1\n}\n',
+]
+
+
+def _feed(text, split):
+    """Parser fed with the two halves of `text` split at `split`, and whether the action was found"""
+    parser = ActionStreamParser()
+    parser.feed(text[:split])
+    return parser, parser.feed(text[split:])
+
+
+@pytest.mark.parametrize('text', ANSWERS)
+def test_action_is_parsed_at_every_split(text):
+    expected = json.loads(text)['action']
+    for split in range(len(text) + 1):
+        parser, done = _feed(text, split)
+        assert done
+        assert parser.action == expected
+        assert type(parser.action) is type(expected)
+        assert parser.text == text
+
+
+@pytest.mark.parametrize('text', ANSWERS)
+def test_action_is_parsed_one_char_at_a_time(text):
+    expected = json.loads(text)['action']
+    parser = ActionStreamParser()
+    for char in text:
+        if parser.feed(char):
+            break
+    assert parser.done
+    assert parser.action == expected
+
+
+@pytest.mark.parametrize('text, stop', [
+    # a string ends at its closing quote, a scalar at the character that follows it
+    ('{"action": "2", "reflection": "a long reflection"}', len('{"action": "2"')),
+    ('{"action": 2, "reflection": "a long reflection"}', len('{"action": 2,')),
+    ('{"action": 27}', len('{"action": 27}')),
+])
+def test_stream_stops_once_the_action_is_complete(text, stop):
+    parser = ActionStreamParser()
+    fed = next(pos + 1 for pos, char in enumerate(text) if parser.feed(char))
+    assert fed == stop
+
+
+@pytest.mark.parametrize('text', [
+    '{"reflection": "go", "action": "2',
+    '{"reflection": "go", "action": 2',
+    '{"reflection": "go", "act',
+    '{"action": {"id": 2}}',
+    'not json at all',
+    '',
+])
+def test_incomplete_streams_fall_back_to_the_full_answer(text):
+    parser = ActionStreamParser()
+    for char in text:
+        assert not parser.feed(char)
+
+    # the streaming path then parses the whole text like a non streamed answer
+    answer = BaseLLM.parse_answer(parser.text)
+    assert answer == BaseLLM.parse_answer(text)
+    if text != '{"action": {"id": 2}}':
+        assert answer['action'] is None
+
+
+@pytest.mark.parametrize('backend', ['openai', 'ollama'])
+@pytest.mark.parametrize('remainder', ['cancel', 'background'])
+def test_streamed_action_matches_the_complete_answer(monkeypatch, mock_server, backend, remainder):
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    server = mock_server(policy='oracle', env_id='TaxiLLM-v3', tokens_per_second=2000)
+    env = get_env(env_config={'name': 'TaxiLLM-v3'})
+
+    def agent(**config):
+        endpoint = {'base_url': server.openai_base_url} if backend == 'openai' else {'host': server.url}
+        return gym_llm.Agent(config={'backend': backend, 'model': 'mock', **endpoint, **config}, **get_env_definition(env))
+
+    for seed in range(3):
+        obs, _ = env.reset(seed=seed)
+        _, action = agent().get_action(obs)
+        streamed_agent = agent(stream=True, stream_remainder=remainder)
+        raw_output, streamed_action = streamed_agent.get_action(obs)
+        _, async_action = asyncio.run(agent(stream=True, stream_remainder=remainder).aget_action(obs))
+
+        assert streamed_action == action
+        assert async_action == action
+        assert streamed_agent.llm.calls[-1]['error'] is False
+        assert streamed_agent.llm.calls[-1]['ttft'] is not None
@@ -0,0 +1,37 @@
+from gym_llm.metrics import summarize_calls
+from gym_llm.sweep import _summarize, write_summary
+
+
+def _call(latency, load_time=None, cached=False):
+    return {'latency': latency, 'ttft': None, 'prompt_tokens': 10, 'completion_tokens': 5, 'generation_time': None,
+            'load_time': load_time, 'retries': 0, 'cached': cached, 'error': False, 'parse_error': False}
+
+
+def _job(results):
+    config = {'environment': {'name': 'TaxiLLM-v3'}, 'agent': {'backend': 'ollama', 'model': 'mock'}, 'experiment': {}}
+    return {'config_path': 'config.yaml', 'path': 'experiments/taxi', 'config': config, 'results': results, 'status': 'done'}
+
+
+def test_summary_times_are_floats(tmp_path):
+    jobs = [
+        # warmed up the model in its worker
+        _job({'llm_calls': {'experiment': summarize_calls([_call(1, load_time=0), _call(1)])}, 'model_load': {'host|mock': 2}}),
+        # found the model loaded
+        _job({'llm_calls': {'experiment': summarize_calls([_call(1), _call(2)])}}),
+        # only cached answers
+        _job({'llm_calls': {'experiment': summarize_calls([_call(0, cached=True)])}}),
+        # saved before load times were reported
+        _job({'llm_calls': {'experiment': {'inference_time': 3}}}),
+    ]
+    summary = [_summarize(job) for job in jobs]
+
+    assert [row['load_time'] for row in summary] == [2.0, 0.0, 0.0, 0.0]
+    assert [row['inference_time'] for row in summary] == [2.0, 3.0, 0.0, 3.0]
+    assert all(type(row[column]) is float for row in summary for column in ('load_time', 'inference_time'))
+
+    summary.append(_summarize(_job(None)))
+    assert summary[-1]['load_time'] is None and summary[-1]['inference_time'] is None
+
+    write_summary(summary, tmp_path / 'summary')
+    rows = [line.split(' | ') for line in (tmp_path / 'summary.md').read_text().splitlines()[2:]]
+    assert [row[10:12] for row in rows] == [['2.00', '2.00'], ['0.00', '3.00'], ['0.00', '0.00'], ['0.00', '3.00'], ['-', '-']]
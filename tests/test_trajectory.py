@@ -0,0 +1,115 @@
+import numpy as np
+
+from gym_llm.trajectory import ExperimentTrajectories, TrajectoryRecorder
+
+NUM_STEPS = 6
+
+
+def _observation(step):
+    rng = np.random.default_rng(step)
+    return {
+        'position': rng.normal(size=(2, 3)).astype(np.float32),
+        'state': int(step * 7),
+        'speed': np.float64(step / 3),
+        'flags': np.array([step % 2, 1 - step % 2], dtype=np.int8),
+    }
+
+
+def _play(writer, num_steps, truncate=True):
+    """Writes an episode of `num_steps` steps, the last one truncated, and returns what was written"""
+    observations = [_observation(0)]
+    writer.reset(observations[0])
+    steps = []
+    for step in range(1, num_steps + 1):
+        observations.append(_observation(step))
+        step_row = (step % 4, -1 if step % 3 else 20, False, truncate and step == num_steps)
+        writer.append(observations[-1], {'reflection': f'step {step}', 'action': step % 4}, *step_row)
+        steps.append(step_row)
+    return observations, steps
+
+
+def _check(trajectory, observations, steps):
+    assert trajectory.num_steps == len(steps)
+    assert trajectory.observation_keys() == [f'observation.{key}' for key in observations[0]]
+
+    for key, expected in observations[0].items():
+        column = trajectory.observations[key]
+        expected_column = np.array([observation[key] for observation in observations])
+        assert column.shape == (len(steps) + 1, *np.shape(expected))
+        assert column.dtype == expected_column.dtype
+        np.testing.assert_array_equal(column, expected_column)
+
+    actions, rewards, terminated, truncated = (np.array(column) for column in zip(*steps))
+    for column, expected in ((trajectory.actions, actions), (trajectory.rewards, rewards),
+                             (trajectory.terminated, terminated), (trajectory.truncated, truncated)):
+        assert column.shape == (len(steps),)
+        assert column.dtype == expected.dtype
+        np.testing.assert_array_equal(column, expected)
+
+    assert trajectory.total_reward == sum(rewards)
+    assert len(trajectory.times) == len(steps) and np.all(np.diff(trajectory.times) >= 0)
+    assert [text for text in trajectory.texts()] == [{'reflection': f'step {step}'} for step in range(1, len(steps) + 1)]
+
+
+def test_episodes_round_trip(tmp_path):
+    recorder = TrajectoryRecorder(tmp_path)
+    written = {}
+    for run_idx, seed in [(1, 11), (0, 10)]:
+        with recorder.open(run_idx, seed) as writer:
+            written[run_idx] = _play(writer, NUM_STEPS + run_idx)
+
+    trajectories = ExperimentTrajectories(tmp_path)
+    assert len(trajectories) == 2
+    assert [(run.run_idx, run.seed, run.complete) for run in trajectories] == [(0, 10, True), (1, 11, True)]
+    for run in trajectories:
+        _check(run, *written[run.run_idx])
+
+    assert trajectories.column('action').shape == (2 * NUM_STEPS + 1,)
+    np.testing.assert_array_equal(trajectories.run_index('action'), [0] * NUM_STEPS + [1] * (NUM_STEPS + 1))
+    assert trajectories.column('observation.position').shape == (2 * NUM_STEPS + 3, 2, 3)
+
+
+def test_plain_observations_round_trip(tmp_path):
+    with TrajectoryRecorder(tmp_path).open(0, 0) as writer:
+        writer.reset(np.zeros(3, dtype=np.float32))
+        for step in range(1, 4):
+            writer.append(np.full(3, step, dtype=np.float32), {'reflection': ''}, 1, 0.5, step == 3, False)
+
+    run = ExperimentTrajectories(tmp_path)[0]
+    assert list(run.observations) == ['observation']
+    np.testing.assert_array_equal(run.observations['observation'], [[0] * 3, [1] * 3, [2] * 3, [3] * 3])
+    assert run.rewards.dtype == np.float64 and run.total_reward == 1.5
+
+
+def test_interrupted_episode_is_read_up_to_its_last_step(tmp_path):
+    writer = TrajectoryRecorder(tmp_path).open(0, 5)
+    observations, steps = _play(writer, NUM_STEPS, truncate=False)
+    # interrupted while writing the next step: its observation is there but not the rest of the row
+    writer._write_observation(_observation(NUM_STEPS + 1))
+    writer._write('action', 1)
+    writer.flush()
+
+    run = ExperimentTrajectories(tmp_path)[0]
+    assert run.complete is False
+    _check(run, observations, steps)
+    writer.close()
+
+
+def test_writer_closed_mid_episode(tmp_path):
+    with TrajectoryRecorder(tmp_path).open(0, 5) as writer:
+        observations, steps = _play(writer, 3, truncate=False)
+
+    run = ExperimentTrajectories(tmp_path)[0]
+    assert run.complete is True
+    assert not run.terminated.any() and not run.truncated.any()
+    _check(run, observations, steps)
+
+
+def test_empty_episode(tmp_path):
+    with TrajectoryRecorder(tmp_path).open(0, 0) as writer:
+        writer.reset(_observation(0))
+
+    run = ExperimentTrajectories(tmp_path)[0]
+    assert run.num_steps == 0
+    assert run.observations['position'].shape == (1, 2, 3)
+    assert list(run.texts()) == []
@@ -0,0 +1,81 @@
+import gymnasium as gym
+import numpy as np
+import pytest
+
+NUM_ENVS = 8
+# enough steps for ~3000 blackjack hands and ~200 taxi episodes per case
+NUM_STEPS = {'BlackjackLLM-v1': 600, 'TaxiLLM-v3': 1300}
+# a one card buffer is refilled at every card
+CASES = [('BlackjackLLM-v1', {}), ('BlackjackLLM-v1', {'card_buffer': 1}), ('TaxiLLM-v3', {})]
+
+
+def _obs(obs, index=None):
+    return {key: int(value if index is None else value[index]) for key, value in obs.items()}
+
+
+def _setup(env_id, kwargs):
+    vector_env = gym.make_vec(env_id, num_envs=NUM_ENVS, vectorization_mode='vector_entry_point', **kwargs)
+    envs = [gym.make(env_id) for _ in range(NUM_ENVS)]
+    return vector_env, envs, np.random.default_rng(0)
+
+
+def _check_step(env, action, index, obs, rewards, terminations, truncations):
+    expected_obs, expected_reward, expected_terminated, expected_truncated, _ = env.step(action)
+    assert _obs(obs, index) == _obs(expected_obs)
+    assert rewards[index] == expected_reward
+    assert terminations[index] == expected_terminated
+    assert truncations[index] == expected_truncated
+
+
+@pytest.mark.parametrize('env_id, kwargs', CASES)
+def test_autoreset_deals_the_same_episodes(env_id, kwargs):
+    vector_env, envs, rng = _setup(env_id, kwargs)
+    seeds = list(range(100, 100 + NUM_ENVS))
+
+    obs, _ = vector_env.reset(seed=seeds)
+    for i, env in enumerate(envs):
+        assert _obs(obs, i) == _obs(env.reset(seed=seeds[i])[0])
+
+    # next-step autoreset without new seeds: the sub-envs go on with their own generator
+    autoreset = np.zeros(NUM_ENVS, dtype=np.bool_)
+    episodes = 0
+    for _ in range(NUM_STEPS[env_id]):
+        actions = rng.integers(vector_env.single_action_space.n, size=NUM_ENVS)
+        obs, rewards, terminations, truncations, _ = vector_env.step(actions)
+        for i, env in enumerate(envs):
+            if autoreset[i]:
+                assert _obs(obs, i) == _obs(env.reset()[0])
+                assert rewards[i] == 0 and not terminations[i] and not truncations[i]
+            else:
+                _check_step(env, actions[i], i, obs, rewards, terminations, truncations)
+        autoreset = terminations | truncations
+        episodes += autoreset.sum()
+
+    assert episodes >= 200
+
+
+@pytest.mark.parametrize('env_id, kwargs', CASES)
+def test_reset_mask_deals_the_same_episodes(env_id, kwargs):
+    vector_env, envs, rng = _setup(env_id, kwargs)
+
+    obs, _ = vector_env.reset(seed=0)
+    for i, env in enumerate(envs):
+        assert _obs(obs, i) == _obs(env.reset(seed=i)[0])
+
+    episodes = 0
+    for _ in range(NUM_STEPS[env_id]):
+        actions = rng.integers(vector_env.single_action_space.n, size=NUM_ENVS)
+        obs, rewards, terminations, truncations, _ = vector_env.step(actions)
+        for i, env in enumerate(envs):
+            _check_step(env, actions[i], i, obs, rewards, terminations, truncations)
+
+        done = terminations | truncations
+        if done.any():
+            # finished sub-envs are reset on their own, about half of them with a new seed
+            seeds = [int(seed) if seed % 2 else None for seed in rng.integers(1000, size=NUM_ENVS)]
+            obs, _ = vector_env.reset(seed=seeds, options={'reset_mask': done})
+            for i in np.flatnonzero(done):
+                assert _obs(obs, i) == _obs(envs[i].reset(seed=seeds[i])[0])
+            episodes += done.sum()
+
+    assert episodes >= 200